@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from academics.queues import question_queue
+from repairs.queues import repair_queue
+
+
+class Command(BaseCommand):
+    help = "Rebuild the pending question and repair request queues behind the provider feeds"
+
+    def handle(self, *args, **options):
+        for label, queue in (('questions', question_queue), ('repair requests', repair_queue)):
+            with transaction.atomic():
+                queued = queue.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Queued {queued} pending {label}"))
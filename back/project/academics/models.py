@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
 
@@ -10,6 +12,50 @@ class Subject(models.Model):
         return self.name
 
 
+class AcademicQuestionQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Students see their own questions; teachers see the ones assigned to
+        them plus every pending, unassigned one; everyone else sees all.
+
+        The teacher rule is an id lookup over a UNION ALL of two indexed
+        searches. Written as an OR of the two filters it spans
+        teacher_id and status, which no single index can serve.
+        """
+        if user.role == 'student':
+            return self.filter(student=user)
+        if user.role == 'teacher':
+            visible = self.model.objects.filter(teacher=user).values('pk').union(
+                self.model.objects.filter(teacher__isnull=True, status='pending').values('pk'),
+                all=True
+            )
+            return self.filter(pk__in=visible)
+        return self
+    
+    def for_listing(self):
+        """Join the people and subject and prefetch attachments so a page serializes without per-row queries."""
+        return self.select_related('student', 'teacher', 'subject').prefetch_related('attachments')
+    
+    def for_detail(self):
+        """
+        Annotate `response_total` and prefetch only the latest
+        TIMELINE_PREVIEW_SIZE responses, with their authors and
+        attachments, into `latest_responses`. The full timeline is paged
+        separately.
+        """
+        preview_size = getattr(settings, 'TIMELINE_PREVIEW_SIZE', 5)
+        response_total = QuestionResponse.objects.filter(
+            question=OuterRef('pk')
+        ).order_by().values('question').annotate(count=Count('pk')).values('count')
+        latest = QuestionResponse.objects.select_related('user').prefetch_related(
+            'attachments'
+        ).order_by('-created_at', '-id')
+        
+        return self.annotate(response_total=Coalesce(Subquery(response_total), 0)).prefetch_related(
+            Prefetch('responses', queryset=latest[:preview_size], to_attr='latest_responses')
+        )
+
+
 class AcademicQuestion(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -39,9 +85,20 @@ class AcademicQuestion(models.Model):
     content = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     service_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # When the job became answered, i.e. the date its fee is booked under
+    earned_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AcademicQuestionQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['teacher', 'status'], name='question_teacher_status_idx'),
+            models.Index(fields=['student', '-created_at'], name='question_student_recent_idx'),
+            models.Index(fields=['status', '-created_at'], name='question_status_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} - {self.student.email}"
 
@@ -72,6 +129,11 @@ class QuestionResponse(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['question', '-created_at'], name='question_response_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"Response on {self.question.title} by {self.user.email}"
 
@@ -86,4 +148,28 @@ class ResponseAttachment(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"Attachment for response on {self.response.question.title}"
\ No newline at end of file
+        return f"Attachment for response on {self.response.question.title}"
+
+
+class QuestionQueueEntry(models.Model):
+    """
+    A pending, unassigned question waiting in its subject's queue. Kept in
+    sync by academics.signals and read by the teacher feed.
+    """
+    question = models.OneToOneField(
+        AcademicQuestion,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='queue_entry'
+    )
+    subject_id = models.IntegerField()
+    priority = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject_id', 'priority', 'question'], name='question_queue_subject_idx'),
+            models.Index(fields=['priority', 'question', 'subject_id'], name='question_queue_priority_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Queued question {self.question_id}"
@@ -0,0 +1,4 @@
+from core.matching import JobQueue
+from .models import AcademicQuestion, QuestionQueueEntry
+
+question_queue = JobQueue(AcademicQuestion, QuestionQueueEntry, 'subject', 'teacher')
@@ -6,6 +6,7 @@ from .models import (
     QuestionResponse,
     ResponseAttachment
 )
+from uploads.storage import bulk_attach, completed_uploads
 
 
 class SubjectSerializer(serializers.ModelSerializer):
@@ -35,10 +36,15 @@ class QuestionResponseSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
+    upload_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        write_only=True,
+        required=False
+    )
     
     class Meta:
         model = QuestionResponse
-        fields = ('id', 'question', 'user', 'user_name', 'user_role', 'content', 'created_at', 'attachments', 'uploaded_files')
+        fields = ('id', 'question', 'user', 'user_name', 'user_role', 'content', 'created_at', 'attachments', 'uploaded_files', 'upload_ids')
         read_only_fields = ('user', 'created_at')
     
     def get_user_name(self, obj):
@@ -50,10 +56,10 @@ class QuestionResponseSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         uploaded_files = validated_data.pop('uploaded_files', [])
         validated_data['user'] = self.context['request'].user
+        uploads = completed_uploads(validated_data['user'], validated_data.pop('upload_ids', []))
         response = super().create(validated_data)
         
-        for file in uploaded_files:
-            ResponseAttachment.objects.create(response=response, file=file)
+        bulk_attach(ResponseAttachment, 'file', uploaded_files, uploads, response=response)
         
         return response
 
@@ -68,6 +74,11 @@ class AcademicQuestionSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
+    upload_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        write_only=True,
+        required=False
+    )
     
     class Meta:
         model = AcademicQuestion
@@ -75,7 +86,7 @@ class AcademicQuestionSerializer(serializers.ModelSerializer):
             'id', 'student', 'student_name', 'teacher', 'teacher_name',
             'subject', 'subject_name', 'title', 'content', 'status',
             'service_fee', 'created_at', 'updated_at', 'attachments',
-            'uploaded_files'
+            'uploaded_files', 'upload_ids'
         )
         read_only_fields = ('student', 'teacher', 'service_fee', 'created_at', 'updated_at')
     
@@ -91,16 +102,18 @@ class AcademicQuestionSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         uploaded_files = validated_data.pop('uploaded_files', [])
         validated_data['student'] = self.context['request'].user
+        uploads = completed_uploads(validated_data['student'], validated_data.pop('upload_ids', []))
         question = super().create(validated_data)
         
-        for file in uploaded_files:
-            QuestionAttachment.objects.create(question=question, file=file)
+        bulk_attach(QuestionAttachment, 'file', uploaded_files, uploads, question=question)
         
         return question
 
 
 class AcademicQuestionDetailSerializer(AcademicQuestionSerializer):
-    responses = QuestionResponseSerializer(many=True, read_only=True)
+    # Only the latest few, newest first; the rest are paged from the timeline endpoint
+    responses = QuestionResponseSerializer(source='latest_responses', many=True, read_only=True)
+    response_count = serializers.IntegerField(source='response_total', read_only=True)
     
     class Meta(AcademicQuestionSerializer.Meta):
-        fields = AcademicQuestionSerializer.Meta.fields + ('responses',)
\ No newline at end of file
+        fields = AcademicQuestionSerializer.Meta.fields + ('responses', 'response_count')
\ No newline at end of file
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core.claims import jobs_claimed
+from core.http_cache import response_cache
+from users.leaderboard import leaderboards
+from .models import AcademicQuestion, Subject
+from .queues import question_queue
+
+response_cache.invalidate_on(Subject, 'subjects')
+leaderboards.track(AcademicQuestion, 'teacher', 'subject', 'answered', role='teacher')
+
+
+@receiver(post_save, sender=AcademicQuestion)
+def sync_question_queue(sender, instance, **kwargs):
+    question_queue.sync(instance)
+
+
+@receiver(jobs_claimed, sender=AcademicQuestion)
+def dequeue_claimed_questions(sender, job_ids, **kwargs):
+    question_queue.discard(job_ids)
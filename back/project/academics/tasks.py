@@ -0,0 +1,8 @@
+from taskqueue.registry import task
+from .models import QuestionResponse
+
+
+@task
+def post_question_notice(question_id, user_id, content):
+    """Add a system notice (assignment, status change) to a question's thread."""
+    QuestionResponse.objects.create(question_id=question_id, user_id=user_id, content=content)
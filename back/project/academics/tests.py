@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+
+from unittest import skipUnless
+
+from django.db import OperationalError, close_old_connections, connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from core.claims import claim, claim_next
+from core.query_plans import full_scans, plan_lines
+from users.models import LeaderboardEntry, User
+from .models import AcademicQuestion, QuestionAttachment, QuestionResponse, Subject
+
+
+class ClaimTests(TransactionTestCase):
+    """Concurrent claims of the same questions give every question exactly one teacher."""
+
+    claimers = 8
+    jobs = 40
+
+    def setUp(self):
+        student = User.objects.create_user('student@example.com', 'password', role='student')
+        subject = Subject.objects.create(name='Maths')
+        self.teachers = [
+            User.objects.create_user(f'teacher{index}@example.com', 'password', role='teacher')
+            for index in range(self.claimers)
+        ]
+        self.job_ids = [
+            question.pk for question in AcademicQuestion.objects.bulk_create([
+                AcademicQuestion(student=student, subject=subject, title=f'Question {index}', content='')
+                for index in range(self.jobs)
+            ])
+        ]
+
+    def run_claimers(self, claim_some):
+        """Run `claim_some(teacher, rng)` in one thread per teacher until nothing is pending."""
+        won = {teacher.pk: [] for teacher in self.teachers}
+        start = threading.Barrier(len(self.teachers))
+        deadline = time.monotonic() + 30
+
+        def claimer(teacher):
+            rng = random.Random(teacher.pk)
+            start.wait()
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        if not AcademicQuestion.objects.filter(pk__in=self.job_ids, status='pending').exists():
+                            return
+                        won[teacher.pk] += claim_some(teacher, rng)
+                    except OperationalError:
+                        # SQLite serialises writers; back off and try again
+                        time.sleep(rng.uniform(0, 0.01))
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=claimer, args=(teacher,)) for teacher in self.teachers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return won
+
+    def assert_one_winner_each(self, won):
+        winners = {}
+        for teacher_id, job_ids in won.items():
+            for job_id in job_ids:
+                self.assertNotIn(job_id, winners, f"Question {job_id} was claimed twice")
+                winners[job_id] = teacher_id
+
+        assigned = dict(AcademicQuestion.objects.filter(pk__in=self.job_ids).values_list('pk', 'teacher_id'))
+        self.assertEqual(winners, assigned)
+
+    def test_claim(self):
+        def claim_some(teacher, rng):
+            # Everyone goes for the same few open questions to force collisions
+            open_ids = list(
+                AcademicQuestion.objects.filter(pk__in=self.job_ids, status='pending').values_list('pk', flat=True)[:4]
+            )
+            job_id = rng.choice(open_ids) if open_ids else None
+            return [job_id] if job_id and claim(AcademicQuestion, job_id, 'teacher', teacher) else []
+
+        self.assert_one_winner_each(self.run_claimers(claim_some))
+
+    def test_claim_next(self):
+        def claim_some(teacher, rng):
+            return claim_next(AcademicQuestion.objects.filter(pk__in=self.job_ids), 'teacher', teacher, 3)
+
+        self.assert_one_winner_each(self.run_claimers(claim_some))
+
+
+class QuestionQueryTests(TestCase):
+    """Question pages cost a fixed number of queries however many rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student@example.com', 'password', role='student')
+        cls.teacher = User.objects.create_user('teacher@example.com', 'password', role='teacher')
+        cls.subject = Subject.objects.create(name='Maths')
+        cls.questions = [cls.create_question(index) for index in range(3)]
+
+    @classmethod
+    def create_question(cls, index):
+        question = AcademicQuestion.objects.create(
+            student=cls.student, subject=cls.subject, title=f'Question {index}', content='Content'
+        )
+        QuestionAttachment.objects.create(question=question, file=f'question_attachments/{index}.pdf')
+        if index % 2:
+            question.teacher, question.status = cls.teacher, 'assigned'
+            question.save()
+            for _ in range(3):
+                QuestionResponse.objects.create(question=question, user=cls.teacher, content='Answer')
+        return question
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def get(self, user, url):
+        response = self.client_for(user).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        # The page with its joins, then the attachments
+        with self.assertNumQueries(2):
+            self.get(self.student, '/api/academics/questions/')
+
+        for index in range(3, 9):
+            self.create_question(index)
+        with self.assertNumQueries(2):
+            response = self.get(self.student, '/api/academics/questions/')
+        self.assertEqual(len(response.json()), 9)
+
+        with self.assertNumQueries(2):
+            self.get(self.teacher, '/api/academics/questions/')
+
+    def test_retrieve(self):
+        question = self.questions[1]
+        # The question, attachments, the latest responses and their attachments
+        with self.assertNumQueries(4):
+            response = self.get(self.teacher, f'/api/academics/questions/{question.pk}/')
+        self.assertEqual(response.json()['response_count'], 3)
+
+    def test_feed(self):
+        # Bonuses, one queue scan per bonus group plus one for the rest, the jobs and their attachments
+        with self.assertNumQueries(4):
+            response = self.get(self.teacher, '/api/academics/questions/feed/')
+        self.assertEqual(len(response.json()['results']), 2)
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), "Query plans are only checked on SQLite and PostgreSQL")
+class QuestionQueryPlanTests(TestCase):
+    """Role-scoped question queries are served from indexes, never a full table scan."""
+
+    def test_no_full_scans(self):
+        student = User(pk=1, role='student')
+        teacher = User(pk=2, role='teacher')
+        questions = AcademicQuestion.objects
+        paths = {
+            'student list': questions.visible_to(student).for_listing().order_by('-created_at'),
+            'teacher list': questions.visible_to(teacher).for_listing().order_by('-created_at'),
+            'teacher detail': questions.visible_to(teacher).for_listing().filter(pk=1),
+            'claimable questions': questions.filter(status='pending', teacher__isnull=True).order_by('created_at', 'id'),
+            'feed bonuses': LeaderboardEntry.objects.filter(provider=teacher, board__startswith='subject:'),
+        }
+        for name, queryset in paths.items():
+            with self.subTest(name):
+                lines = plan_lines(queryset)
+                self.assertEqual(full_scans(lines), [], '\n'.join(lines))
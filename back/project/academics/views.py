@@ -1,7 +1,12 @@
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.utils.urls import replace_query_param
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from .models import (
     Subject, 
     AcademicQuestion, 
@@ -17,9 +22,18 @@ from .serializers import (
     QuestionResponseSerializer
 )
 from users.permissions import IsTeacher
+from uploads.storage import bulk_attach, completed_uploads, upload_ids_from
+from core.http_cache import CachedResponseMixin
+from users.earnings import record_earning
+from core.claims import claim, claim_next
+from core.matching import decode_cursor, encode_cursor
+from core.pagination import TimelinePagination
+from .tasks import post_question_notice
+from .queues import question_queue
 
 
-class SubjectViewSet(viewsets.ReadOnlyModelViewSet):
+class SubjectViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'subjects'
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
     permission_classes = [permissions.AllowAny]
@@ -35,18 +49,14 @@ class AcademicQuestionViewSet(viewsets.ModelViewSet):
         return AcademicQuestionSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        
-        # Students can only see their own questions
-        if user.role == 'student':
-            return AcademicQuestion.objects.filter(student=user)
-        
-        # Teachers can see questions assigned to them and unassigned questions
-        elif user.role == 'teacher':
-            return AcademicQuestion.objects.filter(teacher=user) | AcademicQuestion.objects.filter(teacher__isnull=True, status='pending')
-        
-        # Admins can see all questions
-        return AcademicQuestion.objects.all()
+        # Who sees what, and why it is not an OR, is in visible_to()
+        queryset = AcademicQuestion.objects.visible_to(self.request.user)
+        if self.action == 'timeline':
+            return queryset
+        queryset = queryset.for_listing().order_by('-created_at')
+        if self.action == 'retrieve':
+            queryset = queryset.for_detail()
+        return queryset
     
     @action(detail=True, methods=['post'])
     def add_attachments(self, request, pk=None):
@@ -60,42 +70,103 @@ class AcademicQuestionViewSet(viewsets.ModelViewSet):
             )
         
         files = request.FILES.getlist('files')
-        attachment_instances = []
-        
-        for file in files:
-            attachment_instance = QuestionAttachment.objects.create(
-                question=question,
-                file=file
-            )
-            attachment_instances.append(attachment_instance)
+        uploads = completed_uploads(request.user, upload_ids_from(request))
+        attachment_instances = bulk_attach(QuestionAttachment, 'file', files, uploads, question=question)
         
         serializer = QuestionAttachmentSerializer(attachment_instances, many=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    def announce_assignment(self, question_id):
+        # Notify about assignment off the request path
+        post_question_notice.delay(
+            question_id,
+            self.request.user.id,
+            f"Teacher {self.request.user.first_name} {self.request.user.last_name} has been assigned to answer this question",
+            idempotency_key=f"question:{question_id}:assigned:{self.request.user.id}"
+        )
+    
     @action(detail=True, methods=['post'], permission_classes=[IsTeacher])
     def assign_teacher(self, request, pk=None):
         question = self.get_object()
         
-        if question.teacher:
+        # Check and assign in one UPDATE so concurrent claims cannot both win
+        if not claim(AcademicQuestion, question.pk, 'teacher', request.user):
             return Response(
                 {"error": "This question is already assigned to a teacher"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        question.teacher = request.user
-        question.status = 'assigned'
-        question.save()
+        self.announce_assignment(question.pk)
+        question.refresh_from_db()
+        serializer = self.get_serializer(question)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsTeacher])
+    def claim_next(self, request):
+        """Claim up to `count` (max 20) of the oldest pending questions, optionally in one `subject_id`."""
+        try:
+            count = min(max(int(request.data.get('count', 1)), 1), 20)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "count must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Create a response to notify about assignment
-        QuestionResponse.objects.create(
-            question=question,
-            user=request.user,
-            content=f"Teacher {request.user.first_name} {request.user.last_name} has been assigned to answer this question"
-        )
+        questions = AcademicQuestion.objects.all()
+        subject_id = request.data.get('subject_id')
+        if subject_id:
+            questions = questions.filter(subject_id=subject_id)
         
-        serializer = self.get_serializer(question)
+        question_ids = claim_next(questions, 'teacher', request.user, count)
+        for question_id in question_ids:
+            self.announce_assignment(question_id)
+        
+        claimed = AcademicQuestion.objects.filter(pk__in=question_ids).order_by('created_at', 'id')
+        serializer = self.get_serializer(claimed, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], permission_classes=[IsTeacher])
+    def feed(self, request):
+        """
+        Pending questions ranked for the current user by age, fee and their
+        history in each subject. Pass the returned `next` link to page on;
+        `subject_id` limits the feed to one subject.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            subject_id = request.query_params.get('subject_id')
+            subject_id = int(subject_id) if subject_id else None
+            cursor = request.query_params.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response(
+                {"error": "limit and subject_id must be integers and cursor must come from a previous page"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ranked, position = question_queue.feed(
+            request.user, limit, after, subject_id,
+            queryset=AcademicQuestion.objects.select_related('student', 'subject').prefetch_related('attachments')
+        )
+        serializer = self.get_serializer([job for job, _ in ranked], many=True)
+        next_url = None
+        if position is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(position))
+        return Response({"next": next_url, "results": serializer.data})
+    
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """Every response on the question, newest first, cursor paginated."""
+        question = self.get_object()
+        entries = QuestionResponse.objects.filter(question=question).select_related('user').prefetch_related(
+            'attachments'
+        )
+        
+        paginator = TimelinePagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        serializer = QuestionResponseSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         question = self.get_object()
@@ -135,25 +206,62 @@ class AcademicQuestionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        question.status = status_value
-        
         # Set service fee if answering the question
         if status_value == 'answered':
             service_fee = request.data.get('service_fee')
             if service_fee:
+                try:
+                    service_fee = Decimal(str(service_fee))
+                except InvalidOperation:
+                    service_fee = None
+                if service_fee is None or not service_fee.is_finite() or service_fee < 0:
+                    return Response(
+                        {"error": "service_fee must be a non-negative number"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
                 question.service_fee = service_fee
         
-        question.save()
+        previous_status = question.status
+        # Questions answered before earned_at was recorded are dated as the rebuild does
+        earned_at = question.earned_at or question.updated_at
+        question.status = status_value
+        if status_value == 'answered':
+            question.earned_at = timezone.now()
+        elif previous_status == 'answered':
+            question.earned_at = None
+        
+        with transaction.atomic():
+            # Only the request whose conditional UPDATE moves the question out of
+            # previous_status goes on, so concurrent requests book the fee once
+            moved = AcademicQuestion.objects.filter(pk=question.pk, status=previous_status).update(
+                status=status_value
+            )
+            if moved:
+                # Write the remaining fields and run the post_save handlers
+                question.save()
+                # Keep the earnings rollups in step with what the teacher has earned
+                if status_value == 'answered':
+                    record_earning(question.teacher_id, question.service_fee, question.earned_at)
+                elif previous_status == 'answered':
+                    # Taken back from the period it was booked in
+                    record_earning(question.teacher_id, -question.service_fee, earned_at, jobs=-1)
+        if not moved:
+            return Response(
+                {"error": "The question status was changed by another request"},
+                status=status.HTTP_409_CONFLICT
+            )
         
         # Create status notification
         message = f"Status updated to {status_value}"
         if status_value == 'answered' and question.service_fee > 0:
             message += f" with a service fee of ${question.service_fee}"
         
-        QuestionResponse.objects.create(
-            question=question,
-            user=request.user,
-            content=message
+        # Statuses only move forward, so each one is announced at most once
+        post_question_notice.delay(
+            question.id,
+            request.user.id,
+            message,
+            idempotency_key=f"question:{question.id}:status:{status_value}"
         )
         
         serializer = self.get_serializer(question)
@@ -2,7 +2,11 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from .models import ChatRoom, Message, MessageAttachment
+from .membership import room_membership
+from .pipeline import message_queue, read_receipts
+from .presence import presence, typing_throttle
 
 User = get_user_model()
 
@@ -12,12 +16,6 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'chat_{self.room_id}'
         
-        # Add user to room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
-        
         # Check if user is a participant in the chat room
         user = self.scope['user']
         is_participant = await self.is_room_participant(user, self.room_id)
@@ -26,7 +24,17 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
+        # Add user to room group
+        await self.channel_layer.group_add(
+            self.room_group_name,
+            self.channel_name
+        )
+        
         await self.accept()
+        
+        typing_throttle.connect(self.room_id, user.id)
+        if presence.connect(self.room_id, user.id):
+            await self.broadcast_presence(user.id, 'online')
     
     async def disconnect(self, close_code):
         # Leave room group
@@ -34,6 +42,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        
+        user = self.scope['user']
+        if user.is_authenticated:
+            typing_throttle.disconnect(self.room_id, user.id)
+            if presence.disconnect(self.room_id, user.id):
+                await self.broadcast_presence(user.id, 'offline')
+        
+        # Make sure anything this socket sent is persisted before it goes away
+        await message_queue.flush()
+        await read_receipts.flush()
     
     # Receive message from WebSocket
     async def receive(self, text_data):
@@ -42,10 +60,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         if message_type == 'message':
             message = data.get('message', '')
-            
-            # Save message to database
             user = self.scope['user']
-            saved_message = await self.save_message(user.id, self.room_id, message)
+            
+            # Broadcast right away under a provisional id; the write-behind
+            # queue persists it and acks the real id to the room
+            provisional_id = str(data.get('client_id') or message_queue.new_provisional_id())[:64]
+            await message_queue.submit(self.room_id, user.id, message, provisional_id)
             
             # Send message to room group
             await self.channel_layer.group_send(
@@ -53,32 +73,62 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 {
                     'type': 'chat_message',
                     'message': {
-                        'id': saved_message['id'],
-                        'content': saved_message['content'],
-                        'sender_id': saved_message['sender_id'],
-                        'sender_name': saved_message['sender_name'],
-                        'sender_role': saved_message['sender_role'],
-                        'created_at': saved_message['created_at'].isoformat(),
-                        'is_read': saved_message['is_read']
+                        'id': provisional_id,
+                        'provisional_id': provisional_id,
+                        'content': message,
+                        'sender_id': user.id,
+                        'sender_name': f"{user.first_name} {user.last_name}",
+                        'sender_role': user.role,
+                        'created_at': timezone.now().isoformat(),
+                        'is_read': False
                     }
                 }
             )
         
         elif message_type == 'read':
-            # Mark messages as read
-            message_ids = data.get('message_ids', [])
+            # Only the highest id matters: reads are tracked as a watermark.
+            # Provisional (non-integer) ids are ignored until they are acked.
+            message_ids = [
+                message_id for message_id in data.get('message_ids', [])
+                if isinstance(message_id, int) and not isinstance(message_id, bool)
+            ]
             if message_ids:
-                await self.mark_messages_read(message_ids)
-                
-                # Notify other users that messages have been read
+                # Coalesced per user and room; peers get one `read` frame per interval
+                await read_receipts.submit(self.room_id, self.scope['user'].id, max(message_ids))
+        
+        elif message_type == 'typing':
+            user_id = self.scope['user'].id
+            is_typing = bool(data.get('is_typing', True))
+            if presence.set_typing(self.room_id, user_id, is_typing):
+                await self.broadcast_presence(user_id, 'online')
+            
+            async def broadcast(state):
                 await self.channel_layer.group_send(
                     self.room_group_name,
                     {
-                        'type': 'messages_read',
-                        'message_ids': message_ids,
-                        'reader_id': self.scope['user'].id
+                        'type': 'user_typing',
+                        'user_id': user_id,
+                        'is_typing': state
                     }
                 )
+            
+            # At most one typing broadcast per user per room per interval
+            await typing_throttle.submit(self.room_id, user_id, is_typing, broadcast)
+        
+        elif message_type == 'heartbeat':
+            if presence.heartbeat(self.room_id, self.scope['user'].id):
+                await self.broadcast_presence(self.scope['user'].id, 'online')
+            await self.send(text_data=json.dumps({'type': 'heartbeat'}))
+    
+    async def broadcast_presence(self, user_id, status):
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'presence_update',
+                'user_id': user_id,
+                'status': status
+            }
+        )
     
     # Receive message from room group
     async def chat_message(self, event):
@@ -88,47 +138,46 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message': event['message']
         }))
     
+    # Receive persisted ids for provisionally broadcast messages
+    async def messages_persisted(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'ack',
+            'messages': event['messages']
+        }))
+    
     # Receive message read notification from room group
     async def messages_read(self, event):
         # Send read status to WebSocket
         await self.send(text_data=json.dumps({
             'type': 'read',
-            'message_ids': event['message_ids'],
-            'reader_id': event['reader_id']
+            'reader_id': event['reader_id'],
+            'last_read_message_id': event['last_read_message_id']
+        }))
+    
+    # Receive typing indicator from room group
+    async def user_typing(self, event):
+        # Senders already know they are typing
+        if event['user_id'] == self.scope['user'].id:
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'typing',
+            'user_id': event['user_id'],
+            'is_typing': event['is_typing']
         }))
     
-    @database_sync_to_async
-    def is_room_participant(self, user, room_id):
+    # Receive online/offline change from room group
+    async def presence_update(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'user_id': event['user_id'],
+            'status': event['status']
+        }))
+    
+    async def is_room_participant(self, user, room_id):
         if not user.is_authenticated:
             return False
         
-        try:
-            room = ChatRoom.objects.get(id=room_id)
-            return room.participants.filter(id=user.id).exists()
-        except ChatRoom.DoesNotExist:
-            return False
-    
-    @database_sync_to_async
-    def save_message(self, user_id, room_id, content):
-        user = User.objects.get(id=user_id)
-        room = ChatRoom.objects.get(id=room_id)
-        
-        message = Message.objects.create(
-            room=room,
-            sender=user,
-            content=content
-        )
-        
-        return {
-            'id': message.id,
-            'content': message.content,
-            'sender_id': message.sender.id,
-            'sender_name': f"{message.sender.first_name} {message.sender.last_name}",
-            'sender_role': message.sender.role,
-            'created_at': message.created_at,
-            'is_read': message.is_read
-        }
-    
-    @database_sync_to_async
-    def mark_messages_read(self, message_ids):
-        Message.objects.filter(id__in=message_ids).update(is_read=True)
\ No newline at end of file
+        participant_ids = room_membership.peek(room_id)
+        if participant_ids is None:
+            participant_ids = await database_sync_to_async(room_membership.get_participant_ids)(room_id)
+        return user.id in participant_ids
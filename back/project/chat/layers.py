@@ -0,0 +1,601 @@
+import asyncio
+import bisect
+import copy
+import hashlib
+import json
+import random
+import string
+import time
+import weakref
+from collections import deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping names onto shard indexes.
+
+    Each shard is placed on the ring `replicas` times so keys spread evenly,
+    and adding or removing a shard only moves the keys next to its points.
+    """
+
+    def __init__(self, shard_count, replicas=64):
+        points = []
+        for index in range(shard_count):
+            for replica in range(replicas):
+                points.append((self._hash(f"{index}:{replica}"), index))
+        points.sort()
+        self._keys = [point for point, _ in points]
+        self._shards = [index for _, index in points]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def get(self, name):
+        position = bisect.bisect(self._keys, self._hash(name)) % len(self._keys)
+        return self._shards[position]
+
+
+class LocalShard:
+    """
+    In-process shard store holding channel queues and group memberships.
+
+    This is what the unix-socket broker serves to other processes, and it can
+    be used directly as a shard for single-process deployments and tests.
+    """
+
+    def __init__(self):
+        self.channels = {}
+        self.waiters = {}
+        self.groups = {}
+        self.memberships = {}
+
+    def _purge_expired(self, channel):
+        queue = self.channels.get(channel)
+        if not queue:
+            return
+        now = time.time()
+        expired = False
+        while queue and queue[0][0] < now:
+            queue.popleft()
+            expired = True
+        if expired:
+            # Nobody is reading this channel any more, like InMemoryChannelLayer
+            self._remove_from_groups(channel)
+        if not queue:
+            del self.channels[channel]
+
+    def _remove_from_groups(self, channel):
+        for group in self.memberships.pop(channel, ()):
+            members = self.groups.get(group)
+            if members is not None:
+                members.pop(channel, None)
+                if not members:
+                    del self.groups[group]
+
+    async def send_many(self, messages, entries, expires):
+        full = []
+        for channel, index, capacity in entries:
+            message = copy.deepcopy(messages[index])
+            waiters = self.waiters.get(channel)
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(message)
+                    break
+            else:
+                self._purge_expired(channel)
+                queue = self.channels.setdefault(channel, deque())
+                if len(queue) >= capacity:
+                    full.append(channel)
+                    continue
+                queue.append((expires, message))
+        return full
+
+    async def receive(self, channel):
+        self._purge_expired(channel)
+        queue = self.channels.get(channel)
+        if queue:
+            _, message = queue.popleft()
+            if not queue:
+                del self.channels[channel]
+            return message
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(channel, deque()).append(waiter)
+        try:
+            return await waiter
+        finally:
+            waiters = self.waiters.get(channel)
+            if waiters is not None:
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                if not waiters:
+                    del self.waiters[channel]
+
+    async def unreceive(self, channel, message, expires):
+        # Put back a message whose receiver went away before it was delivered
+        await self.send_many([message], [(channel, 0, float('inf'))], expires)
+
+    async def group_add(self, group, channel, joined_at):
+        self.groups.setdefault(group, {})[channel] = joined_at
+        self.memberships.setdefault(channel, set()).add(group)
+
+    async def group_discard(self, group, channel):
+        members = self.groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+        groups = self.memberships.get(channel)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self.memberships[channel]
+
+    async def group_channels(self, groups, joined_after):
+        result = {}
+        for group in groups:
+            members = self.groups.get(group, {})
+            for channel, joined_at in list(members.items()):
+                if joined_at < joined_after:
+                    await self.group_discard(group, channel)
+            result[group] = list(self.groups.get(group, ()))
+        return result
+
+    async def flush(self):
+        for waiters in self.waiters.values():
+            for waiter in waiters:
+                waiter.cancel()
+        self.channels = {}
+        self.waiters = {}
+        self.groups = {}
+        self.memberships = {}
+
+    async def close(self):
+        pass
+
+
+class ChannelBroker:
+    """
+    Serves a LocalShard over a unix socket so several ASGI worker processes
+    can share channel queues and groups without Redis.
+
+    The protocol is newline-delimited JSON: each request carries an `id`, an
+    `op` naming a LocalShard method and its `args`; the reply echoes the id.
+    Blocking receives run as tasks and can be cancelled with the `cancel` op.
+    """
+
+    OPERATIONS = ('send_many', 'receive', 'unreceive', 'group_add', 'group_discard', 'group_channels', 'flush')
+
+    def __init__(self, path, shard=None):
+        self.path = path
+        self.shard = shard or LocalShard()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(
+            self.handle_connection, path=self.path, limit=SocketShard.STREAM_LIMIT
+        )
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle_connection(self, reader, writer):
+        pending = {}
+
+        async def reply(request_id, **payload):
+            writer.write(json.dumps({'id': request_id, **payload}).encode() + b'\n')
+            await writer.drain()
+
+        async def run(request_id, op, args):
+            try:
+                result = await getattr(self.shard, op)(*args)
+            except asyncio.CancelledError:
+                await reply(request_id, cancelled=True)
+                raise
+            except Exception as exc:
+                await reply(request_id, error=str(exc))
+            else:
+                await reply(request_id, result=result)
+            finally:
+                pending.pop(request_id, None)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                request_id = request['id']
+                op = request['op']
+                if op == 'cancel':
+                    task = pending.get(request['args'][0])
+                    if task is not None:
+                        task.cancel()
+                    continue
+                if op not in self.OPERATIONS:
+                    await reply(request_id, error=f"Unknown operation {op}")
+                    continue
+                if op == 'receive':
+                    pending[request_id] = asyncio.create_task(run(request_id, op, request['args']))
+                else:
+                    await run(request_id, op, request['args'])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for task in pending.values():
+                task.cancel()
+            writer.close()
+
+
+class SocketShard:
+    """
+    Shard client talking to a ChannelBroker over a unix socket.
+
+    One connection is kept per event loop, with requests multiplexed over it
+    by id so a blocking receive does not hold up sends.
+    """
+
+    STREAM_LIMIT = 2 ** 24
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = weakref.WeakKeyDictionary()
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        connection = self._connections.get(loop)
+        if connection is None or connection.closed:
+            connection = _BrokerConnection(self.path)
+            await connection.open()
+            self._connections[loop] = connection
+        return connection
+
+    async def _call(self, op, *args):
+        connection = await self._connection()
+        return await connection.call(op, list(args))
+
+    async def send_many(self, messages, entries, expires):
+        return await self._call('send_many', messages, entries, expires)
+
+    async def receive(self, channel):
+        connection = await self._connection()
+        return await connection.call('receive', [channel], on_orphan=self._requeue)
+
+    async def _requeue(self, connection, args, message):
+        # A receive was cancelled after the broker had already popped a message
+        await connection.call('unreceive', [args[0], message, time.time() + 60])
+
+    async def group_add(self, group, channel, joined_at):
+        await self._call('group_add', group, channel, joined_at)
+
+    async def group_discard(self, group, channel):
+        await self._call('group_discard', group, channel)
+
+    async def group_channels(self, groups, joined_after):
+        return await self._call('group_channels', groups, joined_after)
+
+    async def flush(self):
+        await self._call('flush')
+
+    async def close(self):
+        connection = self._connections.pop(asyncio.get_running_loop(), None)
+        if connection is not None:
+            await connection.close()
+
+
+class _BrokerConnection:
+    def __init__(self, path):
+        self.path = path
+        self.reader = None
+        self.writer = None
+        self.futures = {}
+        self.orphan_handlers = {}
+        self.next_id = 0
+        self.reader_task = None
+        self.closed = False
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(
+            self.path, limit=SocketShard.STREAM_LIMIT
+        )
+        self.reader_task = asyncio.create_task(self._read_replies())
+
+    async def _read_replies(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self.futures.pop(reply['id'], None)
+                handler = self.orphan_handlers.pop(reply['id'], None)
+                if future is None or future.done():
+                    if handler is not None and 'result' in reply:
+                        asyncio.create_task(handler[0](self, handler[1], reply['result']))
+                    continue
+                if 'error' in reply:
+                    future.set_exception(RuntimeError(reply['error']))
+                elif reply.get('cancelled'):
+                    future.cancel()
+                else:
+                    future.set_result(reply['result'])
+        finally:
+            self.closed = True
+            for future in self.futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Channel broker connection lost"))
+            self.futures = {}
+
+    async def call(self, op, args, on_orphan=None):
+        self.next_id += 1
+        request_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.futures[request_id] = future
+        if on_orphan is not None:
+            self.orphan_handlers[request_id] = (on_orphan, args)
+        self.writer.write(json.dumps({'id': request_id, 'op': op, 'args': args}).encode() + b'\n')
+        await self.writer.drain()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Keep listening for the reply so an already-popped message can be requeued
+            if not self.closed and not self.writer.is_closing():
+                self.writer.write(json.dumps({'id': 0, 'op': 'cancel', 'args': [request_id]}).encode() + b'\n')
+            raise
+        finally:
+            if on_orphan is not None and future.done() and not future.cancelled():
+                self.orphan_handlers.pop(request_id, None)
+
+    async def close(self):
+        self.closed = True
+        self.writer.close()
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+
+
+class RedisShard:
+    """
+    Shard backed by a Redis server, for production deployments.
+
+    Channels are Redis lists and groups are sorted sets scored by join time.
+    Requires the optional `redis` package.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='asgi'):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise ImproperlyConfigured("RedisShard requires the 'redis' package")
+        self.prefix = prefix
+        self.client = aioredis.Redis.from_url(url)
+
+    def _channel_key(self, channel):
+        return f"{self.prefix}:channel:{channel}"
+
+    def _group_key(self, group):
+        return f"{self.prefix}:group:{group}"
+
+    async def send_many(self, messages, entries, expires):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for channel, _, _ in entries:
+                pipe.llen(self._channel_key(channel))
+            lengths = await pipe.execute()
+
+        full = []
+        ttl = max(1, int(expires - time.time()) + 1)
+        encoded = [json.dumps({'expires': expires, 'message': message}) for message in messages]
+        async with self.client.pipeline(transaction=False) as pipe:
+            for (channel, index, capacity), length in zip(entries, lengths):
+                if length >= capacity:
+                    full.append(channel)
+                    continue
+                key = self._channel_key(channel)
+                pipe.rpush(key, encoded[index])
+                pipe.expire(key, ttl)
+            await pipe.execute()
+        return full
+
+    async def receive(self, channel):
+        key = self._channel_key(channel)
+        while True:
+            popped = await self.client.blpop([key], timeout=5)
+            if popped is None:
+                continue
+            payload = json.loads(popped[1])
+            if payload['expires'] >= time.time():
+                return payload['message']
+
+    async def unreceive(self, channel, message, expires):
+        await self.client.lpush(self._channel_key(channel), json.dumps({'expires': expires, 'message': message}))
+
+    async def group_add(self, group, channel, joined_at):
+        await self.client.zadd(self._group_key(group), {channel: joined_at})
+
+    async def group_discard(self, group, channel):
+        await self.client.zrem(self._group_key(group), channel)
+
+    async def group_channels(self, groups, joined_after):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for group in groups:
+                key = self._group_key(group)
+                pipe.zremrangebyscore(key, 0, joined_after)
+                pipe.zrange(key, 0, -1)
+            replies = await pipe.execute()
+        return {
+            group: [channel.decode() for channel in replies[index * 2 + 1]]
+            for index, group in enumerate(groups)
+        }
+
+    async def flush(self):
+        async for key in self.client.scan_iter(match=f"{self.prefix}:*"):
+            await self.client.delete(key)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class ShardedChannelLayer(BaseChannelLayer):
+    """
+    Channel layer that spreads channels and groups over several shards.
+
+    Channels and groups are placed on shards by consistent hashing, so a
+    group like `chat_<room_id>` lives on one shard while its members' queues
+    may live on others. Group sends are batched: one round trip per shard to
+    resolve members, then one per shard to deliver.
+
+    Example configuration for two brokers started with `runchannelbroker`:
+
+        CHANNEL_LAYERS = {
+            'default': {
+                'BACKEND': 'chat.layers.ShardedChannelLayer',
+                'CONFIG': {
+                    'shards': [
+                        {'BACKEND': 'chat.layers.SocketShard', 'CONFIG': {'path': '/run/chat-0.sock'}},
+                        {'BACKEND': 'chat.layers.SocketShard', 'CONFIG': {'path': '/run/chat-1.sock'}},
+                    ],
+                },
+            },
+        }
+
+    Use `chat.layers.RedisShard` with a `url` to back shards with Redis.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(
+        self,
+        shards=None,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        replicas=64,
+        **kwargs
+    ):
+        if kwargs:
+            raise ImproperlyConfigured(
+                f"Unknown ShardedChannelLayer options: {', '.join(sorted(kwargs))}. Expected shards, "
+                "expiry, group_expiry, capacity, channel_capacity or replicas."
+            )
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.group_expiry = group_expiry
+        self.shards = [self._make_shard(spec) for spec in shards or [{'BACKEND': 'chat.layers.LocalShard'}]]
+        self.ring = HashRing(len(self.shards), replicas=replicas)
+        self.client_prefix = ''.join(random.choice(string.ascii_letters) for _ in range(8))
+
+    @staticmethod
+    def _make_shard(spec):
+        try:
+            shard_class = import_string(spec['BACKEND'])
+        except (KeyError, ImportError) as exc:
+            raise ImproperlyConfigured(f"Invalid channel layer shard {spec!r}: {exc}")
+        return shard_class(**spec.get('CONFIG', {}))
+
+    def _shard_for(self, name):
+        return self.shards[self.ring.get(name)]
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        assert "__asgi_channel__" not in message
+
+        full = await self._shard_for(channel).send_many(
+            [message],
+            [(channel, 0, self.get_capacity(channel))],
+            time.time() + self.expiry
+        )
+        if full:
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        return await self._shard_for(channel).receive(channel)
+
+    async def new_channel(self, prefix="specific."):
+        return "%s.%s!%s" % (
+            prefix,
+            self.client_prefix,
+            "".join(random.choice(string.ascii_letters) for i in range(12)),
+        )
+
+    # Flush extension
+
+    async def flush(self):
+        await asyncio.gather(*(shard.flush() for shard in self.shards))
+
+    async def close(self):
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        await self._shard_for(group).group_add(group, channel, time.time())
+
+    async def group_discard(self, group, channel):
+        assert self.valid_channel_name(channel), "Invalid channel name"
+        assert self.valid_group_name(group), "Invalid group name"
+        await self._shard_for(group).group_discard(group, channel)
+
+    async def group_send(self, group, message):
+        await self.group_send_many([(group, message)])
+
+    async def group_send_many(self, events):
+        """
+        Send several (group, message) pairs with one round trip per shard to
+        look up members and one per shard to deliver. Full channels are
+        skipped, as with group_send.
+        """
+        groups_by_shard = {}
+        for group, message in events:
+            assert isinstance(message, dict), "Message is not a dict"
+            assert self.valid_group_name(group), "Invalid group name"
+            groups_by_shard.setdefault(self.ring.get(group), set()).add(group)
+
+        joined_after = time.time() - self.group_expiry
+        lookups = await asyncio.gather(*(
+            self.shards[index].group_channels(sorted(groups), joined_after)
+            for index, groups in groups_by_shard.items()
+        ))
+        members = {}
+        for lookup in lookups:
+            members.update(lookup)
+
+        messages = []
+        entries_by_shard = {}
+        for group, message in events:
+            channels = members.get(group)
+            if not channels:
+                continue
+            messages.append(message)
+            for channel in channels:
+                entries_by_shard.setdefault(self.ring.get(channel), []).append(
+                    (channel, len(messages) - 1, self.get_capacity(channel))
+                )
+
+        expires = time.time() + self.expiry
+        await asyncio.gather(*(
+            self.shards[index].send_many(messages, entries, expires)
+            for index, entries in entries_by_shard.items()
+        ))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from chat.models import ChatRoom
+
+
+class Command(BaseCommand):
+    help = "Set direct_key on existing two-participant chat rooms"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        taken = set(
+            ChatRoom.objects.filter(direct_key__isnull=False).values_list('direct_key', flat=True)
+        )
+
+        rooms = ChatRoom.objects.filter(
+            direct_key__isnull=True
+        ).annotate(
+            participant_count=Count('participants')
+        ).filter(
+            participant_count=2
+        ).order_by('created_at', 'id').prefetch_related('participants')
+
+        updated = []
+        assigned = 0
+        duplicates = 0
+        for room in rooms.iterator(chunk_size=batch_size):
+            key = ChatRoom.direct_key_for(*(user.pk for user in room.participants.all()))
+            if key in taken:
+                # The oldest room for a pair keeps the key; later duplicates stay group rooms
+                duplicates += 1
+                continue
+            taken.add(key)
+            room.direct_key = key
+            updated.append(room)
+            assigned += 1
+
+            if len(updated) >= batch_size and not options['dry_run']:
+                ChatRoom.objects.bulk_update(updated, ['direct_key'])
+                updated = []
+
+        if updated and not options['dry_run']:
+            ChatRoom.objects.bulk_update(updated, ['direct_key'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Assigned direct keys to {assigned} room(s)"
+            f"{' (dry run)' if options['dry_run'] else ''}; skipped {duplicates} duplicate room(s)"
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from chat.models import Message
+from chat.search import get_message_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the chat message full-text search index from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        index = get_message_index()
+        index.clear()
+
+        batch = []
+        total = 0
+        for message in Message.objects.only('id', 'room_id', 'content').order_by('id').iterator(chunk_size=options['batch_size']):
+            batch.append(message)
+            if len(batch) >= options['batch_size']:
+                index.index(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            index.index(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {total} message(s) with {index.__class__.__name__}"
+        ))
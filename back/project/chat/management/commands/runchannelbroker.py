@@ -0,0 +1,27 @@
+import asyncio
+import os
+
+from django.core.management.base import BaseCommand
+
+from chat.layers import ChannelBroker
+
+
+class Command(BaseCommand):
+    help = "Run a unix-socket channel broker shard for chat.layers.ShardedChannelLayer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Unix socket path to listen on")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if os.path.exists(path):
+            os.unlink(path)
+
+        self.stdout.write(f"Channel broker listening on {path}")
+        try:
+            asyncio.run(ChannelBroker(path).serve_forever())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import ChatRoom
+
+
+class RoomMembershipCache:
+    """
+    Maps room ids to the frozenset of their participant ids.
+
+    Without further setup, lookups are served from a bounded per-process LRU
+    whose entries live for `local_ttl` seconds. Invalidations only reach the
+    process that made them, so with several workers a membership change can
+    take up to `local_ttl` to be seen everywhere.
+
+    When the CHAT_MEMBERSHIP_CACHE setting names a Django cache alias, that
+    shared cache is used instead of the local LRU, so an invalidation is
+    seen by every worker at once. Entries are invalidated from m2m_changed
+    on ChatRoom.participants (see chat.signals).
+    """
+
+    def __init__(self, max_rooms=None, local_ttl=None, shared_timeout=None):
+        self.max_rooms = max_rooms or getattr(settings, 'CHAT_MEMBERSHIP_CACHE_SIZE', 10000)
+        self.local_ttl = local_ttl if local_ttl is not None else getattr(
+            settings, 'CHAT_MEMBERSHIP_LOCAL_TTL', 60
+        )
+        self.shared_timeout = shared_timeout or getattr(settings, 'CHAT_MEMBERSHIP_SHARED_TIMEOUT', 3600)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'CHAT_MEMBERSHIP_CACHE', None)
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def _shared_key(room_id):
+        return f'chat:room-members:{room_id}'
+
+    def peek(self, room_id):
+        """
+        Return the cached participant ids for a room, or None on a local miss.
+        Never touches the database or the shared cache, so it is safe to call
+        from async code. Always misses when a shared cache is configured.
+        """
+        room_id = int(room_id)
+        if self.shared is not None:
+            return None
+        with self._lock:
+            entry = self._entries.get(room_id)
+            if entry is None:
+                return None
+            participant_ids, expires = entry
+            if expires < time.monotonic():
+                del self._entries[room_id]
+                return None
+            self._entries.move_to_end(room_id)
+            return participant_ids
+
+    def _store_local(self, room_id, participant_ids):
+        with self._lock:
+            self._entries[room_id] = (participant_ids, time.monotonic() + self.local_ttl)
+            self._entries.move_to_end(room_id)
+            while len(self._entries) > self.max_rooms:
+                self._entries.popitem(last=False)
+
+    def get_participant_ids(self, room_id):
+        """
+        Return the participant ids for a room, loading them on a miss. A room
+        that does not exist has no participants.
+        """
+        room_id = int(room_id)
+        participant_ids = self.peek(room_id)
+        if participant_ids is not None:
+            return participant_ids
+
+        shared = self.shared
+        if shared is not None:
+            cached = shared.get(self._shared_key(room_id))
+            if cached is not None:
+                return frozenset(cached)
+
+        participant_ids = frozenset(
+            ChatRoom.participants.through.objects.filter(
+                chatroom_id=room_id
+            ).values_list('user_id', flat=True)
+        )
+        if shared is not None:
+            shared.set(self._shared_key(room_id), list(participant_ids), self.shared_timeout)
+        else:
+            self._store_local(room_id, participant_ids)
+        return participant_ids
+
+    def is_participant(self, room_id, user):
+        if not user.is_authenticated:
+            return False
+        return user.id in self.get_participant_ids(room_id)
+
+    def invalidate(self, room_ids):
+        room_ids = [int(room_id) for room_id in room_ids]
+        with self._lock:
+            for room_id in room_ids:
+                self._entries.pop(room_id, None)
+
+        shared = self.shared
+        if shared is not None:
+            shared.delete_many([self._shared_key(room_id) for room_id in room_ids])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+room_membership = RoomMembershipCache()
@@ -1,5 +1,79 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
+from django.utils import timezone
+
+
+class ChatRoomQuerySet(models.QuerySet):
+    def for_inbox(self, user):
+        """
+        Annotate each room with its last message and the user's unread count,
+        ordered by most recent activity. Everything is resolved in a single
+        query plus one prefetch for participants.
+        """
+        last_message = Message.objects.filter(
+            room=OuterRef('pk')
+        ).order_by('-created_at', '-id')
+        
+        watermark = RoomReadState.objects.filter(
+            room=OuterRef(OuterRef('pk')),
+            user=user
+        ).values('last_read_message_id')[:1]
+        
+        unread = Message.objects.filter(
+            room=OuterRef('pk'),
+            id__gt=Coalesce(Subquery(watermark), 0)
+        ).exclude(
+            sender=user
+        ).order_by().values('room').annotate(count=Count('pk')).values('count')
+        
+        # The last message counts as read once anyone but its sender has read past it
+        last_message_read = RoomReadState.objects.filter(
+            room=OuterRef('pk'),
+            last_read_message_id__gte=OuterRef('last_message_id')
+        ).exclude(
+            user=OuterRef('last_message_sender_id')
+        )
+        
+        return self.prefetch_related('participants').annotate(
+            last_message_id=Subquery(last_message.values('id')[:1]),
+            last_message_content=Subquery(last_message.values('content')[:1]),
+            last_message_sender_id=Subquery(last_message.values('sender_id')[:1]),
+            last_message_sender_first_name=Subquery(last_message.values('sender__first_name')[:1]),
+            last_message_sender_last_name=Subquery(last_message.values('sender__last_name')[:1]),
+            last_message_created_at=Subquery(last_message.values('created_at')[:1]),
+            unread_count=Coalesce(Subquery(unread), 0),
+        ).annotate(
+            last_message_is_read=Exists(last_message_read),
+        ).order_by(F('last_message_at').desc(nulls_last=True), '-created_at')
+    
+    def for_detail(self):
+        """
+        Prefetch only the latest CHAT_PREVIEW_SIZE messages, with their
+        senders and attachments, into `latest_messages`, newest first.
+        Older messages are paged from the room's messages endpoint.
+        """
+        preview_size = getattr(settings, 'CHAT_PREVIEW_SIZE', 50)
+        latest = Message.objects.select_related('sender').prefetch_related(
+            'attachments'
+        ).order_by('-created_at', '-id')
+        
+        return self.prefetch_related(
+            Prefetch('messages', queryset=latest[:preview_size], to_attr='latest_messages')
+        )
+    
+    def get_or_create_direct(self, user_id, other_user_id):
+        """
+        Return (room, created) for the direct-message room between two users.
+        The unique direct_key makes concurrent calls converge on one room.
+        """
+        direct_key = ChatRoom.direct_key_for(user_id, other_user_id)
+        with transaction.atomic():
+            room, created = self.get_or_create(direct_key=direct_key)
+            if created:
+                room.participants.add(user_id, other_user_id)
+        return room, created
 
 
 class ChatRoom(models.Model):
@@ -8,6 +82,17 @@ class ChatRoom(models.Model):
         related_name='chat_rooms'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized from the newest message so the inbox can be ordered by an index
+    last_message_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # "<lower user id>:<higher user id>" for one-to-one rooms, null for group rooms
+    direct_key = models.CharField(max_length=41, null=True, blank=True, unique=True)
+    
+    objects = ChatRoomQuerySet.as_manager()
+    
+    @staticmethod
+    def direct_key_for(user_id, other_user_id):
+        low, high = sorted((int(user_id), int(other_user_id)))
+        return f"{low}:{high}"
     
     def __str__(self):
         participant_list = ', '.join([user.email for user in self.participants.all()])
@@ -27,10 +112,14 @@ class Message(models.Model):
     )
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['room', 'created_at'], name='chat_msg_room_created_idx'),
+            # Unread counts are range scans above a user's read watermark
+            models.Index(fields=['room', 'id'], name='chat_msg_room_id_idx'),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender.email} in {self.room}"
@@ -46,4 +135,95 @@ class MessageAttachment(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"Attachment for message ID: {self.message.id}"
\ No newline at end of file
+        return f"Attachment for message ID: {self.message.id}"
+
+
+class MessageSearchTerm(models.Model):
+    """
+    Posting list entry for chat search when SQLite FTS5 is not available:
+    `term` appears `weight` times in `message`.
+    """
+    term = models.CharField(max_length=64)
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    weight = models.PositiveSmallIntegerField(default=1)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'room', 'message'], name='chat_search_term_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} in message {self.message_id}"
+
+
+class RoomReadStateQuerySet(models.QuerySet):
+    def advance(self, room_id, user_id, message_id=None):
+        """
+        Move a user's read watermark in a room forward to `message_id`, or to
+        the newest message when it is None. The watermark never moves back and
+        is clamped to messages that actually belong to the room. Returns the
+        resulting watermark.
+        """
+        newest = Message.objects.filter(room_id=room_id)
+        if message_id is not None:
+            newest = newest.filter(id__lte=message_id)
+        
+        updated = self.filter(room_id=room_id, user_id=user_id).update(
+            last_read_message_id=Greatest(
+                F('last_read_message_id'),
+                Coalesce(Subquery(newest.order_by('-id').values('id')[:1]), 0)
+            ),
+            updated_at=timezone.now()
+        )
+        if updated:
+            return self.filter(room_id=room_id, user_id=user_id).values_list(
+                'last_read_message_id', flat=True
+            ).first()
+        
+        last_read = newest.aggregate(last_read=Max('id'))['last_read'] or 0
+        try:
+            with transaction.atomic():
+                self.create(room_id=room_id, user_id=user_id, last_read_message_id=last_read)
+        except IntegrityError:
+            # Someone else created the row first; fold our value into theirs
+            self.filter(room_id=room_id, user_id=user_id).update(
+                last_read_message_id=Greatest(F('last_read_message_id'), last_read),
+                updated_at=timezone.now()
+            )
+        return last_read
+
+
+class RoomReadState(models.Model):
+    """
+    Per-user read watermark for a room: every message with an id up to
+    `last_read_message_id` has been read by `user`.
+    """
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='read_states'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chat_read_states'
+    )
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = RoomReadStateQuerySet.as_manager()
+    
+    class Meta:
+        unique_together = ['room', 'user']
+    
+    def __str__(self):
+        return f"{self.user.email} read {self.room} up to message {self.last_read_message_id}"
\ No newline at end of file
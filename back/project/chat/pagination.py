@@ -0,0 +1,124 @@
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Keyset pagination over a room's messages, newest first.
+
+    Clients page with `before=<message id>` (older messages) or
+    `after=<message id>` (newer messages) and an optional `limit`. Each page
+    is an index range scan on (room, created_at), so the cost does not grow
+    with the size of the room.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'limit'
+    before_query_param = 'before'
+    after_query_param = 'after'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_cursor(self, request, param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({param: "Must be a message id"})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        before = self.get_cursor(request, self.before_query_param)
+        after = self.get_cursor(request, self.after_query_param)
+
+        if before is not None and after is not None:
+            raise ValidationError("Only one of 'before' or 'after' may be provided")
+
+        self.direction = 'after' if after is not None else 'before'
+        self.has_cursor = before is not None or after is not None
+        pivot_id = after if after is not None else before
+
+        if pivot_id is not None:
+            pivot_created_at = (
+                queryset.order_by()
+                .filter(pk=pivot_id)
+                .values_list('created_at', flat=True)
+                .first()
+            )
+            if pivot_created_at is None:
+                raise ValidationError("Unknown message cursor")
+
+            if self.direction == 'after':
+                queryset = queryset.filter(
+                    Q(created_at__gt=pivot_created_at) |
+                    Q(created_at=pivot_created_at, pk__gt=pivot_id)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=pivot_created_at) |
+                    Q(created_at=pivot_created_at, pk__lt=pivot_id)
+                )
+
+        if self.direction == 'after':
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+
+        page = list(queryset[:self.page_size_value + 1])
+        self.has_more = len(page) > self.page_size_value
+        page = page[:self.page_size_value]
+
+        # Pages are always returned newest first
+        if self.direction == 'after':
+            page.reverse()
+
+        self.page = page
+        return page
+
+    def get_older_link(self):
+        if not self.page:
+            return None
+        if self.direction == 'before' and not self.has_more:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.after_query_param)
+        return replace_query_param(url, self.before_query_param, self.page[-1].pk)
+
+    def get_newer_link(self):
+        if not self.page:
+            return None
+        if self.direction == 'before' and not self.has_cursor:
+            return None
+        if self.direction == 'after' and not self.has_more:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.before_query_param)
+        return replace_query_param(url, self.after_query_param, self.page[0].pk)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_older_link(),
+            'previous': self.get_newer_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
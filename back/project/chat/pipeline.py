@@ -0,0 +1,282 @@
+import asyncio
+import atexit
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+
+from .models import Message, RoomReadState
+from .signals import messages_persisted
+
+
+class MessageWriteBehindQueue:
+    """
+    Per-process write-behind queue for chat messages.
+
+    Consumers broadcast a message straight away under a provisional id and
+    hand it to this queue. Pending messages are written with a single
+    bulk_create once the batch is full or the flush interval passes, and
+    each room group then receives one ack frame mapping provisional ids to
+    persisted ids.
+
+    If the database cannot be reached, the batch goes back to the head of
+    the queue and is retried with exponential backoff. Messages that still
+    fail after CHAT_MESSAGE_MAX_ATTEMPTS are acked with an error.
+    """
+
+    def __init__(self, flush_interval=None, batch_size=None, max_pending=None):
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(
+            settings, 'CHAT_MESSAGE_FLUSH_INTERVAL', 0.05
+        )
+        self.batch_size = batch_size or getattr(settings, 'CHAT_MESSAGE_BATCH_SIZE', 200)
+        self.max_pending = max_pending or getattr(settings, 'CHAT_MESSAGE_MAX_PENDING', 5000)
+        self.max_attempts = getattr(settings, 'CHAT_MESSAGE_MAX_ATTEMPTS', 5)
+        self.max_backoff = getattr(settings, 'CHAT_MESSAGE_RETRY_BACKOFF_MAX', 5.0)
+        self.pending = []
+        self._timer = None
+        self._lock = None
+        self._retry_at = None
+
+    @staticmethod
+    def new_provisional_id():
+        return f"tmp-{uuid.uuid4().hex}"
+
+    async def submit(self, room_id, sender_id, content, provisional_id):
+        # Apply backpressure rather than letting the queue grow without bound
+        if len(self.pending) >= self.max_pending:
+            await self.flush()
+
+        self.pending.append({
+            'room_id': room_id,
+            'sender_id': sender_id,
+            'content': content,
+            'provisional_id': provisional_id,
+            'attempts': 0,
+        })
+
+        if len(self.pending) >= self.batch_size and not self.backing_off():
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later(self.flush_interval))
+
+    def backing_off(self):
+        return self._retry_at is not None and time.monotonic() < self._retry_at
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+                self._timer = None
+
+            batch, self.pending = self.pending, []
+            if not batch:
+                return
+
+            try:
+                persisted = await database_sync_to_async(self.persist)(batch)
+            except DatabaseError:
+                await self.retry(batch)
+                return
+            self._retry_at = None
+            await self.acknowledge(batch, persisted)
+
+    async def retry(self, batch):
+        """
+        Put a batch that could not be written back at the head of the queue
+        and schedule the next attempt, failing the messages that are out of
+        attempts.
+        """
+        for item in batch:
+            item['attempts'] += 1
+        retry = [item for item in batch if item['attempts'] < self.max_attempts]
+        expired = [item for item in batch if item['attempts'] >= self.max_attempts]
+        self.pending = retry + self.pending
+
+        if retry:
+            attempts = max(item['attempts'] for item in retry)
+            delay = min(self.flush_interval * 2 ** attempts, self.max_backoff)
+            self._retry_at = time.monotonic() + delay
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = asyncio.create_task(self._flush_later(delay))
+        if expired:
+            await self.acknowledge(expired, [None] * len(expired))
+
+    async def drain(self):
+        """Flush everything still pending, e.g. on shutdown."""
+        while self.pending:
+            if self.backing_off():
+                await asyncio.sleep(self._retry_at - time.monotonic())
+            await self.flush()
+
+    def persist(self, batch):
+        """
+        Write a batch and return the created Message instances in batch order,
+        with None in place of rows that could not be saved.
+        """
+        messages = [
+            Message(room_id=item['room_id'], sender_id=item['sender_id'], content=item['content'])
+            for item in batch
+        ]
+
+        try:
+            with transaction.atomic():
+                created = Message.objects.bulk_create(messages)
+        except IntegrityError:
+            # A room or sender went away mid-batch; insert rows one by one to isolate it
+            created = []
+            for message in messages:
+                try:
+                    with transaction.atomic():
+                        Message.objects.bulk_create([message])
+                    created.append(message)
+                except IntegrityError:
+                    created.append(None)
+
+        saved = [message for message in created if message is not None]
+        if saved:
+            messages_persisted.send(sender=Message, messages=saved)
+        return created
+
+    async def acknowledge(self, batch, persisted):
+        acks_by_room = {}
+        for item, message in zip(batch, persisted):
+            acks_by_room.setdefault(item['room_id'], []).append({
+                'provisional_id': item['provisional_id'],
+                'id': message.id if message is not None else None,
+                'created_at': message.created_at.isoformat() if message is not None else None,
+                'error': None if message is not None else "Message could not be saved",
+            })
+
+        events = [
+            (f'chat_{room_id}', {'type': 'messages_persisted', 'messages': acks})
+            for room_id, acks in acks_by_room.items()
+        ]
+
+        channel_layer = get_channel_layer()
+        group_send_many = getattr(channel_layer, 'group_send_many', None)
+        if group_send_many is not None:
+            await group_send_many(events)
+        else:
+            for group, event in events:
+                await channel_layer.group_send(group, event)
+
+
+class ReadReceiptBuffer:
+    """
+    Coalesces read receipts per (room, user) within a flush interval.
+
+    A burst of `read` frames only raises the buffered watermark in memory;
+    each flush then does one RoomReadState upsert and one `messages_read`
+    broadcast per user per room.
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(
+            settings, 'CHAT_READ_RECEIPT_INTERVAL', 1.0
+        )
+        self.pending = {}
+        self._timer = None
+        self._lock = None
+
+    async def submit(self, room_id, user_id, message_id):
+        key = (int(room_id), user_id)
+        if message_id > self.pending.get(key, 0):
+            self.pending[key] = message_id
+
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+                self._timer = None
+
+            pending, self.pending = self.pending, {}
+            if not pending:
+                return
+
+            watermarks = await database_sync_to_async(self.persist)(pending)
+
+            events = [
+                (f'chat_{room_id}', {
+                    'type': 'messages_read',
+                    'reader_id': user_id,
+                    'last_read_message_id': last_read,
+                })
+                for (room_id, user_id), last_read in watermarks.items()
+                if last_read
+            ]
+            channel_layer = get_channel_layer()
+            group_send_many = getattr(channel_layer, 'group_send_many', None)
+            if group_send_many is not None:
+                await group_send_many(events)
+            else:
+                for group, event in events:
+                    await channel_layer.group_send(group, event)
+
+    def persist(self, pending):
+        return {
+            (room_id, user_id): RoomReadState.objects.advance(room_id, user_id, message_id)
+            for (room_id, user_id), message_id in pending.items()
+        }
+
+
+message_queue = MessageWriteBehindQueue()
+read_receipts = ReadReceiptBuffer()
+
+
+@atexit.register
+def drain_on_exit():
+    """
+    Write whatever is still buffered when the process exits. Daphne sends no
+    lifespan events, so this is what saves pending messages on a normal
+    shutdown or restart; the sockets are gone by then, so no acks are sent.
+    A process that is killed outright still loses up to one flush interval.
+    """
+    pending, message_queue.pending = message_queue.pending, []
+    receipts, read_receipts.pending = read_receipts.pending, {}
+    try:
+        if pending:
+            message_queue.persist(pending)
+        if receipts:
+            read_receipts.persist(receipts)
+    except DatabaseError:
+        pass
+
+
+async def lifespan(scope, receive, send):
+    """
+    ASGI lifespan handler that drains pending chat messages and read
+    receipts on shutdown, for servers that send lifespan events. Under
+    Daphne, drain_on_exit does it instead.
+    """
+    while True:
+        event = await receive()
+        if event['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif event['type'] == 'lifespan.shutdown':
+            await message_queue.drain()
+            await read_receipts.flush()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
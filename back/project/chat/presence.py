@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+from django.conf import settings
+
+
+class PresenceEntry:
+    __slots__ = ('last_seen', 'typing_until')
+
+    def __init__(self):
+        self.last_seen = 0.0
+        self.typing_until = 0.0
+
+
+class PresenceTracker:
+    """
+    Per-process online and typing state for chat rooms.
+
+    Each room maps user ids to a small slotted entry with when the user was
+    last seen. Users drop out once they have not been seen for
+    CHAT_PRESENCE_TTL seconds, so a worker that dies without running
+    disconnect does not leave users online forever; a socket that is still
+    open puts its user back on its next heartbeat or typing event.
+
+    Open sockets are counted per room and user separately from the
+    entries, so an expiry does not lose the count and the user only goes
+    offline when their last socket closes.
+
+    Only sockets connected to this process are known here, so snapshots
+    are complete only when chat runs on a single worker. Presence and
+    typing broadcasts go through the channel layer and reach every worker.
+    """
+
+    def __init__(self, ttl=None, typing_ttl=None):
+        self.ttl = ttl or getattr(settings, 'CHAT_PRESENCE_TTL', 60)
+        self.typing_ttl = typing_ttl or getattr(settings, 'CHAT_TYPING_TTL', 5)
+        self.rooms = {}
+        self.sockets = {}
+
+    def _expire(self, room_id, now):
+        entries = self.rooms.get(room_id)
+        if not entries:
+            return
+        for user_id in [user_id for user_id, entry in entries.items() if entry.last_seen + self.ttl < now]:
+            del entries[user_id]
+        if not entries:
+            del self.rooms[room_id]
+
+    def connect(self, room_id, user_id):
+        """Register a socket; returns True if the user just came online."""
+        now = time.monotonic()
+        self._expire(room_id, now)
+        entry = self.rooms.setdefault(room_id, {}).get(user_id)
+        came_online = entry is None
+        if came_online:
+            entry = self.rooms[room_id][user_id] = PresenceEntry()
+        entry.last_seen = now
+        key = (room_id, user_id)
+        self.sockets[key] = self.sockets.get(key, 0) + 1
+        return came_online
+
+    def disconnect(self, room_id, user_id):
+        """Unregister a socket; returns True if the user just went offline."""
+        key = (room_id, user_id)
+        sockets = self.sockets.pop(key, 0) - 1
+        if sockets > 0:
+            # The user's other sockets in the room keep them online
+            self.sockets[key] = sockets
+            return False
+        if sockets < 0:
+            return False
+        # Also when the entry has expired, since expiry is not broadcast
+        entries = self.rooms.get(room_id, {})
+        entries.pop(user_id, None)
+        if not entries:
+            self.rooms.pop(room_id, None)
+        return True
+
+    def _touch(self, room_id, user_id, now):
+        # An open socket whose entry expired registers its user again; the
+        # socket count is kept apart, so it is still right
+        entry = self.rooms.setdefault(room_id, {}).get(user_id)
+        came_back = entry is None
+        if came_back:
+            entry = self.rooms[room_id][user_id] = PresenceEntry()
+        entry.last_seen = now
+        return entry, came_back
+
+    def heartbeat(self, room_id, user_id):
+        """Mark the user as seen; returns True if they were back online."""
+        entry, came_back = self._touch(room_id, user_id, time.monotonic())
+        return came_back
+
+    def set_typing(self, room_id, user_id, is_typing):
+        """Record typing state; returns True if the user was back online."""
+        now = time.monotonic()
+        entry, came_back = self._touch(room_id, user_id, now)
+        entry.typing_until = now + self.typing_ttl if is_typing else 0.0
+        return came_back
+
+    def snapshot(self, room_id):
+        now = time.monotonic()
+        self._expire(room_id, now)
+        entries = self.rooms.get(room_id, {})
+        return {
+            'online': sorted(entries),
+            'typing': sorted(user_id for user_id, entry in entries.items() if entry.typing_until > now),
+        }
+
+
+class TypingThrottle:
+    """
+    Rate-limits typing broadcasts to one per user per room every
+    CHAT_TYPING_INTERVAL_MS milliseconds.
+
+    Events inside the window are coalesced: only the latest state is kept and
+    it is sent when the window closes, and only if it differs from what was
+    last broadcast. State is kept until the user's last socket in the room
+    disconnects.
+    """
+
+    def __init__(self, interval_ms=None):
+        self.interval = (interval_ms or getattr(settings, 'CHAT_TYPING_INTERVAL_MS', 1000)) / 1000
+        self.connections = {}
+        self.last_sent = {}
+        self.pending = {}
+        self.timers = {}
+
+    def connect(self, room_id, user_id):
+        key = (room_id, user_id)
+        self.connections[key] = self.connections.get(key, 0) + 1
+
+    async def submit(self, room_id, user_id, is_typing, broadcast):
+        key = (room_id, user_id)
+        now = time.monotonic()
+        last = self.last_sent.get(key)
+
+        if last is None or now - last[0] >= self.interval:
+            if last is not None and last[1] == is_typing and now - last[0] < self.interval * 2:
+                # Repeating the state just sent is pure noise
+                return
+            self.last_sent[key] = (now, is_typing)
+            await broadcast(is_typing)
+            return
+
+        self.pending[key] = (is_typing, broadcast)
+        if key not in self.timers:
+            self.timers[key] = asyncio.create_task(self._send_trailing(key, last[0] + self.interval - now))
+
+    async def _send_trailing(self, key, delay):
+        await asyncio.sleep(delay)
+        self.timers.pop(key, None)
+        pending = self.pending.pop(key, None)
+        if pending is None:
+            return
+        is_typing, broadcast = pending
+        if self.last_sent.get(key, (0, None))[1] == is_typing:
+            return
+        self.last_sent[key] = (time.monotonic(), is_typing)
+        await broadcast(is_typing)
+
+    def disconnect(self, room_id, user_id):
+        key = (room_id, user_id)
+        connections = self.connections.pop(key, 0) - 1
+        if connections > 0:
+            # The user's other sockets in the room keep the state
+            self.connections[key] = connections
+            return
+        self.last_sent.pop(key, None)
+        self.pending.pop(key, None)
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+
+presence = PresenceTracker()
+typing_throttle = TypingThrottle()
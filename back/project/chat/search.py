@@ -0,0 +1,165 @@
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .models import Message, MessageSearchTerm
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text):
+    return [
+        token for token in TOKEN_RE.findall((text or '').lower())
+        if len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+class FTS5MessageIndex:
+    """
+    Chat search backed by an SQLite FTS5 virtual table.
+
+    Rows hold the message content and a `room_key` token ("r<room id>") so the
+    room restriction is resolved inside the full-text index instead of by
+    filtering matches afterwards. Results are ranked with bm25.
+    """
+
+    table = 'chat_message_fts'
+
+    def __init__(self):
+        self._ready = False
+
+    def ensure_table(self):
+        if self._ready:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                f"USING fts5(content, room_key, tokenize='unicode61')"
+            )
+        self._ready = True
+
+    def index(self, messages):
+        self.ensure_table()
+        rows = [(message.id, message.content, f"r{message.room_id}") for message in messages]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, content, room_key) VALUES (%s, %s, %s)", rows
+            )
+
+    def remove(self, message_ids):
+        self.ensure_table()
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in message_ids])
+
+    def clear(self):
+        self.ensure_table()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, terms, room_ids, limit, offset=0):
+        self.ensure_table()
+        match = '{content} : (%s) AND {room_key} : (%s)' % (
+            ' '.join(f'"{term}"' for term in terms),
+            ' OR '.join(f'r{int(room_id)}' for room_id in room_ids),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, 1.0, 0.0), rowid DESC LIMIT %s OFFSET %s",
+                [match, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostingsMessageIndex:
+    """
+    Portable chat search backed by the MessageSearchTerm posting table.
+
+    Each message contributes one row per distinct term, weighted by term
+    frequency. A query intersects the posting lists of its terms within the
+    user's rooms and ranks by summed weight, newest first on ties.
+    """
+
+    def index(self, messages):
+        messages = list(messages)
+        terms = []
+        for message in messages:
+            for term, weight in Counter(tokenize(message.content)).items():
+                terms.append(MessageSearchTerm(
+                    term=term,
+                    message_id=message.id,
+                    room_id=message.room_id,
+                    weight=min(weight, 32767)
+                ))
+        with transaction.atomic():
+            MessageSearchTerm.objects.filter(message_id__in=[message.id for message in messages]).delete()
+            MessageSearchTerm.objects.bulk_create(terms, batch_size=500)
+
+    def remove(self, message_ids):
+        MessageSearchTerm.objects.filter(message_id__in=message_ids).delete()
+
+    def clear(self):
+        MessageSearchTerm.objects.all().delete()
+
+    def search(self, terms, room_ids, limit, offset=0):
+        matches = MessageSearchTerm.objects.filter(
+            term__in=terms,
+            room_id__in=room_ids
+        ).values('message_id').annotate(
+            matched=Count('term', distinct=True),
+            score=Sum('weight')
+        ).filter(
+            matched=len(terms)
+        ).order_by('-score', '-message_id')
+        return [row['message_id'] for row in matches[offset:offset + limit]]
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.chat_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.chat_fts5_probe")
+    except Exception:
+        return False
+    return True
+
+
+_index = None
+
+
+def get_message_index():
+    """
+    Return the configured chat search backend. CHAT_SEARCH_BACKEND may be
+    'fts5', 'postings' or 'auto' (the default: FTS5 when SQLite supports it).
+    """
+    global _index
+    if _index is None:
+        backend = getattr(settings, 'CHAT_SEARCH_BACKEND', 'auto')
+        if backend == 'fts5' or (backend == 'auto' and fts5_available()):
+            _index = FTS5MessageIndex()
+        else:
+            _index = PostingsMessageIndex()
+    return _index
+
+
+def search_messages(query, room_ids, limit, offset=0):
+    """
+    Return up to `limit` Message instances matching every term of `query`
+    within `room_ids`, best match first.
+    """
+    terms = sorted(set(tokenize(query)))
+    room_ids = list(room_ids)
+    if not terms or not room_ids:
+        return []
+
+    message_ids = get_message_index().search(terms, room_ids, limit, offset)
+    messages = Message.objects.select_related('sender').prefetch_related('attachments').in_bulk(message_ids)
+    # The index may briefly hold rows for deleted messages; skip them
+    return [messages[pk] for pk in message_ids if pk in messages]
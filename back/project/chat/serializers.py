@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import ChatRoom, Message, MessageAttachment
+from .models import ChatRoom, Message, MessageAttachment, RoomReadState
 
 User = get_user_model()
 
@@ -14,18 +14,34 @@ class MessageAttachmentSerializer(serializers.ModelSerializer):
 class MessageSerializer(serializers.ModelSerializer):
     sender_name = serializers.SerializerMethodField()
     sender_role = serializers.SerializerMethodField()
+    is_read = serializers.SerializerMethodField()
     attachments = MessageAttachmentSerializer(many=True, read_only=True)
     
     class Meta:
         model = Message
         fields = ('id', 'room', 'sender', 'sender_name', 'sender_role', 'content', 'created_at', 'is_read', 'attachments')
-        read_only_fields = ('sender', 'created_at', 'is_read')
+        read_only_fields = ('sender', 'created_at')
     
     def get_sender_name(self, obj):
         return f"{obj.sender.first_name} {obj.sender.last_name}"
     
     def get_sender_role(self, obj):
         return obj.sender.role
+    
+    def get_is_read(self, obj):
+        # Watermarks are loaded once per room and shared through the context
+        watermarks = self.context.setdefault('read_watermarks', {})
+        if obj.room_id not in watermarks:
+            watermarks[obj.room_id] = dict(
+                RoomReadState.objects.filter(room_id=obj.room_id).values_list('user_id', 'last_read_message_id')
+            )
+        
+        # A message is read once anyone other than its sender has read past it
+        return any(
+            last_read >= obj.id
+            for user_id, last_read in watermarks[obj.room_id].items()
+            if user_id != obj.sender_id
+        )
 
 
 class ChatRoomSerializer(serializers.ModelSerializer):
@@ -35,11 +51,12 @@ class ChatRoomSerializer(serializers.ModelSerializer):
     )
     participant_details = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
     
     class Meta:
         model = ChatRoom
-        fields = ('id', 'participants', 'participant_details', 'last_message', 'created_at')
-        read_only_fields = ('created_at',)
+        fields = ('id', 'participants', 'participant_details', 'last_message', 'unread_count', 'last_message_at', 'created_at')
+        read_only_fields = ('last_message_at', 'created_at')
     
     def get_participant_details(self, obj):
         return [
@@ -53,17 +70,39 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         ]
     
     def get_last_message(self, obj):
-        last_message = obj.messages.order_by('-created_at').first()
+        # Rooms from ChatRoom.objects.for_inbox() carry the last message as annotations
+        if hasattr(obj, 'last_message_created_at'):
+            if obj.last_message_created_at is None:
+                return None
+            return {
+                'content': obj.last_message_content,
+                'sender': obj.last_message_sender_id,
+                'sender_name': f"{obj.last_message_sender_first_name} {obj.last_message_sender_last_name}",
+                'created_at': obj.last_message_created_at,
+                'is_read': obj.last_message_is_read
+            }
+        
+        last_message = obj.messages.select_related('sender').order_by('-created_at', '-id').first()
         if last_message:
             return {
                 'content': last_message.content,
                 'sender': last_message.sender.id,
                 'sender_name': f"{last_message.sender.first_name} {last_message.sender.last_name}",
                 'created_at': last_message.created_at,
-                'is_read': last_message.is_read
+                'is_read': obj.read_states.filter(
+                    last_read_message_id__gte=last_message.id
+                ).exclude(user=last_message.sender).exists()
             }
         return None
     
+    def get_unread_count(self, obj):
+        if hasattr(obj, 'unread_count'):
+            return obj.unread_count
+        
+        user = self.context['request'].user
+        last_read = obj.read_states.filter(user=user).values_list('last_read_message_id', flat=True).first()
+        return obj.messages.filter(id__gt=last_read or 0).exclude(sender=user).count()
+    
     def validate_participants(self, value):
         # Ensure the current user is included in participants
         if self.context['request'].user not in value:
@@ -77,7 +116,12 @@ class ChatRoomSerializer(serializers.ModelSerializer):
 
 
 class ChatRoomDetailSerializer(ChatRoomSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
+    # Only the latest few, from ChatRoom.objects.for_detail(); older ones are paged from messages/
+    messages = serializers.SerializerMethodField()
     
     class Meta(ChatRoomSerializer.Meta):
-        fields = ChatRoomSerializer.Meta.fields + ('messages',)
\ No newline at end of file
+        fields = ChatRoomSerializer.Meta.fields + ('messages',)
+    
+    def get_messages(self, obj):
+        # Prefetched newest first, shown oldest first like the full history
+        return MessageSerializer(reversed(obj.latest_messages), many=True, context=self.context).data
\ No newline at end of file
@@ -0,0 +1,91 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+from .membership import room_membership
+from .models import ChatRoom, Message
+from .search import get_message_index
+
+# Sent with `messages=[...]` after the write-behind queue bulk-creates messages,
+# since bulk_create does not send post_save
+messages_persisted = Signal()
+
+
+def advance_last_message_at(room_id, created_at):
+    # Only move the timestamp forward so out-of-order saves cannot rewind it
+    ChatRoom.objects.filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lt=created_at),
+        pk=room_id
+    ).update(last_message_at=created_at)
+
+
+@receiver(post_save, sender=Message)
+def update_room_last_message_at(sender, instance, created, **kwargs):
+    if not created:
+        return
+    
+    advance_last_message_at(instance.room_id, instance.created_at)
+
+
+@receiver(post_save, sender=Message)
+def index_message(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or 'content' in update_fields:
+        get_message_index().index([instance])
+
+
+@receiver(post_delete, sender=Message)
+def unindex_message(sender, instance, **kwargs):
+    get_message_index().remove([instance.pk])
+
+
+@receiver(messages_persisted, sender=Message)
+def index_persisted_messages(sender, messages, **kwargs):
+    get_message_index().index(messages)
+
+
+@receiver(messages_persisted, sender=Message)
+def update_rooms_last_message_at(sender, messages, **kwargs):
+    latest = {}
+    for message in messages:
+        if message.room_id not in latest or message.created_at > latest[message.room_id]:
+            latest[message.room_id] = message.created_at
+    
+    for room_id, created_at in latest.items():
+        advance_last_message_at(room_id, created_at)
+
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def invalidate_room_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    
+    if not reverse:
+        room_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # user.chat_rooms.clear() does not report which rooms were affected
+        room_ids = instance._cleared_chat_room_ids = list(instance.chat_rooms.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        room_ids = instance.__dict__.pop('_cleared_chat_room_ids', [])
+    else:
+        room_ids = list(pk_set or ())
+    
+    room_membership.invalidate(room_ids)
+    
+    if action != 'pre_clear':
+        release_direct_keys(room_ids)
+
+
+def release_direct_keys(room_ids):
+    # A direct room that no longer has exactly its two keyed users stops being one
+    rooms = ChatRoom.objects.filter(
+        pk__in=room_ids,
+        direct_key__isnull=False
+    ).prefetch_related('participants')
+    for room in rooms:
+        participant_ids = sorted(user.pk for user in room.participants.all())
+        if len(participant_ids) != 2 or ChatRoom.direct_key_for(*participant_ids) != room.direct_key:
+            ChatRoom.objects.filter(pk=room.pk).update(direct_key=None)
+
+
+@receiver(post_delete, sender=ChatRoom)
+def forget_room_membership(sender, instance, **kwargs):
+    room_membership.invalidate([instance.pk])
\ No newline at end of file
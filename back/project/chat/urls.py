@@ -6,6 +6,7 @@ router = DefaultRouter()
 router.register(r'rooms', views.ChatRoomViewSet, basename='chat-room')
 
 urlpatterns = [
+    path('search/', views.MessageSearchView.as_view(), name='message-search'),
     path('', include(router.urls)),
     path('rooms/<int:room_id>/messages/', views.MessageListView.as_view(), name='message-list'),
     path('rooms/<int:room_id>/messages/create/', views.MessageCreateView.as_view(), name='message-create'),
@@ -1,10 +1,17 @@
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from .models import ChatRoom, Message, MessageAttachment
+from .models import ChatRoom, Message, MessageAttachment, RoomReadState
 from .serializers import ChatRoomSerializer, ChatRoomDetailSerializer, MessageSerializer, MessageAttachmentSerializer
+from .membership import room_membership
+from .pagination import MessageCursorPagination
+from .presence import presence as room_presence
+from .search import search_messages
+from uploads.storage import bulk_attach, completed_uploads, upload_ids_from
 
 
 class ChatRoomViewSet(viewsets.ModelViewSet):
@@ -13,18 +20,49 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         # Only return chat rooms where the current user is a participant
-        return ChatRoom.objects.filter(participants=self.request.user)
+        queryset = ChatRoom.objects.filter(participants=self.request.user).for_inbox(self.request.user)
+        if self.action == 'retrieve':
+            queryset = queryset.for_detail()
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ChatRoomDetailSerializer
         return ChatRoomSerializer
     
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created = self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+            headers=headers
+        )
+    
     def perform_create(self, serializer):
-        # Ensure current user is a participant
+        """Save the room and return whether it is new; an existing direct room is reused."""
+        participant_ids = {user.pk for user in serializer.validated_data['participants']}
+        participant_ids.add(self.request.user.pk)
+        if len(participant_ids) == 2:
+            # One-to-one rooms go through the direct key, as find_or_create does
+            serializer.instance, created = ChatRoom.objects.get_or_create_direct(*participant_ids)
+            return created
+        
+        # Ensure current user is a participant; add() skips existing rows
         chat_room = serializer.save()
-        if self.request.user not in chat_room.participants.all():
-            chat_room.participants.add(self.request.user)
+        chat_room.participants.add(self.request.user)
+        return True
+    
+    @action(detail=True, methods=['get'])
+    def presence(self, request, pk=None):
+        if not pk.isdigit() or not room_membership.is_participant(pk, request.user):
+            raise Http404("No ChatRoom matches the given query.")
+        
+        # Reflects sockets connected to this worker process
+        room_id = int(pk)
+        return Response({'room': room_id, **room_presence.snapshot(room_id)})
     
     @action(detail=False, methods=['get'])
     def find_or_create(self, request):
@@ -35,36 +73,35 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Find existing chat room with just these two participants
-        user_rooms = ChatRoom.objects.filter(participants=request.user)
-        other_user_rooms = ChatRoom.objects.filter(participants=other_user_id)
-        
-        # Find intersection of both users' rooms
-        common_rooms = user_rooms.intersection(other_user_rooms)
+        if not other_user_id.isdigit() or int(other_user_id) == request.user.id:
+            return Response(
+                {"error": "user_id must be the id of another user"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Further filter to find rooms with exactly 2 participants
-        for room in common_rooms:
-            if room.participants.count() == 2:
-                serializer = self.get_serializer(room)
-                return Response(serializer.data)
+        # Direct rooms are keyed by the sorted pair of user ids, so this is one indexed lookup
+        direct_key = ChatRoom.direct_key_for(request.user.id, other_user_id)
+        room = ChatRoom.objects.filter(direct_key=direct_key).first()
+        if room is not None:
+            serializer = self.get_serializer(room)
+            return Response(serializer.data)
         
-        # No existing room found, create a new one
         from django.contrib.auth import get_user_model
         User = get_user_model()
         
-        try:
-            other_user = User.objects.get(id=other_user_id)
-        except User.DoesNotExist:
+        if not User.objects.filter(id=other_user_id).exists():
             return Response(
                 {"error": "User with provided ID does not exist"},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        new_room = ChatRoom.objects.create()
-        new_room.participants.add(request.user, other_user)
+        room, created = ChatRoom.objects.get_or_create_direct(request.user.id, other_user_id)
         
-        serializer = self.get_serializer(new_room)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        serializer = self.get_serializer(room)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
 
 class MessageCreateView(generics.CreateAPIView):
@@ -76,39 +113,105 @@ class MessageCreateView(generics.CreateAPIView):
         room = get_object_or_404(ChatRoom, pk=self.kwargs.get('room_id'))
         
         # Ensure user is a participant in the chat room
-        if self.request.user not in room.participants.all():
+        if not room_membership.is_participant(room.pk, self.request.user):
             self.permission_denied(
                 self.request, 
                 message="You are not a participant in this chat room"
             )
         
+        # Resolve resumable uploads before saving so a bad id fails the request
+        uploads = completed_uploads(self.request.user, upload_ids_from(self.request))
         message = serializer.save(sender=self.request.user, room=room)
         
-        # Handle file attachments if any
+        # Handle file attachments and completed uploads with one insert
         files = self.request.FILES.getlist('files', [])
-        for file in files:
-            MessageAttachment.objects.create(message=message, file=file)
+        bulk_attach(MessageAttachment, 'file', files, uploads, message=message)
 
 
 class MessageListView(generics.ListAPIView):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
     
     def get_queryset(self):
-        room = get_object_or_404(ChatRoom, pk=self.kwargs.get('room_id'))
+        room_id = self.kwargs.get('room_id')
+        participant_ids = room_membership.get_participant_ids(room_id)
+        
+        # Rooms always have participants, so an empty set means no such room
+        if not participant_ids:
+            raise Http404("No ChatRoom matches the given query.")
         
         # Ensure user is a participant in the chat room
-        if self.request.user not in room.participants.all():
+        if self.request.user.id not in participant_ids:
             self.permission_denied(
                 self.request, 
                 message="You are not a participant in this chat room"
             )
         
-        # Mark all unread messages from others as read
-        unread_messages = room.messages.filter(
-            ~Q(sender=self.request.user),
-            is_read=False
+        # Viewing the newest page marks the room read with a single-row upsert
+        if not self.request.query_params.get('before') and not self.request.query_params.get('after'):
+            RoomReadState.objects.advance(room_id, self.request.user.id)
+        
+        # Sender and attachments are loaded in bulk for the page being served
+        return (
+            Message.objects.filter(room_id=room_id)
+            .select_related('sender')
+            .prefetch_related('attachments')
+            .order_by('-created_at', '-id')
         )
-        unread_messages.update(is_read=True)
+
+
+class MessageSearchView(APIView):
+    """
+    Full-text search over messages in the rooms the user belongs to,
+    optionally narrowed to one room with `room`. Paged with `limit`/`offset`.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+    
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"error": "q query parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response(
+                {"error": "limit and offset must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        room_ids = request.user.chat_rooms.values_list('id', flat=True)
+        room_id = request.query_params.get('room')
+        if room_id:
+            if not room_id.isdigit() or not room_membership.is_participant(room_id, request.user):
+                raise Http404("No ChatRoom matches the given query.")
+            room_ids = [int(room_id)]
+        
+        # One extra row tells us whether there is a next page without counting
+        messages = search_messages(query, room_ids, limit + 1, offset)
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        
+        url = request.build_absolute_uri()
+        next_url = replace_query_param(url, 'offset', offset + limit) if has_more else None
+        previous_url = None
+        if offset > 0:
+            previous_offset = max(offset - limit, 0)
+            previous_url = (
+                replace_query_param(url, 'offset', previous_offset)
+                if previous_offset else remove_query_param(url, 'offset')
+            )
         
-        return room.messages.all().order_by('-created_at')
\ No newline at end of file
+        serializer = MessageSerializer(messages, many=True, context={'request': request})
+        return Response({
+            'next': next_url,
+            'previous': previous_url,
+            'results': serializer.data
+        })
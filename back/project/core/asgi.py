@@ -1,16 +1,21 @@
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 import chat.routing
+import chat.pipeline
+from core.authentication import JWTAuthMiddlewareStack
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    # Access token in the query string, falling back to the session
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(
             chat.routing.websocket_urlpatterns
         )
     ),
+    # Drain the chat write-behind queue on servers that implement lifespan;
+    # Daphne does not, and chat.pipeline drains it at exit instead
+    "lifespan": chat.pipeline.lifespan,
 })
\ No newline at end of file
@@ -0,0 +1,198 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+User = get_user_model()
+
+
+class UserCache:
+    """
+    A bounded per-process LRU of the user fields authentication needs,
+    keyed by user id. Entries live for AUTH_USER_CACHE_TTL seconds.
+
+    Saving or deleting a user changes a per-user version token in the
+    Django cache named by AUTH_USER_CACHE_ALIAS (see users.signals). Every
+    hit checks the token it was loaded under, so with a shared cache
+    backend all processes reload the user on their next request.
+
+    Each lookup builds a fresh User from the cached values, so requests never
+    share an instance. Fields that are not cached are deferred and load on
+    first access as usual.
+    """
+    cached_fields = (
+        'id', 'password', 'email', 'first_name', 'last_name', 'role',
+        'is_active', 'is_staff', 'is_superuser'
+    )
+
+    def __init__(self, max_users=None, ttl=None):
+        self.max_users = max_users or getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def _version_key(user_id):
+        return f'auth:user-version:{user_id}'
+
+    def version(self, user_id):
+        key = self._version_key(user_id)
+        version = self.shared.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not self.shared.add(key, version, None):
+                version = self.shared.get(key, version)
+        return version
+
+    def _build(self, values):
+        return User.from_db(DEFAULT_DB_ALIAS, self.fields, values)
+
+    @property
+    def fields(self):
+        # from_db() expects the loaded values in model field order
+        return [field.attname for field in User._meta.concrete_fields if field.attname in self.cached_fields]
+
+    def _cached(self, user_id):
+        # The cached user if it is still current; reads the shared version
+        # token, so like get() this must not run on an event loop
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        values, expires, version = entry
+        if expires < time.monotonic() or self.shared.get(self._version_key(user_id)) != version:
+            with self._lock:
+                if self._entries.get(user_id) is entry:
+                    del self._entries[user_id]
+            return None
+        with self._lock:
+            if user_id in self._entries:
+                self._entries.move_to_end(user_id)
+        return self._build(values)
+
+    def get(self, user_id):
+        """Return the user with `user_id`, loading it on a miss, or None if there is none."""
+        user = self._cached(user_id)
+        if user is not None:
+            return user
+        # Read before loading, so a change made in between is caught on the next hit
+        version = self.version(user_id)
+        values = User.objects.filter(pk=user_id).values_list(*self.fields).first()
+        if values is None:
+            return None
+        with self._lock:
+            self._entries[user_id] = (values, time.monotonic() + self.ttl, version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return self._build(values)
+
+    def forget(self, user_id):
+        """Drop `user_id` here and have every other process reload it on its next hit."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+        self.shared.set(self._version_key(user_id), uuid.uuid4().hex, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through `user_cache`
+    instead of loading the row on every request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        check_user(user, validated_token)
+        return user
+
+
+def check_user(user, validated_token):
+    if not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+
+
+class JWTAuthMiddleware:
+    """
+    Channels middleware that authenticates WebSocket connections from an
+    access token in the query string (`ws/chat/1/?token=<access>`), resolved
+    through `user_cache` in a worker thread, since checking a cached user is
+    current reads the Django cache; repeat connects need no query. An invalid
+    token connects as AnonymousUser; connections without a token fall back
+    to the session-based AuthMiddlewareStack.
+    """
+    query_param = 'token'
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.session_inner = AuthMiddlewareStack(inner)
+        self.authentication = CachedJWTAuthentication()
+
+    def token_from(self, scope):
+        query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+        tokens = query.get(self.query_param)
+        return tokens[0] if tokens else None
+
+    async def resolve(self, raw_token):
+        try:
+            validated_token = self.authentication.get_validated_token(raw_token)
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except (InvalidToken, TokenError, KeyError):
+            return AnonymousUser()
+
+        user = await database_sync_to_async(user_cache.get)(user_id)
+        try:
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            check_user(user, validated_token)
+        except AuthenticationFailed:
+            return AnonymousUser()
+        return user
+
+    async def __call__(self, scope, receive, send):
+        raw_token = self.token_from(scope)
+        if raw_token is None:
+            return await self.session_inner(scope, receive, send)
+        scope = dict(scope, user=await self.resolve(raw_token))
+        return await self.inner(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return JWTAuthMiddleware(inner)
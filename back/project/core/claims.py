@@ -0,0 +1,74 @@
+from django.db import connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+# Sent with the model as sender and the claimed `job_ids`; claims are plain
+# UPDATEs, so post_save does not fire for them
+jobs_claimed = Signal()
+
+
+def _claimable(assignee_field):
+    return {'status': 'pending', f'{assignee_field}__isnull': True}
+
+
+def _assign(assignee_field, user):
+    return {'status': 'assigned', assignee_field: user, 'updated_at': timezone.now()}
+
+
+def claim(model, pk, assignee_field, user):
+    """
+    Assign one pending, unassigned job to `user` with a single conditional
+    UPDATE. Returns True only for the caller whose UPDATE matched the row,
+    so concurrent claims of the same job have exactly one winner.
+    """
+    # A claim whose receivers fail is rolled back rather than left unreported
+    with transaction.atomic():
+        won = model.objects.filter(pk=pk, **_claimable(assignee_field)).update(
+            **_assign(assignee_field, user)
+        ) == 1
+        if won:
+            jobs_claimed.send(sender=model, job_ids=[pk])
+    return won
+
+
+def claim_next(queryset, assignee_field, user, count, ordering=('created_at', 'id'), rounds=3):
+    """
+    Claim up to `count` jobs from `queryset` for `user`, oldest first, and
+    return their ids.
+
+    Where the database supports it, candidates are locked with SKIP LOCKED
+    so concurrent claimers take disjoint rows. Otherwise the conditional
+    UPDATE decides; rows lost to a concurrent claimer are replaced by
+    fresh candidates for a few rounds.
+    """
+    model = queryset.model
+    candidates = queryset.filter(**_claimable(assignee_field)).order_by(*ordering)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_ids = list(
+                candidates.select_for_update(skip_locked=True, of=('self',)).values_list('pk', flat=True)[:count]
+            )
+            model.objects.filter(pk__in=job_ids).update(**_assign(assignee_field, user))
+            if job_ids:
+                jobs_claimed.send(sender=model, job_ids=job_ids)
+        return job_ids
+
+    # One transaction, so an error in a later round cannot leave earlier
+    # rounds' claims committed but unreported
+    claimed = []
+    with transaction.atomic():
+        for _ in range(rounds):
+            remaining = count - len(claimed)
+            if remaining <= 0:
+                break
+            job_ids = list(candidates.values_list('pk', flat=True)[:remaining])
+            if not job_ids:
+                break
+            model.objects.filter(pk__in=job_ids, **_claimable(assignee_field)).update(**_assign(assignee_field, user))
+            claimed += model.objects.filter(
+                pk__in=job_ids, status='assigned', **{assignee_field: user}
+            ).values_list('pk', flat=True)
+        if claimed:
+            jobs_claimed.send(sender=model, job_ids=claimed)
+    return claimed
@@ -0,0 +1,177 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+
+class ResponseCache:
+    """
+    Versioned cache of rendered JSON responses for public, read-mostly
+    endpoints.
+
+    Each cached endpoint belongs to a namespace whose version is the time
+    (in nanoseconds) of the last change to any model it depends on. The
+    version is part of every response key, so bumping it from a save/delete
+    signal orphans all cached pages at once; it also serves as the
+    `Last-Modified` time. Entries live in the Django cache named by
+    HTTP_CACHE_ALIAS (locmem, file, redis, ...). Use a shared backend when
+    running more than one process, or bumps will only be seen locally.
+    """
+
+    prefix = 'httpcache'
+
+    def __init__(self, alias=None, timeout=None, max_age=None, s_maxage=None):
+        self._alias = alias
+        self.timeout = timeout or getattr(settings, 'HTTP_CACHE_TIMEOUT', 60)
+        self.max_age = max_age if max_age is not None else getattr(settings, 'HTTP_CACHE_MAX_AGE', 60)
+        self.s_maxage = s_maxage if s_maxage is not None else getattr(settings, 'HTTP_CACHE_S_MAXAGE', 300)
+
+    @property
+    def cache(self):
+        return caches[self._alias or getattr(settings, 'HTTP_CACHE_ALIAS', 'default')]
+
+    def _version_key(self, namespace):
+        return f'{self.prefix}:version:{namespace}'
+
+    def version(self, namespace):
+        version = self.cache.get(self._version_key(namespace))
+        if version is None:
+            version = time.time_ns()
+            if not self.cache.add(self._version_key(namespace), version, None):
+                version = self.cache.get(self._version_key(namespace), version)
+        return version
+
+    def bump(self, *namespaces):
+        for namespace in namespaces:
+            current = self.cache.get(self._version_key(namespace)) or 0
+            self.cache.set(self._version_key(namespace), max(time.time_ns(), current + 1), None)
+
+    def invalidate_on(self, model, *namespaces, fields=None, when=None):
+        """
+        Bump `namespaces` whenever `model` is saved or deleted. With `fields`,
+        saves restricted by update_fields to other fields are ignored. With
+        `when`, only instances for which `when(instance)` is true count.
+        """
+        def on_save(sender, instance, update_fields=None, **kwargs):
+            if when is not None and not when(instance):
+                return
+            if fields is None or update_fields is None or set(update_fields) & set(fields):
+                self.bump(*namespaces)
+
+        def on_delete(sender, instance, **kwargs):
+            if when is None or when(instance):
+                self.bump(*namespaces)
+
+        uid = f'{self.prefix}:{model._meta.label}:{",".join(namespaces)}'
+        post_save.connect(on_save, sender=model, weak=False, dispatch_uid=f'{uid}:save')
+        post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=f'{uid}:delete')
+
+    def entry_key(self, namespace, version, request):
+        vary = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+        return f'{self.prefix}:{namespace}:{version}:{hashlib.sha256(vary.encode()).hexdigest()}'
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, entry):
+        self.cache.set(key, entry, self.timeout)
+
+    def cache_control(self):
+        return f'public, max-age={self.max_age}, s-maxage={self.s_maxage}'
+
+
+response_cache = ResponseCache()
+
+
+def etag_for(content):
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    # If-None-Match uses weak comparison
+    return '*' in candidates or etag in [candidate.removeprefix('W/') for candidate in candidates]
+
+
+def not_modified_since(request, last_modified):
+    if 'HTTP_IF_NONE_MATCH' in request.META:
+        return False
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and last_modified <= since
+
+
+class CachedResponseMixin:
+    """
+    Viewset mixin that serves `cached_actions` from `response_cache`.
+
+    Hits, including 304 answers to If-None-Match / If-Modified-Since, are
+    served straight from `dispatch`: no authentication, permission checks or
+    queries run. Only use it on AllowAny endpoints whose payload does not
+    depend on the requesting user. Subclasses that need to observe hits
+    (for example to count views) can override `cache_hit`.
+    """
+
+    cache_namespace = None
+    cached_actions = ('list', 'retrieve')
+
+    def cache_hit(self, request, *args, **kwargs):
+        pass
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        if request.method not in ('GET', 'HEAD') or action not in self.cached_actions:
+            return super().dispatch(request, *args, **kwargs)
+
+        version = response_cache.version(self.cache_namespace)
+        last_modified = version // 1_000_000_000
+        key = response_cache.entry_key(self.cache_namespace, version, request)
+
+        entry = response_cache.get(key)
+        if entry is not None:
+            self.action = action
+            self.cache_hit(request, *args, **kwargs)
+            return self.cached_response(request, entry, last_modified)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        # Content-Type is only known once rendered; the browsable API is per-user, so skip it
+        response.render()
+        if not response.get('Content-Type', '').startswith('application/json'):
+            return response
+
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': etag_for(response.content),
+        }
+        response_cache.set(key, entry)
+        if etag_matches(request, entry['etag']) or not_modified_since(request, last_modified):
+            return self.not_modified(entry, last_modified)
+        self.add_cache_headers(response, entry, last_modified)
+        return response
+
+    def cached_response(self, request, entry, last_modified):
+        if etag_matches(request, entry['etag']) or not_modified_since(request, last_modified):
+            return self.not_modified(entry, last_modified)
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        self.add_cache_headers(response, entry, last_modified)
+        return response
+
+    def not_modified(self, entry, last_modified):
+        response = HttpResponseNotModified()
+        self.add_cache_headers(response, entry, last_modified)
+        return response
+
+    def add_cache_headers(self, response, entry, last_modified):
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = response_cache.cache_control()
+        response['Vary'] = 'Accept'
@@ -0,0 +1,155 @@
+import base64
+import binascii
+import math
+
+from django.conf import settings
+from django.db.models import Q
+
+
+def fee_seconds():
+    return getattr(settings, 'MATCHING_FEE_SECONDS', 600)
+
+
+def affinity_seconds():
+    return getattr(settings, 'MATCHING_AFFINITY_SECONDS', 86400)
+
+
+def max_groups():
+    return getattr(settings, 'MATCHING_MAX_GROUPS', 10)
+
+
+def encode_cursor(position):
+    score, pk = position
+    return base64.urlsafe_b64encode(f'{score}:{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (score, pk) position in `cursor`; raises ValueError if it is malformed."""
+    try:
+        score, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return int(score), int(pk)
+    except (binascii.Error, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+class JobQueue:
+    """
+    Priority queues of pending, unassigned jobs, one per group (subject or
+    category), and a ranked feed over them for each provider.
+
+    Every queued job has an entry row holding its group and a priority in
+    milliseconds: its creation time, moved earlier by MATCHING_FEE_SECONDS
+    per unit of service fee. Lower priorities are served first, so old and
+    well-paid jobs rise to the top and the order never needs recomputing.
+
+    A provider's feed moves each group's queue earlier by an affinity bonus
+    that grows with the number of jobs they have completed in that group,
+    scaled by their Bayesian average rating. Both are read from the
+    provider's leaderboard entries, which are kept up to date as jobs are
+    completed and rated. Because the bonus is constant within a group,
+    the feed is a k-way merge of per-group index range scans over
+    (group, priority), so a page costs a few short index reads regardless of
+    how large the backlog is. Pages are keyset paginated on (score, pk).
+    """
+
+    def __init__(self, job_model, entry_model, group_field, assignee_field):
+        self.job_model = job_model
+        self.entry_model = entry_model
+        self.group_kind = group_field
+        self.group_field = f'{group_field}_id'
+        self.assignee_field = assignee_field
+
+    def is_queued(self, job):
+        return job.status == 'pending' and getattr(job, f'{self.assignee_field}_id') is None
+
+    def priority(self, job):
+        created = int(job.created_at.timestamp() * 1000)
+        return created - int(float(job.service_fee or 0) * fee_seconds() * 1000)
+
+    def sync(self, job):
+        """Add, move or remove the entry for `job` to match its current state."""
+        if not self.is_queued(job):
+            self.discard([job.pk])
+            return
+        self.entry_model.objects.update_or_create(
+            pk=job.pk,
+            defaults={self.group_field: getattr(job, self.group_field), 'priority': self.priority(job)}
+        )
+
+    def discard(self, job_ids):
+        self.entry_model.objects.filter(pk__in=job_ids).delete()
+
+    def rebuild(self):
+        """Recreate every entry from the jobs table; returns the number queued."""
+        jobs = self.job_model.objects.filter(
+            status='pending', **{f'{self.assignee_field}__isnull': True}
+        ).only('pk', 'created_at', 'service_fee', self.group_field)
+        self.entry_model.objects.all().delete()
+        entries = [
+            self.entry_model(pk=job.pk, priority=self.priority(job), **{self.group_field: getattr(job, self.group_field)})
+            for job in jobs.iterator()
+        ]
+        self.entry_model.objects.bulk_create(entries, batch_size=500)
+        return len(entries)
+
+    def bonuses(self, user):
+        """Map the groups `user` has completed the most jobs in to their bonus in milliseconds."""
+        from users.models import LeaderboardEntry
+
+        # One row per group board the provider is on, with their completed
+        # jobs there and their Bayesian average rating
+        history = list(
+            LeaderboardEntry.objects.filter(
+                provider=user, board__startswith=f'{self.group_kind}:', completed__gt=0
+            ).order_by('-completed').values_list('board', 'completed', 'rating')[:max_groups()]
+        )
+        if not history:
+            return {}
+
+        # Shrunk towards the prior, so a single 5-star rating counts for little
+        scale = affinity_seconds() * 1000 * history[0][2] / 5
+        return {
+            int(board.split(':', 1)[1]): int(scale * math.log2(1 + completed))
+            for board, completed, rating in history
+        }
+
+    def ranked(self, bonuses, limit, after=None, group_id=None):
+        """
+        Return up to `limit` (score, pk) pairs in feed order, starting after
+        the `after` position. Only `group_id` is read when it is given.
+        """
+        entries = self.entry_model.objects.order_by('priority', 'pk')
+        if group_id is not None:
+            scans = [(entries.filter(**{self.group_field: group_id}), bonuses.get(group_id, 0))]
+        else:
+            scans = [(entries.filter(**{self.group_field: group}), bonus) for group, bonus in bonuses.items()]
+            scans.append((entries.exclude(**{f'{self.group_field}__in': list(bonuses)}), 0))
+
+        ranked = []
+        for scan, bonus in scans:
+            if after is not None:
+                # score = priority - bonus, so the position shifts by the bonus per group
+                priority = after[0] + bonus
+                scan = scan.filter(Q(priority__gt=priority) | Q(priority=priority, pk__gt=after[1]))
+            ranked += [(priority - bonus, pk) for pk, priority in scan.values_list('pk', 'priority')[:limit]]
+        ranked.sort()
+        return ranked[:limit]
+
+    def feed(self, user, limit, after=None, group_id=None, queryset=None):
+        """
+        Return the next `limit` queued jobs for `user` as (job, score) pairs,
+        loaded from `queryset` if given, and the position to continue from,
+        or None on the last page. Entries for jobs that were claimed since
+        they were queued are dropped along the way.
+        """
+        ranked = self.ranked(self.bonuses(user), limit, after, group_id)
+        queryset = self.job_model.objects.all() if queryset is None else queryset
+        jobs = queryset.filter(
+            pk__in=[pk for _, pk in ranked], status='pending', **{f'{self.assignee_field}__isnull': True}
+        ).in_bulk()
+        stale = [pk for _, pk in ranked if pk not in jobs]
+        if stale:
+            self.discard(stale)
+
+        results = [(jobs[pk], score) for score, pk in ranked if pk in jobs]
+        return results, (ranked[-1] if len(ranked) == limit else None)
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TimelinePagination(CursorPagination):
+    """
+    Cursor pagination over a job's timeline (question responses, repair
+    updates), newest first. Pages are index range scans on
+    (job, created_at) and skip the COUNT query.
+    """
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = '-created_at'
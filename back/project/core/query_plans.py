@@ -0,0 +1,20 @@
+from django.db import connection
+
+
+def plan_lines(queryset):
+    """The lines of the database's plan for `queryset` (SQLite and PostgreSQL)."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        # Small tables make sequential scans look cheap; ask whether an index can be used at all
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'EXPLAIN {sql}', params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def full_scans(lines):
+    """The plan lines in `lines` that read a whole table."""
+    marker = 'SCAN ' if connection.vendor == 'sqlite' else 'Seq Scan'
+    return [line for line in lines if line.lstrip().startswith(marker)]
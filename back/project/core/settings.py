@@ -34,6 +34,8 @@ INSTALLED_APPS = [
     'academics',
     'chat',
     'resources',
+    'uploads',
+    'taskqueue',
 ]
 
 MIDDLEWARE = [
@@ -69,11 +71,35 @@ WSGI_APPLICATION = 'core.wsgi.application'
 ASGI_APPLICATION = 'core.asgi.application'
 
 # Channel layers for Django Channels
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# Set CHANNEL_BROKER_SOCKETS to a comma-separated list of sockets served by
+# `manage.py runchannelbroker` to share chat groups across ASGI workers.
+CHANNEL_BROKER_SOCKETS = [
+    path for path in os.environ.get('CHANNEL_BROKER_SOCKETS', '').split(',') if path
+]
+
+if CHANNEL_BROKER_SOCKETS:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'chat.layers.ShardedChannelLayer',
+            'CONFIG': {
+                'shards': [
+                    {'BACKEND': 'chat.layers.SocketShard', 'CONFIG': {'path': path}}
+                    for path in CHANNEL_BROKER_SOCKETS
+                ],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# Background tasks
+# Side effects queued with `.delay()` are run by `manage.py runtaskworker`.
+# Set TASKS_ALWAYS_EAGER=1 to run them inline instead, e.g. in development.
+TASKS_ALWAYS_EAGER = os.environ.get('TASKS_ALWAYS_EAGER') == '1'
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -135,7 +161,7 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -10,4 +10,5 @@ urlpatterns = [
     path('api/academics/', include('academics.urls')),
     path('api/chat/', include('chat.urls')),
     path('api/resources/', include('resources.urls')),
+    path('api/uploads/', include('uploads.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class RepairsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'repairs'
\ No newline at end of file
+    name = 'repairs'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
\ No newline at end of file
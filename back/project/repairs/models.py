@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
 
@@ -10,6 +12,47 @@ class RepairCategory(models.Model):
         return self.name
 
 
+class RepairRequestQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Students see their own repair requests; technicians see the ones assigned to
+        them plus every pending, unassigned one; everyone else sees all.
+
+        The technician rule is an id lookup over a UNION ALL of two indexed
+        searches. Written as an OR of the two filters it spans
+        technician_id and status, which no single index can serve.
+        """
+        if user.role == 'student':
+            return self.filter(student=user)
+        if user.role == 'technician':
+            visible = self.model.objects.filter(technician=user).values('pk').union(
+                self.model.objects.filter(technician__isnull=True, status='pending').values('pk'),
+                all=True
+            )
+            return self.filter(pk__in=visible)
+        return self
+    
+    def for_listing(self):
+        """Join the people and category and prefetch images so a page serializes without per-row queries."""
+        return self.select_related('student', 'technician', 'category').prefetch_related('images')
+    
+    def for_detail(self):
+        """
+        Annotate `update_total` and prefetch only the latest
+        TIMELINE_PREVIEW_SIZE updates, with their authors, into
+        `latest_updates`. The full timeline is paged separately.
+        """
+        preview_size = getattr(settings, 'TIMELINE_PREVIEW_SIZE', 5)
+        update_total = RepairUpdate.objects.filter(
+            repair_request=OuterRef('pk')
+        ).order_by().values('repair_request').annotate(count=Count('pk')).values('count')
+        latest = RepairUpdate.objects.select_related('user').order_by('-created_at', '-id')
+        
+        return self.annotate(update_total=Coalesce(Subquery(update_total), 0)).prefetch_related(
+            Prefetch('updates', queryset=latest[:preview_size], to_attr='latest_updates')
+        )
+
+
 class RepairRequest(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -42,9 +85,20 @@ class RepairRequest(models.Model):
     device_model = models.CharField(max_length=100)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     service_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # When the job became completed, i.e. the date its fee is booked under
+    earned_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = RepairRequestQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['technician', 'status'], name='repair_technician_status_idx'),
+            models.Index(fields=['student', '-created_at'], name='repair_student_recent_idx'),
+            models.Index(fields=['status', '-created_at'], name='repair_status_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} - {self.student.email}"
 
@@ -75,5 +129,34 @@ class RepairUpdate(models.Model):
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['repair_request', '-created_at'], name='repair_update_recent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Update on {self.repair_request.title} by {self.user.email}"
+
+
+class RepairQueueEntry(models.Model):
+    """
+    A pending, unassigned repair request waiting in its category's queue.
+    Kept in sync by repairs.signals and read by the technician feed.
+    """
+    repair_request = models.OneToOneField(
+        RepairRequest,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='queue_entry'
+    )
+    category_id = models.IntegerField()
+    priority = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['category_id', 'priority', 'repair_request'], name='repair_queue_category_idx'),
+            models.Index(fields=['priority', 'repair_request', 'category_id'], name='repair_queue_priority_idx'),
+        ]
+    
     def __str__(self):
-        return f"Update on {self.repair_request.title} by {self.user.email}"
\ No newline at end of file
+        return f"Queued repair request {self.repair_request_id}"
@@ -0,0 +1,4 @@
+from core.matching import JobQueue
+from .models import RepairQueueEntry, RepairRequest
+
+repair_queue = JobQueue(RepairRequest, RepairQueueEntry, 'category', 'technician')
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from .models import RepairCategory, RepairRequest, RepairImage, RepairUpdate
+from uploads.storage import bulk_attach, completed_uploads, verify_images
+from uploads.images import image_derivatives
+from uploads.serializers import ImageVariantsField, ImageVariantsListSerializer
 
 
 class RepairCategorySerializer(serializers.ModelSerializer):
@@ -9,9 +12,12 @@ class RepairCategorySerializer(serializers.ModelSerializer):
 
 
 class RepairImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(source='image')
+    
     class Meta:
         model = RepairImage
-        fields = ('id', 'image', 'uploaded_at')
+        fields = ('id', 'image', 'image_variants', 'uploaded_at')
+        list_serializer_class = ImageVariantsListSerializer
 
 
 class RepairUpdateSerializer(serializers.ModelSerializer):
@@ -44,6 +50,11 @@ class RepairRequestSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
+    upload_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        write_only=True,
+        required=False
+    )
     
     class Meta:
         model = RepairRequest
@@ -51,9 +62,10 @@ class RepairRequestSerializer(serializers.ModelSerializer):
             'id', 'student', 'student_name', 'technician', 'technician_name',
             'category', 'category_name', 'title', 'description', 'device_make',
             'device_model', 'status', 'service_fee', 'created_at', 'updated_at',
-            'images', 'uploaded_images'
+            'images', 'uploaded_images', 'upload_ids'
         )
         read_only_fields = ('student', 'technician', 'service_fee', 'created_at', 'updated_at')
+        list_serializer_class = ImageVariantsListSerializer
     
     def get_student_name(self, obj):
         return f"{obj.student.first_name} {obj.student.last_name}" if obj.student else None
@@ -67,16 +79,21 @@ class RepairRequestSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
         validated_data['student'] = self.context['request'].user
+        uploads = completed_uploads(validated_data['student'], validated_data.pop('upload_ids', []))
+        verify_images(uploads)
         repair_request = super().create(validated_data)
         
-        for image in uploaded_images:
-            RepairImage.objects.create(repair_request=repair_request, image=image)
+        images = bulk_attach(RepairImage, 'image', uploaded_images, uploads, repair_request=repair_request)
+        # bulk_create skips post_save, so queue the derivatives here
+        image_derivatives.submit([image.image.name for image in images])
         
         return repair_request
 
 
 class RepairRequestDetailSerializer(RepairRequestSerializer):
-    updates = RepairUpdateSerializer(many=True, read_only=True)
+    # Only the latest few, newest first; the rest are paged from the timeline endpoint
+    updates = RepairUpdateSerializer(source='latest_updates', many=True, read_only=True)
+    update_count = serializers.IntegerField(source='update_total', read_only=True)
     
     class Meta(RepairRequestSerializer.Meta):
-        fields = RepairRequestSerializer.Meta.fields + ('updates',)
\ No newline at end of file
+        fields = RepairRequestSerializer.Meta.fields + ('updates', 'update_count')
\ No newline at end of file
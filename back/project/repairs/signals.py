@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core.claims import jobs_claimed
+from core.http_cache import response_cache
+from uploads.images import image_derivatives
+from users.leaderboard import leaderboards
+from .models import RepairCategory, RepairImage, RepairRequest
+from .queues import repair_queue
+
+response_cache.invalidate_on(RepairCategory, 'repair-categories')
+image_derivatives.watch(RepairImage, 'image')
+leaderboards.track(RepairRequest, 'technician', 'category', 'completed', role='technician')
+
+
+@receiver(post_save, sender=RepairRequest)
+def sync_repair_queue(sender, instance, **kwargs):
+    repair_queue.sync(instance)
+
+
+@receiver(jobs_claimed, sender=RepairRequest)
+def dequeue_claimed_repairs(sender, job_ids, **kwargs):
+    repair_queue.discard(job_ids)
@@ -0,0 +1,8 @@
+from taskqueue.registry import task
+from .models import RepairUpdate
+
+
+@task
+def post_repair_notice(repair_request_id, user_id, message):
+    """Add a system notice (assignment, status change) to a repair request's updates."""
+    RepairUpdate.objects.create(repair_request_id=repair_request_id, user_id=user_id, message=message)
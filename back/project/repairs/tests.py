@@ -0,0 +1,97 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.query_plans import full_scans, plan_lines
+from uploads.images import image_derivatives
+from users.models import LeaderboardEntry, User
+from .models import RepairCategory, RepairImage, RepairRequest, RepairUpdate
+
+
+class RepairQueryTests(TestCase):
+    """Repair request pages cost a fixed number of queries however many rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student@example.com', 'password', role='student')
+        cls.technician = User.objects.create_user('technician@example.com', 'password', role='technician')
+        cls.category = RepairCategory.objects.create(name='Laptops')
+        cls.repairs = [cls.create_repair(index) for index in range(3)]
+
+    @classmethod
+    def create_repair(cls, index):
+        repair = RepairRequest.objects.create(
+            student=cls.student, category=cls.category, title=f'Repair {index}', description='Broken',
+            device_make='Make', device_model='Model'
+        )
+        for image in range(2):
+            RepairImage.objects.create(repair_request=repair, image=f'repair_images/{index}-{image}.png')
+        if index % 2:
+            repair.technician, repair.status = cls.technician, 'assigned'
+            repair.save()
+            for _ in range(3):
+                RepairUpdate.objects.create(repair_request=repair, user=cls.technician, message='Update')
+        return repair
+
+    def setUp(self):
+        # Derivative lookups are cached per process; start every test cold
+        image_derivatives.clear()
+
+    def get(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        # The page with its joins, the images and their derivatives
+        with self.assertNumQueries(3):
+            self.get(self.student, '/api/repairs/requests/')
+
+        for index in range(3, 9):
+            self.create_repair(index)
+        image_derivatives.clear()
+        with self.assertNumQueries(3):
+            response = self.get(self.student, '/api/repairs/requests/')
+        self.assertEqual(len(response.json()), 9)
+
+        image_derivatives.clear()
+        with self.assertNumQueries(3):
+            self.get(self.technician, '/api/repairs/requests/')
+
+    def test_retrieve(self):
+        repair = self.repairs[1]
+        # The repair, its images and their derivatives, and the latest updates
+        with self.assertNumQueries(4):
+            response = self.get(self.technician, f'/api/repairs/requests/{repair.pk}/')
+        self.assertEqual(response.json()['update_count'], 3)
+
+    def test_feed(self):
+        # Bonuses, the queue, the jobs, their images and the images' derivatives
+        with self.assertNumQueries(5):
+            response = self.get(self.technician, '/api/repairs/requests/feed/')
+        self.assertEqual(len(response.json()['results']), 2)
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), "Query plans are only checked on SQLite and PostgreSQL")
+class RepairQueryPlanTests(TestCase):
+    """Role-scoped repair queries are served from indexes, never a full table scan."""
+
+    def test_no_full_scans(self):
+        student = User(pk=1, role='student')
+        technician = User(pk=2, role='technician')
+        repairs = RepairRequest.objects
+        paths = {
+            'student list': repairs.visible_to(student).for_listing().order_by('-created_at'),
+            'technician list': repairs.visible_to(technician).for_listing().order_by('-created_at'),
+            'technician detail': repairs.visible_to(technician).for_listing().filter(pk=1),
+            'claimable repairs': repairs.filter(status='pending', technician__isnull=True).order_by('created_at', 'id'),
+            'feed bonuses': LeaderboardEntry.objects.filter(provider=technician, board__startswith='category:'),
+        }
+        for name, queryset in paths.items():
+            with self.subTest(name):
+                lines = plan_lines(queryset)
+                self.assertEqual(full_scans(lines), [], '\n'.join(lines))
@@ -1,7 +1,12 @@
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.utils.urls import replace_query_param
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from .models import RepairCategory, RepairRequest, RepairImage, RepairUpdate
 from .serializers import (
     RepairCategorySerializer, 
@@ -11,9 +16,19 @@ from .serializers import (
     RepairUpdateSerializer
 )
 from users.permissions import IsTechnician
+from uploads.storage import bulk_attach, completed_uploads, upload_ids_from, verify_images
+from uploads.images import image_derivatives
+from .tasks import post_repair_notice
+from .queues import repair_queue
+from core.claims import claim, claim_next
+from core.matching import decode_cursor, encode_cursor
+from core.pagination import TimelinePagination
+from core.http_cache import CachedResponseMixin
+from users.earnings import record_earning
 
 
-class RepairCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class RepairCategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'repair-categories'
     queryset = RepairCategory.objects.all()
     serializer_class = RepairCategorySerializer
     permission_classes = [permissions.AllowAny]
@@ -29,18 +44,14 @@ class RepairRequestViewSet(viewsets.ModelViewSet):
         return RepairRequestSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        
-        # Students can only see their own repair requests
-        if user.role == 'student':
-            return RepairRequest.objects.filter(student=user)
-        
-        # Technicians can see repairs assigned to them and unassigned requests
-        elif user.role == 'technician':
-            return RepairRequest.objects.filter(technician=user) | RepairRequest.objects.filter(technician__isnull=True, status='pending')
-        
-        # Admins can see all repair requests
-        return RepairRequest.objects.all()
+        # Who sees what, and why it is not an OR, is in visible_to()
+        queryset = RepairRequest.objects.visible_to(self.request.user)
+        if self.action == 'timeline':
+            return queryset
+        queryset = queryset.for_listing().order_by('-created_at')
+        if self.action == 'retrieve':
+            queryset = queryset.for_detail()
+        return queryset
     
     @action(detail=True, methods=['post'])
     def add_images(self, request, pk=None):
@@ -54,42 +65,103 @@ class RepairRequestViewSet(viewsets.ModelViewSet):
             )
         
         images = request.FILES.getlist('images')
-        image_instances = []
-        
-        for image in images:
-            image_instance = RepairImage.objects.create(
-                repair_request=repair_request,
-                image=image
-            )
-            image_instances.append(image_instance)
+        uploads = completed_uploads(request.user, upload_ids_from(request))
+        verify_images(uploads)
+        image_instances = bulk_attach(RepairImage, 'image', images, uploads, repair_request=repair_request)
+        image_derivatives.submit([image.image.name for image in image_instances])
         
         serializer = RepairImageSerializer(image_instances, many=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    def announce_assignment(self, repair_request_id):
+        # Notify about assignment off the request path
+        post_repair_notice.delay(
+            repair_request_id,
+            self.request.user.id,
+            f"Technician {self.request.user.first_name} {self.request.user.last_name} has been assigned to this repair request",
+            idempotency_key=f"repair:{repair_request_id}:assigned:{self.request.user.id}"
+        )
+    
     @action(detail=True, methods=['post'], permission_classes=[IsTechnician])
     def assign_technician(self, request, pk=None):
         repair_request = self.get_object()
         
-        if repair_request.technician:
+        # Check and assign in one UPDATE so concurrent claims cannot both win
+        if not claim(RepairRequest, repair_request.pk, 'technician', request.user):
             return Response(
                 {"error": "This repair request is already assigned to a technician"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        repair_request.technician = request.user
-        repair_request.status = 'assigned'
-        repair_request.save()
+        self.announce_assignment(repair_request.pk)
+        repair_request.refresh_from_db()
+        serializer = self.get_serializer(repair_request)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsTechnician])
+    def claim_next(self, request):
+        """Claim up to `count` (max 20) of the oldest pending repair requests, optionally in one `category_id`."""
+        try:
+            count = min(max(int(request.data.get('count', 1)), 1), 20)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "count must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Create an update to notify about assignment
-        RepairUpdate.objects.create(
-            repair_request=repair_request,
-            user=request.user,
-            message=f"Technician {request.user.first_name} {request.user.last_name} has been assigned to this repair request"
-        )
+        repair_requests = RepairRequest.objects.all()
+        category_id = request.data.get('category_id')
+        if category_id:
+            repair_requests = repair_requests.filter(category_id=category_id)
         
-        serializer = self.get_serializer(repair_request)
+        repair_request_ids = claim_next(repair_requests, 'technician', request.user, count)
+        for repair_request_id in repair_request_ids:
+            self.announce_assignment(repair_request_id)
+        
+        claimed = RepairRequest.objects.filter(pk__in=repair_request_ids).order_by('created_at', 'id')
+        serializer = self.get_serializer(claimed, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], permission_classes=[IsTechnician])
+    def feed(self, request):
+        """
+        Pending repair requests ranked for the current user by age, fee and their
+        history in each category. Pass the returned `next` link to page on;
+        `category_id` limits the feed to one category.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            category_id = request.query_params.get('category_id')
+            category_id = int(category_id) if category_id else None
+            cursor = request.query_params.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response(
+                {"error": "limit and category_id must be integers and cursor must come from a previous page"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ranked, position = repair_queue.feed(
+            request.user, limit, after, category_id,
+            queryset=RepairRequest.objects.select_related('student', 'category').prefetch_related('images')
+        )
+        serializer = self.get_serializer([job for job, _ in ranked], many=True)
+        next_url = None
+        if position is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(position))
+        return Response({"next": next_url, "results": serializer.data})
+    
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """Every update on the repair request, newest first, cursor paginated."""
+        repair_request = self.get_object()
+        entries = RepairUpdate.objects.filter(repair_request=repair_request).select_related('user')
+        
+        paginator = TimelinePagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        serializer = RepairUpdateSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         repair_request = self.get_object()
@@ -130,25 +202,55 @@ class RepairRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        repair_request.status = status_value
-        
         # Set service fee if completing the repair
         if status_value == 'completed':
             service_fee = request.data.get('service_fee')
             if service_fee:
+                try:
+                    service_fee = Decimal(str(service_fee))
+                except InvalidOperation:
+                    service_fee = None
+                if service_fee is None or not service_fee.is_finite() or service_fee < 0:
+                    return Response(
+                        {"error": "service_fee must be a non-negative number"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
                 repair_request.service_fee = service_fee
         
-        repair_request.save()
+        previous_status = repair_request.status
+        repair_request.status = status_value
+        if status_value == 'completed':
+            repair_request.earned_at = timezone.now()
+        
+        with transaction.atomic():
+            # Only the request whose conditional UPDATE moves the repair out of
+            # previous_status goes on, so concurrent requests book the fee once
+            moved = RepairRequest.objects.filter(pk=repair_request.pk, status=previous_status).update(
+                status=status_value
+            )
+            if moved:
+                # Write the remaining fields and run the post_save handlers
+                repair_request.save()
+                # Keep the earnings rollups in step with what the technician has earned
+                if status_value == 'completed':
+                    record_earning(repair_request.technician_id, repair_request.service_fee, repair_request.earned_at)
+        if not moved:
+            return Response(
+                {"error": "The repair request status was changed by another request"},
+                status=status.HTTP_409_CONFLICT
+            )
         
         # Create status update
         message = f"Status updated to {status_value}"
         if status_value == 'completed' and repair_request.service_fee > 0:
             message += f" with a service fee of ${repair_request.service_fee}"
         
-        RepairUpdate.objects.create(
-            repair_request=repair_request,
-            user=request.user,
-            message=message
+        # Statuses only move forward, so each one is announced at most once
+        post_repair_notice.delay(
+            repair_request.id,
+            request.user.id,
+            message,
+            idempotency_key=f"repair:{repair_request.id}:status:{status_value}"
         )
         
         serializer = self.get_serializer(repair_request)
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class ResourcesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'resources'
\ No newline at end of file
+    name = 'resources'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
\ No newline at end of file
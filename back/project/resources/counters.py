@@ -0,0 +1,170 @@
+import atexit
+import itertools
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+
+from .signals import views_flushed
+
+
+class _CounterShard:
+    __slots__ = ('lock', 'counts', 'seen')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.seen = {}
+
+
+class ViewCounter:
+    """
+    Buffers resource view increments in memory and flushes them as batched
+    `F('view_count') + n` updates, then sends `views_flushed` with the
+    counts that were written.
+
+    Each thread is given one of several shards round-robin and keeps it, so
+    request threads rarely contend on the same lock. When
+    RESOURCE_VIEW_DEDUP_SECONDS is set, repeat views of a resource by the
+    same viewer inside that window are not counted. A daemon thread flushes
+    every RESOURCE_VIEW_FLUSH_INTERVAL seconds, and once more at exit.
+    """
+
+    def __init__(self, model, field='view_count', shards=None, flush_interval=None, dedup_seconds=None):
+        self.model = model
+        self.field = field
+        self.shards = [_CounterShard() for _ in range(shards or getattr(settings, 'RESOURCE_VIEW_COUNTER_SHARDS', 8))]
+        self.flush_interval = flush_interval or getattr(settings, 'RESOURCE_VIEW_FLUSH_INTERVAL', 5)
+        self.dedup_seconds = dedup_seconds if dedup_seconds is not None else getattr(
+            settings, 'RESOURCE_VIEW_DEDUP_SECONDS', 0
+        )
+        self._flush_lock = threading.Lock()
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _shard(self):
+        # Thread idents are aligned addresses, so `ident % n` puts every
+        # thread on the same shard; hand shards out round-robin instead
+        index = getattr(self._local, 'shard', None)
+        if index is None:
+            index = self._local.shard = next(self._next_shard) % len(self.shards)
+        return self.shards[index]
+
+    def record(self, object_id, viewer=None):
+        """
+        Count a view of `object_id`. Returns False when it was a repeat view
+        suppressed by the dedup window.
+        """
+        self._ensure_flusher()
+        now = time.monotonic()
+        shard = self.shards[hash((object_id, viewer)) % len(self.shards)] if viewer and self.dedup_seconds else self._shard()
+        with shard.lock:
+            if viewer and self.dedup_seconds:
+                key = (object_id, viewer)
+                if shard.seen.get(key, 0) > now:
+                    return False
+                shard.seen[key] = now + self.dedup_seconds
+            shard.counts[object_id] += 1
+        return True
+
+    def pending(self, object_id):
+        total = 0
+        for shard in self.shards:
+            with shard.lock:
+                total += shard.counts.get(object_id, 0)
+        return total
+
+    def pending_many(self, object_ids):
+        totals = dict.fromkeys(object_ids, 0)
+        for shard in self.shards:
+            with shard.lock:
+                for object_id in object_ids:
+                    totals[object_id] += shard.counts.get(object_id, 0)
+        return totals
+
+    def current(self, object_id):
+        """Persisted count plus views still waiting to be flushed."""
+        persisted = self.model.objects.filter(pk=object_id).values_list(self.field, flat=True).first()
+        if persisted is None:
+            return None
+        return persisted + self.pending(object_id)
+
+    def _drain(self):
+        totals = defaultdict(int)
+        now = time.monotonic()
+        for shard in self.shards:
+            with shard.lock:
+                counts, shard.counts = shard.counts, defaultdict(int)
+                if shard.seen:
+                    shard.seen = {key: expires for key, expires in shard.seen.items() if expires > now}
+            for object_id, count in counts.items():
+                totals[object_id] += count
+        return totals
+
+    def flush(self):
+        """
+        Write buffered increments. Objects with the same pending count share
+        one UPDATE, so a flush costs one query per distinct count.
+        """
+        with self._flush_lock:
+            totals = self._drain()
+            by_count = defaultdict(list)
+            for object_id, count in totals.items():
+                by_count[count].append(object_id)
+
+            written = set()
+            try:
+                for count, object_ids in by_count.items():
+                    self.model.objects.filter(pk__in=object_ids).update(
+                        **{self.field: F(self.field) + count}
+                    )
+                    written.add(count)
+            except Exception:
+                # Put back whatever was not written so the next flush retries it
+                shard = self._shard()
+                with shard.lock:
+                    for count, object_ids in by_count.items():
+                        if count not in written:
+                            for object_id in object_ids:
+                                shard.counts[object_id] += count
+                raise
+
+        if totals:
+            views_flushed.send(sender=self.model, counts=dict(totals))
+        return totals
+
+    def _ensure_flusher(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                # Unwritten increments were put back; try again next tick
+                pass
+            finally:
+                close_old_connections()
+
+
+_view_counter = None
+
+
+def get_view_counter():
+    global _view_counter
+    if _view_counter is None:
+        from .models import Resource
+        _view_counter = ViewCounter(Resource)
+    return _view_counter
@@ -0,0 +1,41 @@
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+from .search import search_resource_ids
+
+
+class ResourceSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter that answers `?search=` from the
+    resource full-text index instead of LIKE scans over joined columns.
+
+    Matches come back in rank order unless the request also asks for an
+    explicit `ordering`. List it after OrderingFilter so the rank is not
+    overridden by the view's default ordering.
+
+    Cursor pages are ordered by a column, not by rank, so `?cursor=` is
+    rejected for searches in rank order; page those with limit/offset.
+    """
+    cursor_param = 'cursor'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+
+        ranked = api_settings.ORDERING_PARAM not in request.query_params
+        if ranked and self.cursor_param in request.query_params:
+            raise ValidationError({self.cursor_param: "Search results are paged with limit and offset"})
+
+        resource_ids = search_resource_ids(query)
+        queryset = queryset.filter(pk__in=resource_ids)
+        if not resource_ids or not ranked:
+            return queryset
+
+        rank = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(resource_ids)],
+            output_field=IntegerField()
+        )
+        return queryset.order_by(rank)
@@ -0,0 +1,139 @@
+import random
+import statistics
+import time
+from functools import reduce
+from operator import and_, or_
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from resources.models import Resource, ResourceCategory
+from resources.search import get_resource_index, indexable_resources, search_resource_ids
+
+# What ResourceViewSet searched with SearchFilter before the index existed
+LEGACY_SEARCH_FIELDS = ('title', 'description', 'category__name', 'subject__name')
+
+DEFAULT_QUERIES = ('algebra', 'circuit repair', 'intro', 'chem lab safety', 'python basics')
+
+VOCABULARY = (
+    'algebra', 'geometry', 'calculus', 'physics', 'chemistry', 'biology', 'python', 'basics',
+    'introduction', 'advanced', 'circuit', 'repair', 'laptop', 'screen', 'battery', 'lab',
+    'safety', 'exam', 'practice', 'guide', 'notes', 'video', 'lecture', 'homework', 'solutions',
+    'history', 'writing', 'essay', 'grammar', 'statistics', 'probability', 'network', 'router',
+)
+SYLLABLES = ('ka', 'lo', 'mi', 'ran', 'te', 'vo', 'sul', 'dex', 'no', 'pi', 'tor', 'ga')
+
+
+class Command(BaseCommand):
+    help = "Compare resource search through the full-text index with the old SearchFilter LIKE scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries', help="Query to time; repeatable")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=20, help="Page size fetched per search")
+        parser.add_argument(
+            '--synthetic', type=int, default=0,
+            help="Generate this many throwaway resources first; they are rolled back afterwards"
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['synthetic']:
+                self.generate(options['synthetic'], random.Random(options['seed']))
+            try:
+                self.run(options)
+            finally:
+                # Never keep benchmark data, synthetic or otherwise
+                transaction.set_rollback(True)
+
+    def generate(self, count, rng):
+        author = get_user_model().objects.create_user(
+            f'benchmark-{time.time_ns()}@example.invalid',
+            first_name='Benchmark',
+            last_name='Author',
+            role='teacher'
+        )
+        categories = [ResourceCategory.objects.create(name=word.title()) for word in VOCABULARY[:8]]
+
+        # Real words mixed into a larger Zipf-distributed filler vocabulary, so
+        # term frequencies look like natural text rather than every word everywhere
+        filler = list({
+            ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            for _ in range(5000)
+        })
+        vocabulary = list(VOCABULARY) + filler
+        rng.shuffle(vocabulary)
+        weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+
+        def words(n):
+            return ' '.join(rng.choices(vocabulary, weights, k=n))
+
+        resources = Resource.objects.bulk_create([
+            Resource(
+                title=words(rng.randint(2, 6)),
+                description=words(rng.randint(20, 120)),
+                resource_type='link',
+                external_url='https://example.invalid/',
+                author=author,
+                category=rng.choice(categories)
+            )
+            for _ in range(count)
+        ], batch_size=1000)
+
+        # bulk_create sends no post_save, so index the batch directly
+        started = time.perf_counter()
+        get_resource_index().index(indexable_resources().filter(pk__in=[resource.pk for resource in resources]))
+        self.stdout.write(f"Generated and indexed {count} resource(s) in {time.perf_counter() - started:.2f}s")
+
+    def run(self, options):
+        limit = options['limit']
+        total = Resource.objects.count()
+        self.stdout.write(f"{total} resource(s), {get_resource_index().__class__.__name__}, {options['iterations']} iteration(s)")
+
+        for query in options['queries'] or DEFAULT_QUERIES:
+            legacy_timings, legacy_ids = self.time(options['iterations'], lambda: self.legacy_page(query, limit))
+            index_timings, index_ids = self.time(options['iterations'], lambda: self.index_page(query, limit))
+            overlap = len(set(legacy_ids) & set(index_ids))
+            self.stdout.write(
+                f"{query!r:>24}  SearchFilter {self.summary(legacy_timings)}  "
+                f"index {self.summary(index_timings)}  "
+                f"speedup {statistics.median(legacy_timings) / max(statistics.median(index_timings), 1e-9):.1f}x  "
+                f"overlap {overlap}/{limit}"
+            )
+
+    def legacy_page(self, query, limit):
+        terms = query.split()
+        if not terms:
+            return []
+        condition = reduce(and_, [
+            reduce(or_, [Q(**{f'{field}__icontains': term}) for field in LEGACY_SEARCH_FIELDS])
+            for term in terms
+        ])
+        queryset = Resource.objects.filter(condition).distinct().order_by('-created_at')
+        # The paginated endpoint pays for the total as well; the index path gets it from len()
+        queryset.count()
+        return list(queryset.values_list('pk', flat=True)[:limit])
+
+    def index_page(self, query, limit):
+        resource_ids = search_resource_ids(query)[:limit]
+        found = set(Resource.objects.filter(pk__in=resource_ids).values_list('pk', flat=True))
+        return [pk for pk in resource_ids if pk in found]
+
+    @staticmethod
+    def time(iterations, func):
+        timings = []
+        result = None
+        for _ in range(max(iterations, 1)):
+            started = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings, result
+
+    @staticmethod
+    def summary(timings):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return f"median {statistics.median(timings):7.2f}ms p95 {p95:7.2f}ms"
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from resources.search import get_resource_index, indexable_resources
+
+
+class Command(BaseCommand):
+    help = "Rebuild the resource full-text search index from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        index = get_resource_index()
+        index.clear()
+
+        batch = []
+        total = 0
+        for resource in indexable_resources().order_by('id').iterator(chunk_size=options['batch_size']):
+            batch.append(resource)
+            if len(batch) >= options['batch_size']:
+                index.index(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            index.index(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {total} resource(s) with {index.__class__.__name__}"
+        ))
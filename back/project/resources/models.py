@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from academics.models import Subject
 
@@ -11,6 +13,23 @@ class ResourceCategory(models.Model):
         return self.name
 
 
+class ResourceQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Join author, category and subject and annotate `comment_total`, so a
+        page of resources serializes without any per-row queries. The count
+        is a correlated subquery on the comments' resource index rather than
+        a GROUP BY over every joined column.
+        """
+        comment_total = ResourceComment.objects.filter(
+            resource=OuterRef('pk')
+        ).order_by().values('resource').annotate(count=Count('pk')).values('count')
+        
+        return self.select_related('author', 'category', 'subject').annotate(
+            comment_total=Coalesce(Subquery(comment_total), 0)
+        )
+
+
 class Resource(models.Model):
     RESOURCE_TYPES = (
         ('video', 'Video Tutorial'),
@@ -47,6 +66,8 @@ class Resource(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ResourceQuerySet.as_manager()
+    
     def __str__(self):
         return self.title
 
@@ -69,4 +90,60 @@ class ResourceComment(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Comment by {self.user.email} on {self.resource.title}"
\ No newline at end of file
+        return f"Comment by {self.user.email} on {self.resource.title}"
+
+
+class ResourceSearchTerm(models.Model):
+    """
+    Posting list entry for resource search when SQLite FTS5 is not
+    available: `term` occurs in `resource` with a field-weighted frequency
+    of `weight`.
+    """
+    term = models.CharField(max_length=64)
+    resource = models.ForeignKey(
+        Resource,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    weight = models.PositiveIntegerField(default=1)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'resource'], name='resource_search_term_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} in resource {self.resource_id}"
+
+
+class ResourceTrendingScore(models.Model):
+    """
+    Materialized trending score for a resource, maintained by
+    resources.trending as views and comments arrive.
+
+    `score` is log2 of the forward-decayed activity sum, measured in
+    half-lives since a fixed epoch, so rows compare correctly without ever
+    being rewritten as time passes. Subject and category are copied from
+    the resource so per-subject and per-category feeds are index range
+    scans on this table alone.
+    """
+    resource = models.OneToOneField(
+        Resource,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending'
+    )
+    subject_id = models.BigIntegerField(null=True, blank=True)
+    category_id = models.BigIntegerField()
+    score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='resource_trending_idx'),
+            models.Index(fields=['subject_id', '-score'], name='resource_trending_subject_idx'),
+            models.Index(fields=['category_id', '-score'], name='resource_trending_cat_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Trending score {self.score:.2f} for resource {self.resource_id}"
\ No newline at end of file
@@ -0,0 +1,45 @@
+from rest_framework.pagination import BasePagination, CursorPagination, LimitOffsetPagination
+
+
+class ResourceLimitOffsetPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
+
+
+class ResourceCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = '-created_at'
+
+
+class ResourcePagination(BasePagination):
+    """
+    Limit/offset pagination by default; switches to cursor pagination when
+    the request carries a `cursor` parameter (send it empty for the first
+    page). Cursor pages skip the COUNT query and stay cheap deep into the
+    catalog, while limit/offset keeps `count` and random access for
+    clients that need them.
+    """
+    cursor_query_param = 'cursor'
+
+    def get_paginator(self, request):
+        if self.cursor_query_param in request.query_params:
+            return ResourceCursorPagination()
+        return ResourceLimitOffsetPagination()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return ResourceLimitOffsetPagination().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            ResourceLimitOffsetPagination().get_schema_operation_parameters(view) +
+            ResourceCursorPagination().get_schema_operation_parameters(view)
+        )
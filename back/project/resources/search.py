@@ -0,0 +1,207 @@
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+
+from .models import Resource, ResourceSearchTerm
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+
+# Indexed fields, in FTS5 column order, with their default ranking weights
+FIELDS = ('title', 'description', 'category', 'subject')
+DEFAULT_WEIGHTS = {'title': 10.0, 'description': 1.0, 'category': 4.0, 'subject': 4.0}
+
+
+def tokenize(text):
+    return [
+        token for token in TOKEN_RE.findall((text or '').lower())
+        if len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+def query_terms(query):
+    """Distinct query terms in typed order; the last one is matched as a prefix."""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def field_weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'RESOURCE_SEARCH_WEIGHTS', {})}
+
+
+def resource_fields(resource):
+    return {
+        'title': resource.title,
+        'description': resource.description,
+        'category': resource.category.name if resource.category_id else '',
+        'subject': resource.subject.name if resource.subject_id else '',
+    }
+
+
+class FTS5ResourceIndex:
+    """
+    Resource search backed by an SQLite FTS5 virtual table with one column
+    per indexed field.
+
+    Results are ranked with bm25 using RESOURCE_SEARCH_WEIGHTS as per-column
+    weights, so a hit in the title outranks the same hit in the description.
+    Every query term must match; the last one also matches as a prefix so
+    results can follow the user as they type.
+    """
+
+    table = 'resources_resource_fts'
+
+    def __init__(self):
+        self._ready = False
+
+    def ensure_table(self):
+        if self._ready:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                f"USING fts5({', '.join(FIELDS)}, tokenize='unicode61', prefix='2 3')"
+            )
+        self._ready = True
+
+    def index(self, resources):
+        self.ensure_table()
+        rows = []
+        for resource in resources:
+            fields = resource_fields(resource)
+            rows.append((resource.pk, *(fields[name] for name in FIELDS)))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, {', '.join(FIELDS)}) "
+                f"VALUES (%s, {', '.join('%s' for _ in FIELDS)})",
+                rows
+            )
+
+    def remove(self, resource_ids):
+        self.ensure_table()
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in resource_ids])
+
+    def clear(self):
+        self.ensure_table()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, terms, limit):
+        self.ensure_table()
+        match = ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        weights = field_weights()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {', '.join('%s' for _ in FIELDS)}), rowid DESC LIMIT %s",
+                [match, *(float(weights[name]) for name in FIELDS), limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostingsResourceIndex:
+    """
+    Portable resource search backed by the ResourceSearchTerm posting table.
+
+    Each resource contributes one row per distinct term, weighted by how
+    often the term occurs in each field times that field's weight. A query
+    keeps resources matching every term (the last as a prefix) and ranks
+    them by summed weight, newest first on ties.
+    """
+
+    def index(self, resources):
+        resources = list(resources)
+        weights = field_weights()
+        terms = []
+        for resource in resources:
+            scores = Counter()
+            for name, text in resource_fields(resource).items():
+                for term, count in Counter(tokenize(text)).items():
+                    scores[term] += count * weights[name]
+            terms.extend(
+                ResourceSearchTerm(term=term, resource_id=resource.pk, weight=max(int(round(score)), 1))
+                for term, score in scores.items()
+            )
+        with transaction.atomic():
+            ResourceSearchTerm.objects.filter(resource_id__in=[resource.pk for resource in resources]).delete()
+            ResourceSearchTerm.objects.bulk_create(terms, batch_size=500)
+
+    def remove(self, resource_ids):
+        ResourceSearchTerm.objects.filter(resource_id__in=resource_ids).delete()
+
+    def clear(self):
+        ResourceSearchTerm.objects.all().delete()
+
+    def search(self, terms, limit):
+        exact, prefix = terms[:-1], terms[-1]
+        # Map every posting back to the query term it satisfied so matches can be counted per term
+        query_term = Case(
+            When(term__in=exact, then=F('term')),
+            default=Value(f'{prefix}*'),
+            output_field=CharField()
+        )
+        # A range rather than startswith, which SQLite compiles to a LIKE that skips the index
+        matches = ResourceSearchTerm.objects.filter(
+            Q(term__in=exact) | Q(term__gte=prefix, term__lt=prefix + '\uffff')
+        ).values('resource_id').annotate(
+            matched=Count(query_term, distinct=True),
+            score=Sum('weight')
+        ).filter(
+            matched=len(terms)
+        ).order_by('-score', '-resource_id')
+        return [row['resource_id'] for row in matches[:limit]]
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.resources_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.resources_fts5_probe")
+    except Exception:
+        return False
+    return True
+
+
+_index = None
+
+
+def get_resource_index():
+    """
+    Return the configured resource search backend. RESOURCE_SEARCH_BACKEND
+    may be 'fts5', 'postings' or 'auto' (the default: FTS5 when SQLite
+    supports it).
+    """
+    global _index
+    if _index is None:
+        backend = getattr(settings, 'RESOURCE_SEARCH_BACKEND', 'auto')
+        if backend == 'fts5' or (backend == 'auto' and fts5_available()):
+            _index = FTS5ResourceIndex()
+        else:
+            _index = PostingsResourceIndex()
+    return _index
+
+
+def search_resource_ids(query, limit=None):
+    """Return ids of resources matching every term of `query`, best match first."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    limit = limit or getattr(settings, 'RESOURCE_SEARCH_MAX_RESULTS', 1000)
+    return get_resource_index().search(terms, limit)
+
+
+def indexable_resources():
+    """Resources with just the fields the index reads, category and subject joined."""
+    return Resource.objects.select_related('category', 'subject').only(
+        'id', 'title', 'description', 'category', 'subject', 'category__name', 'subject__name'
+    )
+
+
+def index_resources(resource_ids):
+    get_resource_index().index(indexable_resources().filter(pk__in=resource_ids))
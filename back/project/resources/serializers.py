@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from .models import ResourceCategory, Resource, ResourceComment
+from .counters import get_view_counter
+from uploads.serializers import ImageVariantsField, ImageVariantsListSerializer
 
 
 class ResourceCategorySerializer(serializers.ModelSerializer):
@@ -33,16 +35,19 @@ class ResourceSerializer(serializers.ModelSerializer):
     category_name = serializers.SerializerMethodField()
     subject_name = serializers.SerializerMethodField()
     comment_count = serializers.SerializerMethodField()
+    view_count = serializers.SerializerMethodField()
+    thumbnail_variants = ImageVariantsField(source='thumbnail')
     
     class Meta:
         model = Resource
         fields = (
             'id', 'title', 'description', 'resource_type', 'file', 'external_url',
-            'thumbnail', 'author', 'author_name', 'category', 'category_name',
+            'thumbnail', 'thumbnail_variants', 'author', 'author_name', 'category', 'category_name',
             'subject', 'subject_name', 'is_featured', 'view_count', 
             'created_at', 'updated_at', 'comment_count'
         )
         read_only_fields = ('author', 'is_featured', 'view_count', 'created_at', 'updated_at')
+        list_serializer_class = ImageVariantsListSerializer
     
     def get_author_name(self, obj):
         return f"{obj.author.first_name} {obj.author.last_name}"
@@ -54,8 +59,16 @@ class ResourceSerializer(serializers.ModelSerializer):
         return obj.subject.name if obj.subject else None
     
     def get_comment_count(self, obj):
+        # Annotated by Resource.objects.for_listing()
+        comment_total = getattr(obj, 'comment_total', None)
+        if comment_total is not None:
+            return comment_total
         return obj.comments.count()
     
+    def get_view_count(self, obj):
+        # Include views that are still buffered in this process
+        return obj.view_count + get_view_counter().pending(obj.pk)
+    
     def validate(self, data):
         # Validate that either file or external_url is provided based on resource_type
         resource_type = data.get('resource_type')
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from academics.models import Subject
+from core.http_cache import response_cache
+from uploads.images import image_derivatives
+from uploads.models import ImageDerivative
+from .models import Resource, ResourceCategory, ResourceComment, ResourceTrendingScore
+from .search import get_resource_index, index_resources
+from . import trending
+
+# Sent with `counts={resource_id: views}` after the view counter writes a batch,
+# since its F() updates do not send post_save
+views_flushed = Signal()
+
+# Cached catalog responses embed category, subject, author and comment details
+response_cache.invalidate_on(ResourceCategory, 'resource-categories', 'resources')
+response_cache.invalidate_on(Resource, 'resources')
+response_cache.invalidate_on(ResourceComment, 'resources')
+response_cache.invalidate_on(Subject, 'resources')
+response_cache.invalidate_on(get_user_model(), 'resources', fields=('first_name', 'last_name', 'role'))
+# Thumbnail variants appear in cached pages once generated
+response_cache.invalidate_on(
+    ImageDerivative, 'resources', fields=('status',),
+    when=lambda derivative: derivative.source.startswith(Resource.thumbnail.field.upload_to)
+)
+
+image_derivatives.watch(Resource, 'thumbnail')
+
+# Saves that only touch these fields leave the indexed text unchanged
+UNINDEXED_FIELDS = {'view_count', 'is_featured', 'updated_at', 'file', 'thumbnail', 'external_url'}
+
+
+@receiver(post_save, sender=Resource)
+def index_resource(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or set(update_fields) - UNINDEXED_FIELDS:
+        index_resources([instance.pk])
+
+
+@receiver(post_save, sender=Resource)
+def sync_trending_placement(sender, instance, created, **kwargs):
+    if not created:
+        ResourceTrendingScore.objects.filter(resource_id=instance.pk).exclude(
+            subject_id=instance.subject_id,
+            category_id=instance.category_id
+        ).update(subject_id=instance.subject_id, category_id=instance.category_id)
+
+
+@receiver(post_delete, sender=Resource)
+def unindex_resource(sender, instance, **kwargs):
+    get_resource_index().remove([instance.pk])
+
+
+@receiver(post_save, sender=ResourceCategory)
+def reindex_category_resources(sender, instance, created, **kwargs):
+    if not created:
+        index_resources(instance.resources.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Subject)
+def reindex_subject_resources(sender, instance, created, **kwargs):
+    if not created:
+        index_resources(instance.resources.values_list('pk', flat=True))
+
+
+@receiver(views_flushed, sender=Resource)
+def add_trending_views(sender, counts, **kwargs):
+    trending.record_views(counts)
+
+
+@receiver(post_save, sender=ResourceComment)
+def add_trending_comment(sender, instance, created, **kwargs):
+    if created:
+        trending.record_comment(instance.resource_id, instance.created_at)
@@ -0,0 +1,126 @@
+import threading
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from academics.models import Subject
+from core.http_cache import response_cache
+from uploads.images import image_derivatives
+from uploads.models import ImageDerivative
+from users.models import User
+from .counters import ViewCounter, get_view_counter
+from .models import Resource, ResourceCategory, ResourceComment
+
+
+class ViewCounterTests(SimpleTestCase):
+
+    def test_threads_spread_over_shards(self):
+        counter = ViewCounter(Resource, shards=4, flush_interval=3600, dedup_seconds=0)
+        threads = [threading.Thread(target=counter.record, args=(1,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        used = [shard for shard in counter.shards if shard.counts]
+        self.assertGreater(len(used), 1)
+        self.assertEqual(counter.pending(1), 8)
+        # Nothing left for the exit flush to write
+        counter._drain()
+
+
+class ResourceQueryTests(TestCase):
+    """Listing and detail pages cost a fixed number of queries however many rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author@example.com', 'password', role='teacher')
+        cls.category = ResourceCategory.objects.create(name='Guides')
+        cls.subject = Subject.objects.create(name='Maths')
+        cls.resources = [cls.create_resource(index) for index in range(3)]
+
+    @classmethod
+    def create_resource(cls, index):
+        resource = Resource.objects.create(
+            title=f'Resource {index}',
+            description='Description',
+            resource_type='link',
+            external_url='https://example.com/',
+            author=cls.author,
+            category=cls.category,
+            subject=cls.subject if index % 2 else None,
+            is_featured=index % 2 == 0
+        )
+        for _ in range(index % 3):
+            ResourceComment.objects.create(resource=resource, user=cls.author, content='Comment')
+        return resource
+
+    def tearDown(self):
+        get_view_counter().flush()
+
+    def get(self, url):
+        # Responses are cached; every request here has to reach the database
+        caches['default'].clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        # COUNT and the page
+        with self.assertNumQueries(2):
+            self.get('/api/resources/resources/')
+
+        for index in range(3, 10):
+            self.create_resource(index)
+        with self.assertNumQueries(2):
+            response = self.get('/api/resources/resources/')
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_list_with_thumbnails(self):
+        for index, resource in enumerate(self.resources):
+            resource.thumbnail = f'resource_thumbnails/{index}.png'
+            resource.save(update_fields=['thumbnail'])
+        image_derivatives.clear()
+
+        # COUNT, the page and the derivatives of every thumbnail on it
+        with self.assertNumQueries(3):
+            self.get('/api/resources/resources/')
+
+    def test_cursor_list(self):
+        with self.assertNumQueries(1):
+            self.get('/api/resources/resources/?cursor=')
+
+    def test_search_cursor(self):
+        # Cursor pages cannot follow the search rank
+        caches['default'].clear()
+        response = self.client.get('/api/resources/resources/?search=notes&cursor=')
+        self.assertEqual(response.status_code, 400)
+        self.get('/api/resources/resources/?search=notes&ordering=title&cursor=')
+
+    def test_filtered_lists(self):
+        for url in (
+            '/api/resources/resources/featured/',
+            f'/api/resources/resources/by_subject/?subject_id={self.subject.pk}',
+            f'/api/resources/resources/by_category/?category_id={self.category.pk}',
+        ):
+            with self.subTest(url=url), self.assertNumQueries(2):
+                self.get(url)
+
+    def test_detail(self):
+        resource = self.resources[2]
+        # The resource with its joins, then its comments with their users
+        with self.assertNumQueries(2):
+            response = self.get(f'/api/resources/resources/{resource.pk}/')
+        self.assertEqual(response.json()['comment_count'], 2)
+        self.assertEqual(len(response.json()['comments']), 2)
+
+
+class ResourceCacheTests(TestCase):
+
+    def test_only_thumbnail_derivatives_invalidate(self):
+        version = response_cache.version('resources')
+        ImageDerivative.objects.create(source='avatars/someone.png', status='ready')
+        self.assertEqual(response_cache.version('resources'), version)
+
+        ImageDerivative.objects.create(source='resource_thumbnails/cover.png', status='ready')
+        self.assertGreater(response_cache.version('resources'), version)
@@ -0,0 +1,98 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Abs, Greatest, Log, Power
+from django.utils import timezone
+
+from .models import Resource, ResourceTrendingScore
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# Score of a freshly created row before its first event is added; 2 ** EMPTY_SCORE is 0
+EMPTY_SCORE = -1e9
+
+
+def half_life_seconds():
+    return getattr(settings, 'RESOURCE_TRENDING_HALF_LIFE_HOURS', 24) * 3600
+
+
+def clock(at=None):
+    """Time as the number of half-lives since EPOCH."""
+    at = at or timezone.now()
+    return (at - EPOCH).total_seconds() / half_life_seconds()
+
+
+def decayed(score, at=None):
+    """Turn a stored log score into the activity it represents at `at`."""
+    return 2 ** (score - clock(at))
+
+
+def record_activity(weights, at=None):
+    """
+    Add weighted activity to resources' trending scores.
+
+    `weights` maps resource ids to the event weight to add. An event of
+    weight w at time t contributes log2(w) + clock(t) in log space, and is
+    merged into the stored score with an atomic log-add-exp UPDATE, so
+    concurrent writers never lose each other's events. Resources that share
+    a weight share one UPDATE.
+    """
+    weights = {resource_id: weight for resource_id, weight in weights.items() if weight > 0}
+    if not weights:
+        return
+
+    existing = set(
+        ResourceTrendingScore.objects.filter(resource_id__in=weights).values_list('resource_id', flat=True)
+    )
+    missing = [resource_id for resource_id in weights if resource_id not in existing]
+    if missing:
+        ResourceTrendingScore.objects.bulk_create([
+            ResourceTrendingScore(
+                resource_id=resource['id'],
+                subject_id=resource['subject_id'],
+                category_id=resource['category_id'],
+                score=EMPTY_SCORE
+            )
+            for resource in Resource.objects.filter(pk__in=missing).values('id', 'subject_id', 'category_id')
+        ], ignore_conflicts=True)
+
+    now = clock(at)
+    by_weight = defaultdict(list)
+    for resource_id, weight in weights.items():
+        by_weight[weight].append(resource_id)
+
+    for weight, resource_ids in by_weight.items():
+        event = Value(now + math.log2(weight))
+        # log2(2^a + 2^b) = max(a, b) + log2(1 + 2^-|a - b|)
+        ResourceTrendingScore.objects.filter(resource_id__in=resource_ids).update(
+            score=Greatest(F('score'), event) + Log(2, 1 + Power(2, -Abs(F('score') - event)))
+        )
+
+
+def record_views(counts, at=None):
+    view_weight = getattr(settings, 'RESOURCE_TRENDING_VIEW_WEIGHT', 1.0)
+    record_activity({resource_id: count * view_weight for resource_id, count in counts.items()}, at)
+
+
+def record_comment(resource_id, at=None):
+    record_activity({resource_id: getattr(settings, 'RESOURCE_TRENDING_COMMENT_WEIGHT', 5.0)}, at)
+
+
+def top_trending(limit, subject_id=None, category_id=None):
+    """
+    Return up to `limit` (resource id, decayed score) pairs, hottest first,
+    optionally within one subject and/or category.
+    """
+    scores = ResourceTrendingScore.objects.filter(score__gt=EMPTY_SCORE)
+    if subject_id is not None:
+        scores = scores.filter(subject_id=subject_id)
+    if category_id is not None:
+        scores = scores.filter(category_id=category_id)
+    now = timezone.now()
+    return [
+        (resource_id, decayed(score, now))
+        for resource_id, score in scores.order_by('-score').values_list('resource_id', 'score')[:limit]
+    ]
@@ -2,25 +2,54 @@ from rest_framework import viewsets, generics, permissions, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from .models import ResourceCategory, Resource, ResourceComment
 from .serializers import ResourceCategorySerializer, ResourceSerializer, ResourceDetailSerializer, ResourceCommentSerializer
 from users.permissions import IsTeacher, IsTechnician
+from .counters import get_view_counter
+from .pagination import ResourcePagination
+from .filters import ResourceSearchFilter
+from .trending import top_trending
+from core.http_cache import CachedResponseMixin
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
 
-class ResourceCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class ResourceCategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'resource-categories'
     queryset = ResourceCategory.objects.all()
     serializer_class = ResourceCategorySerializer
     permission_classes = [permissions.AllowAny]
 
 
-class ResourceViewSet(viewsets.ModelViewSet):
+class ResourceViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    cache_namespace = 'resources'
     queryset = Resource.objects.all()
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'description', 'category__name', 'subject__name']
+    pagination_class = ResourcePagination
+    # Search runs last so its relevance order wins over the default ordering
+    filter_backends = [filters.OrderingFilter, ResourceSearchFilter]
     ordering_fields = ['created_at', 'view_count', 'title']
     ordering = ['-created_at']
     
+    def get_queryset(self):
+        queryset = Resource.objects.for_listing()
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related(
+                Prefetch('comments', queryset=ResourceComment.objects.select_related('user'))
+            )
+        return queryset
+    
+    def list_response(self, queryset):
+        """Filter, order and paginate `queryset` the same way as `list`."""
+        queryset = self.filter_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+    
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ResourceDetailSerializer
@@ -31,21 +60,74 @@ class ResourceViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), (IsTeacher() | IsTechnician())]
         return [permissions.AllowAny()]
     
+    def viewer_key(self, request):
+        # Taken from the token claims rather than request.user so cached hits need no user lookup
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+        if raw_token is not None:
+            try:
+                return f"u{authentication.get_validated_token(raw_token)[jwt_settings.USER_ID_CLAIM]}"
+            except (InvalidToken, KeyError):
+                pass
+        return f"a{request.META.get('REMOTE_ADDR', '')}"
+    
+    def cache_hit(self, request, *args, **kwargs):
+        # Cached detail pages are still views
+        if self.action == 'retrieve' and str(kwargs.get('pk', '')).isdigit():
+            get_view_counter().record(int(kwargs['pk']), self.viewer_key(request))
+    
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         
-        # Increment view count
-        instance.view_count += 1
-        instance.save(update_fields=['view_count'])
+        # Buffered in memory and flushed as batched F() updates, off the read path
+        get_view_counter().record(instance.pk, self.viewer_key(request))
         
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def views(self, request, pk=None):
+        view_count = get_view_counter().current(int(pk)) if pk.isdigit() else None
+        if view_count is None:
+            return Response(
+                {"error": "Resource not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({'id': int(pk), 'view_count': view_count})
+    
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        featured_resources = Resource.objects.filter(is_featured=True)
-        serializer = self.get_serializer(featured_resources, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.get_queryset().filter(is_featured=True))
+    
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Top `limit` resources by time-decayed activity, optionally per subject/category."""
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            subject_id = request.query_params.get('subject_id')
+            subject_id = int(subject_id) if subject_id else None
+            category_id = request.query_params.get('category_id')
+            category_id = int(category_id) if category_id else None
+        except ValueError:
+            return Response(
+                {"error": "limit, subject_id and category_id must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ranked = top_trending(limit, subject_id=subject_id, category_id=category_id)
+        resources = self.get_queryset().in_bulk([resource_id for resource_id, _ in ranked])
+        
+        # Serialized as one list so derivative lookups are batched
+        ranked = [
+            (resources[resource_id], trending_score)
+            for resource_id, trending_score in ranked
+            if resource_id in resources
+        ]
+        data = self.get_serializer([resource for resource, _ in ranked], many=True).data
+        for item, (_, trending_score) in zip(data, ranked):
+            item['trending_score'] = round(trending_score, 4)
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def by_subject(self, request):
@@ -56,9 +138,7 @@ class ResourceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        resources = Resource.objects.filter(subject_id=subject_id)
-        serializer = self.get_serializer(resources, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.get_queryset().filter(subject_id=subject_id))
     
     @action(detail=False, methods=['get'])
     def by_category(self, request):
@@ -69,15 +149,11 @@ class ResourceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        resources = Resource.objects.filter(category_id=category_id)
-        serializer = self.get_serializer(resources, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.get_queryset().filter(category_id=category_id))
     
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def my_resources(self, request):
-        resources = Resource.objects.filter(author=request.user)
-        serializer = self.get_serializer(resources, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.get_queryset().filter(author=request.user))
 
 
 class ResourceCommentCreateView(generics.CreateAPIView):
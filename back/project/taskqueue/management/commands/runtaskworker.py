@@ -0,0 +1,92 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from taskqueue.worker import claim, execute
+
+
+def _init_process():
+    # Children must not share the parent's database connections; under the
+    # spawn start method they also need Django set up from scratch
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks with a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait for new tasks when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once no tasks are due")
+
+    def handle(self, *args, **options):
+        self.processes = max(options['processes'], 1)
+        self.poll_interval = options['poll_interval']
+        self.once = options['once']
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        self.counts = {}
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.stdout.write(f"Task worker {self.worker_id} running with {self.processes} process(es)")
+        # A child that dies takes the whole pool down; start a new one and carry on
+        while self.run_pool():
+            self.stderr.write("Worker pool broke; restarting it")
+
+        summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(self.counts.items())) or 'nothing'
+        self.stdout.write(self.style.SUCCESS(f"Task worker stopped: {summary}"))
+
+    def run_pool(self):
+        """Process tasks until stopped; returns True if the pool broke and should be restarted."""
+        connections.close_all()
+        inflight = {}
+        with ProcessPoolExecutor(self.processes, initializer=_init_process) as pool:
+            while True:
+                if not self.stopping:
+                    # Keep every process busy with one task queued behind it
+                    for task in claim(self.processes * 2 - len(inflight), self.worker_id):
+                        try:
+                            inflight[pool.submit(execute, task.id, task.locked_by)] = task
+                        except BrokenProcessPool:
+                            # Unsubmitted claims are picked up again once their lease expires
+                            return True
+
+                if not inflight:
+                    if self.stopping or self.once:
+                        return False
+                    time.sleep(self.poll_interval)
+                    continue
+
+                # Poll for more work soon while there is room for it
+                full = len(inflight) >= self.processes * 2
+                done, _ = wait(list(inflight), timeout=self.poll_interval if full else 0.05,
+                               return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    task = inflight.pop(future)
+                    try:
+                        outcome = future.result()
+                    except BrokenProcessPool:
+                        # The lease expires and the task is claimed again
+                        outcome = 'crashed'
+                        broken = True
+                    self.counts[outcome] = self.counts.get(outcome, 0) + 1
+                    if outcome != 'succeeded':
+                        self.stdout.write(f"{task.name} #{task.id}: {outcome} (attempt {task.attempts})")
+                if broken:
+                    return True
+
+    def stop(self, signum, frame):
+        self.stopping = True
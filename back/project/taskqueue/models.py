@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """
+    A queued call to a function registered with @taskqueue.registry.task.
+
+    Workers claim due tasks by moving them to 'running' with a lease
+    (`locked_by`, `locked_until`); a task whose lease runs out is claimable
+    again, so a crashed worker never strands work. `idempotency_key` is
+    unique, so enqueueing the same side effect twice yields one task.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='taskqueue_due_idx'),
+            models.Index(fields=['status', 'locked_until'], name='taskqueue_lease_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
\ No newline at end of file
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Task
+
+_registry = {}
+
+
+class TaskFunction:
+    """
+    A function that can be queued with `.delay()`. Calling it directly runs
+    it inline as usual.
+    """
+
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, idempotency_key=None, countdown=0, **kwargs):
+        """
+        Queue a call with JSON-serializable arguments. The row is written in
+        the caller's transaction, so the task exists only if the request's
+        own write commits. With `idempotency_key`, a task already queued
+        under that key is returned instead of queueing a second one.
+
+        When TASKS_ALWAYS_EAGER is set the call runs inline instead.
+        """
+        if getattr(settings, 'TASKS_ALWAYS_EAGER', False):
+            self.func(*args, **kwargs)
+            return None
+
+        task = Task(
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs,
+            idempotency_key=idempotency_key,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=countdown)
+        )
+        if idempotency_key is None:
+            task.save()
+            return task
+        try:
+            with transaction.atomic():
+                task.save()
+        except IntegrityError:
+            return Task.objects.get(idempotency_key=idempotency_key)
+        return task
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """
+    Register a function as a background task:
+
+        @task
+        def notify(question_id, message): ...
+
+        notify.delay(question.id, "Assigned", idempotency_key=f"assigned:{question.id}")
+    """
+    def register(func):
+        task_function = TaskFunction(
+            func,
+            name or f'{func.__module__}.{func.__name__}',
+            max_attempts or getattr(settings, 'TASKS_MAX_ATTEMPTS', 5)
+        )
+        _registry[task_function.name] = task_function
+        return task_function
+
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    return _registry[name]
@@ -0,0 +1,89 @@
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+from .registry import get_task
+
+
+def lease_seconds():
+    return getattr(settings, 'TASKS_LEASE_SECONDS', 300)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: base * 2^(attempts - 1), capped."""
+    base = getattr(settings, 'TASKS_RETRY_BACKOFF', 2)
+    cap = getattr(settings, 'TASKS_RETRY_BACKOFF_MAX', 600)
+    delay = min(base * 2 ** (attempts - 1), cap)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def claim(limit, worker_id=None):
+    """
+    Lease up to `limit` due tasks to a fresh claim token and return them.
+
+    Candidates are due queued tasks or running tasks whose lease expired.
+    The UPDATE re-checks those conditions, so when several workers race for
+    the same rows each row goes to exactly one of them.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    claimable = Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+    candidate_ids = list(
+        Task.objects.filter(claimable).order_by('run_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    if not candidate_ids:
+        return []
+
+    token = f'{worker_id or "worker"}:{uuid.uuid4().hex[:12]}'
+    Task.objects.filter(claimable, pk__in=candidate_ids).update(
+        status='running',
+        locked_by=token,
+        locked_until=now + timedelta(seconds=lease_seconds()),
+        attempts=F('attempts') + 1
+    )
+    return list(Task.objects.filter(locked_by=token, status='running').order_by('run_at', 'id'))
+
+
+def execute(task_id, token):
+    """
+    Run one claimed task and record the outcome. Failures are retried with
+    backoff until max_attempts, then marked failed. Outcomes are only
+    written while the claim is still ours, so a task whose lease expired and
+    was picked up elsewhere is not overwritten.
+    """
+    close_old_connections()
+    try:
+        task = Task.objects.filter(pk=task_id, locked_by=token).first()
+        if task is None:
+            return 'lost'
+
+        try:
+            get_task(task.name).func(*task.args, **task.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            if task.attempts >= task.max_attempts:
+                outcome = {'status': 'failed', 'finished_at': timezone.now()}
+            else:
+                outcome = {
+                    'status': 'queued',
+                    'run_at': timezone.now() + timedelta(seconds=retry_delay(task.attempts))
+                }
+            Task.objects.filter(pk=task_id, locked_by=token).update(
+                last_error=error[-4000:], locked_by='', locked_until=None, **outcome
+            )
+            return outcome['status']
+
+        Task.objects.filter(pk=task_id, locked_by=token).update(
+            status='succeeded', finished_at=timezone.now(), locked_by='', locked_until=None
+        )
+        return 'succeeded'
+    finally:
+        close_old_connections()
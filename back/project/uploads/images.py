@@ -0,0 +1,235 @@
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+
+from .models import ImageDerivative
+
+# Longest side in pixels for each generated size
+DEFAULT_SIZES = {'thumb': 160, 'small': 480, 'medium': 1024}
+
+# Derivative format name -> (Pillow format, file extension)
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'png': ('PNG', 'png'),
+    'webp': ('WEBP', 'webp'),
+}
+
+
+def derivative_sizes():
+    return getattr(settings, 'IMAGE_DERIVATIVE_SIZES', DEFAULT_SIZES)
+
+
+def derivative_name(sha256, size, fmt):
+    return f'derivatives/{sha256[:2]}/{sha256}/{size}.{FORMATS[fmt][1]}'
+
+
+def render_variants(data, sha256):
+    """
+    Write every configured size of the image in `data` as its original
+    family (JPEG, or PNG when it has transparency) plus WebP. Files are
+    named by content hash, so ones that already exist are left alone.
+    Sizes that would not be smaller than the previous one are skipped.
+    """
+    from PIL import Image, ImageOps
+
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 82)
+    sizes = sorted(derivative_sizes().items(), key=lambda item: item[1], reverse=True)
+
+    with Image.open(io.BytesIO(data)) as source:
+        # Let the JPEG decoder downscale while loading instead of decoding full resolution
+        source.draft('RGB', (sizes[0][1], sizes[0][1]))
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    base_format = 'png' if has_alpha else 'jpeg'
+    variants = {}
+    previous = None
+    # Largest first, each size resampled from the last to keep the work proportional to the output
+    for size, longest_side in sizes:
+        image.thumbnail((longest_side, longest_side), Image.LANCZOS)
+        if image.size == previous:
+            continue
+        previous = image.size
+
+        for fmt in (base_format, 'webp'):
+            name = derivative_name(sha256, size, fmt)
+            if default_storage.exists(name):
+                continue
+            buffer = io.BytesIO()
+            options = {'optimize': True}
+            if fmt == 'jpeg':
+                options.update(quality=quality, progressive=True)
+            elif fmt == 'webp':
+                options = {'quality': quality, 'method': 4}
+            image.save(buffer, FORMATS[fmt][0], **options)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+
+        variants[size] = {'width': image.size[0], 'height': image.size[1], 'formats': [base_format, 'webp']}
+    return variants
+
+
+class DerivativePipeline:
+    """
+    Generates image derivatives off the request path.
+
+    Sources are queued once their transaction commits and processed by a
+    pool of IMAGE_DERIVATIVE_WORKERS threads (Pillow releases the GIL while
+    resampling and encoding); with 0 workers they are processed inline. With
+    IMAGE_DERIVATIVES_VIA_TASKS they go to the task queue instead, so
+    `runtaskworker` processes do the work.
+    Serializers read the results through `urls`, which is served from a
+    bounded in-process cache once a source is ready, since the derivatives
+    of a stored file never change. List serializers fill the cache for a
+    whole page up front with `lookup_many`.
+    """
+
+    def __init__(self, workers=None, cache_size=None, miss_ttl=None):
+        self.workers = workers if workers is not None else getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2)
+        self.cache_size = cache_size or getattr(settings, 'IMAGE_DERIVATIVE_CACHE_SIZE', 10000)
+        self.miss_ttl = miss_ttl if miss_ttl is not None else getattr(settings, 'IMAGE_DERIVATIVE_MISS_TTL', 10)
+        self.watched = []
+        self._executor = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def watch(self, model, field):
+        """Generate derivatives whenever `model` is saved with a new file in `field`."""
+        def on_save(sender, instance, update_fields=None, **kwargs):
+            if update_fields is not None and field not in update_fields:
+                return
+            self.submit([getattr(instance, field).name])
+
+        self.watched.append((model, field))
+        post_save.connect(on_save, sender=model, weak=False, dispatch_uid=f'derivatives:{model._meta.label}:{field}')
+
+    def submit(self, names):
+        names = [name for name in dict.fromkeys(names) if name and not self.is_ready(name)]
+        if names:
+            transaction.on_commit(lambda: self._dispatch(names))
+
+    def _dispatch(self, names):
+        if getattr(settings, 'IMAGE_DERIVATIVES_VIA_TASKS', False):
+            from .tasks import generate_image_derivatives
+            for name in names:
+                key = hashlib.sha256(name.encode()).hexdigest()
+                generate_image_derivatives.delay(name, idempotency_key=f'derivatives:{key}')
+            return
+        if not self.workers:
+            for name in names:
+                self.generate(name)
+            return
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='image-derivatives')
+        for name in names:
+            self._executor.submit(self._run, name)
+
+    def _run(self, name):
+        try:
+            self.generate(name)
+        except Exception:
+            # Marked failed in generate(); a backfill can retry it
+            pass
+        finally:
+            close_old_connections()
+
+    def generate(self, name, force=False):
+        derivative, _ = ImageDerivative.objects.get_or_create(source=name)
+        if derivative.status == 'ready' and not force:
+            return derivative
+
+        try:
+            with default_storage.open(name, 'rb') as source:
+                data = source.read()
+            sha256 = hashlib.sha256(data).hexdigest()
+
+            twin = ImageDerivative.objects.filter(sha256=sha256, status='ready').exclude(pk=derivative.pk).first()
+            derivative.variants = twin.variants if twin and not force else render_variants(data, sha256)
+            derivative.sha256 = sha256
+            derivative.status = 'ready'
+        except Exception:
+            derivative.status = 'failed'
+            derivative.save(update_fields=['status', 'updated_at'])
+            raise
+        derivative.save(update_fields=['sha256', 'variants', 'status', 'updated_at'])
+        self._store(name, derivative)
+        return derivative
+
+    def _cached(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            derivative, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[name]
+                return None
+            self._entries.move_to_end(name)
+            return entry
+
+    def _store(self, name, derivative):
+        # Ready sources are final; anything else is re-checked after miss_ttl
+        ready = derivative is not None and derivative.status == 'ready'
+        with self._lock:
+            self._entries[name] = (derivative, None if ready else time.monotonic() + self.miss_ttl)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.cache_size:
+                self._entries.popitem(last=False)
+
+    def is_ready(self, name):
+        entry = self._cached(name)
+        return entry is not None and entry[0] is not None and entry[0].status == 'ready'
+
+    def lookup(self, name):
+        entry = self._cached(name)
+        if entry is not None:
+            return entry[0]
+        derivative = ImageDerivative.objects.filter(source=name).first()
+        self._store(name, derivative)
+        return derivative
+
+    def lookup_many(self, names):
+        """Load the derivatives of every name in `names` that is not cached yet with one query."""
+        missing = [name for name in dict.fromkeys(names) if name and self._cached(name) is None]
+        if not missing:
+            return
+        found = {derivative.source: derivative for derivative in ImageDerivative.objects.filter(source__in=missing)}
+        for name in missing:
+            self._store(name, found.get(name))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def urls(self, file, request=None):
+        """
+        Return {size: {format: url}} for a stored image file, or an empty
+        dict until its derivatives are ready.
+        """
+        if not file:
+            return {}
+        derivative = self.lookup(file.name)
+        if derivative is None or derivative.status != 'ready':
+            return {}
+
+        urls = {}
+        for size, variant in derivative.variants.items():
+            urls[size] = {}
+            for fmt in variant['formats']:
+                url = default_storage.url(derivative_name(derivative.sha256, size, fmt))
+                urls[size][fmt] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+image_derivatives = DerivativePipeline()
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from uploads.images import image_derivatives
+from uploads.models import ImageDerivative
+
+
+class Command(BaseCommand):
+    help = "Generate missing image derivatives for every watched image field"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true', help="Regenerate derivatives that are already ready")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in image_derivatives.watched:
+            names.update(
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True)
+            )
+        if not options['force']:
+            names -= set(ImageDerivative.objects.filter(status='ready').values_list('source', flat=True))
+
+        def generate(name):
+            try:
+                image_derivatives.generate(name, force=options['force'])
+                return True
+            except Exception as error:
+                self.stderr.write(f"{name}: {error}")
+                return False
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max(options['workers'], 1)) as executor:
+            results = list(executor.map(generate, sorted(names)))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated derivatives for {sum(results)} image(s), {results.count(False)} failed"
+        ))
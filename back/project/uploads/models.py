@@ -0,0 +1,84 @@
+import os
+import uuid
+
+from django.db import models
+from django.conf import settings
+
+
+class StoredBlob(models.Model):
+    """
+    A completed upload stored once per distinct content, keyed by SHA-256.
+    Attachments reference the blob's file, so repeat uploads share storage.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='blobs/', max_length=255)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Blob {self.sha256}"
+
+
+class UploadSession(models.Model):
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('verifying', 'Verifying'),
+        ('complete', 'Complete'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # SHA-256 declared by the client, checked against the received bytes
+    sha256 = models.CharField(max_length=64, blank=True)
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.PROTECT,
+        related_name='sessions',
+        null=True,
+        blank=True
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    # Set while a chunk is being written; see storage.write_chunk
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def partial_path(self):
+        return os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial', f'{self.id}.part')
+    
+    def __str__(self):
+        return f"Upload {self.filename} ({self.offset}/{self.size})"
+
+
+class ImageDerivative(models.Model):
+    """
+    Resized and WebP variants generated for one stored image file.
+
+    `source` is the storage name of the original and `sha256` the hash of
+    its bytes; the variant files live under that hash, so identical images
+    uploaded under different names share one set of derivatives. `variants`
+    maps size names to {'width', 'height', 'formats'}.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+    
+    source = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Derivatives of {self.source} ({self.status})"
\ No newline at end of file
@@ -0,0 +1,73 @@
+from django.db import models
+from rest_framework import serializers
+from .images import image_derivatives
+from .models import UploadSession
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    file = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'filename', 'size', 'offset', 'sha256', 'status', 'file', 'created_at')
+        read_only_fields = ('id', 'offset', 'status', 'created_at')
+    
+    def get_file(self, obj):
+        if obj.blob is None:
+            return None
+        request = self.context.get('request')
+        url = obj.blob.file.url
+        return request.build_absolute_uri(url) if request else url
+    
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and (len(value) != 64 or any(char not in '0123456789abcdef' for char in value)):
+            raise serializers.ValidationError("sha256 must be a hex digest")
+        return value
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only {size: {format: url}} map of the derivatives of an image
+    field, e.g. `image_variants = ImageVariantsField(source='image')`.
+    Empty until the derivatives have been generated.
+    """
+    
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        return image_derivatives.urls(value, self.context.get('request'))
+
+
+class ImageVariantsListSerializer(serializers.ListSerializer):
+    """
+    Loads the derivatives behind every ImageVariantsField of the child
+    serializer for the whole list in one query, instead of one per row.
+    Nested lists that use this class too are included, so a page of
+    repairs loads the derivatives of all their images at once; those
+    relations should be prefetched. Set it as `list_serializer_class` in
+    the child's Meta.
+    """
+    
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        image_derivatives.lookup_many([
+            name for instance in iterable for name in self.image_names(self.child, instance)
+        ])
+        return super().to_representation(iterable)
+    
+    @classmethod
+    def image_names(cls, serializer, instance):
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, ImageVariantsField):
+                yield field.get_attribute(instance).name
+            elif isinstance(field, cls):
+                related = field.get_attribute(instance)
+                if isinstance(related, models.manager.BaseManager):
+                    related = related.all()
+                for item in related or ():
+                    yield from cls.image_names(field.child, item)
@@ -0,0 +1,223 @@
+import hashlib
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import StoredBlob, UploadSession
+
+READ_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    """Raised when a chunk does not start where the session left off."""
+
+    def __init__(self, expected):
+        super().__init__(f"Expected chunk at offset {expected}")
+        self.expected = expected
+
+
+def chunk_lease_seconds():
+    return getattr(settings, 'UPLOAD_CHUNK_LEASE_SECONDS', 300)
+
+
+def write_chunk(session, offset, stream, length):
+    """
+    Stream `length` bytes from `stream` into the session's partial file at
+    `offset`, then advance the session offset.
+
+    The chunk first claims the session with a short lease, which only
+    succeeds while the offset is still `offset` and no other chunk holds the
+    lease, so a retried or racing request is turned away before it writes
+    anything. Bytes below the committed offset are never touched.
+
+    Once the last byte is in, the session moves to `verifying` and a task
+    hashes and stores it, so the final request does not wait on that.
+    """
+    if offset != session.offset:
+        raise OffsetMismatch(session.offset)
+    if offset + length > session.size:
+        raise serializers.ValidationError("Chunk runs past the declared upload size")
+
+    now = timezone.now()
+    lease = now + timedelta(seconds=chunk_lease_seconds())
+    claimed = UploadSession.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        pk=session.pk,
+        offset=offset,
+        status='uploading'
+    ).update(locked_until=lease)
+    if not claimed:
+        session.refresh_from_db(fields=['offset'])
+        raise OffsetMismatch(session.offset)
+
+    received = 0
+    try:
+        path = session.partial_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as partial:
+            partial.seek(offset)
+            while received < length:
+                data = stream.read(min(READ_SIZE, length - received))
+                if not data:
+                    break
+                partial.write(data)
+                received += len(data)
+            # Drop whatever an abandoned chunk left past this one
+            partial.truncate()
+    finally:
+        # Commit the bytes and release the lease, unless it expired and
+        # another chunk has taken over
+        received_all = offset + received == session.size
+        advanced = UploadSession.objects.filter(
+            pk=session.pk,
+            offset=offset,
+            locked_until=lease
+        ).update(
+            offset=offset + received,
+            status='verifying' if received_all else 'uploading',
+            locked_until=None
+        )
+    if not advanced:
+        session.refresh_from_db(fields=['offset'])
+        raise OffsetMismatch(session.offset)
+
+    session.offset = offset + received
+    if received_all:
+        from .tasks import finalize_upload
+
+        session.status = 'verifying'
+        finalize_upload.delay(str(session.pk))
+        # Pick up the result when tasks run inline
+        session.refresh_from_db(fields=['offset', 'sha256', 'blob', 'status'])
+    return session
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize(session):
+    """
+    Verify a fully received upload and turn it into a StoredBlob, reusing an
+    existing blob with the same content. If the bytes do not match the
+    declared sha256 they are dropped and the session starts over at offset 0.
+    """
+    path = session.partial_path
+    sha256 = file_sha256(path)
+    if session.sha256 and session.sha256 != sha256:
+        # Start over rather than keep bytes that do not match
+        os.remove(path)
+        UploadSession.objects.filter(pk=session.pk).update(offset=0, status='uploading')
+        session.offset = 0
+        session.status = 'uploading'
+        return session
+
+    blob = StoredBlob.objects.filter(sha256=sha256).first()
+    if blob is None:
+        extension = os.path.splitext(session.filename)[1][:16]
+        with open(path, 'rb') as source:
+            blob = StoredBlob(sha256=sha256, size=session.size)
+            blob.file.save(f'{sha256[:2]}/{sha256}{extension}', File(source), save=False)
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            # Someone finished the same content first; use theirs
+            blob.file.delete(save=False)
+            blob = StoredBlob.objects.get(sha256=sha256)
+    os.remove(path)
+
+    session.blob = blob
+    session.sha256 = sha256
+    session.status = 'complete'
+    session.save(update_fields=['blob', 'sha256', 'status', 'updated_at'])
+    return session
+
+
+def start_session(owner, filename, size, sha256=''):
+    """
+    Open an upload session. If `owner` has already uploaded content with
+    the declared hash, the session completes immediately without any bytes
+    sent. Anyone else has to send the bytes, so a hash alone never grants
+    access to another user's file; finalize() still stores them only once.
+    """
+    max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 1024 ** 3)
+    if size > max_size:
+        raise serializers.ValidationError(f"Uploads are limited to {max_size} bytes")
+
+    session = UploadSession(owner=owner, filename=filename, size=size, sha256=sha256)
+    blob = StoredBlob.objects.filter(
+        sessions__owner=owner,
+        sessions__status='complete',
+        sha256=sha256,
+        size=size
+    ).first() if sha256 else None
+    if blob is not None:
+        session.blob = blob
+        session.offset = size
+        session.status = 'complete'
+    session.save()
+    return session
+
+
+def completed_uploads(user, upload_ids):
+    """
+    Return the completed sessions owned by `user` for `upload_ids`, in order,
+    with their blobs loaded in one query.
+    """
+    if not upload_ids:
+        return []
+    try:
+        upload_ids = [uuid.UUID(str(pk)) for pk in upload_ids]
+    except ValueError:
+        raise serializers.ValidationError({'upload_ids': "Upload ids must be UUIDs"})
+    sessions = UploadSession.objects.select_related('blob').filter(
+        owner=user,
+        status='complete',
+        pk__in=upload_ids
+    ).in_bulk()
+    missing = [str(pk) for pk in upload_ids if pk not in sessions]
+    if missing:
+        raise serializers.ValidationError({'upload_ids': f"Unknown or incomplete uploads: {', '.join(missing)}"})
+    return [sessions[pk] for pk in upload_ids]
+
+
+def upload_ids_from(request):
+    """Read `upload_ids` from either a multipart/form or a JSON request body."""
+    if hasattr(request.data, 'getlist'):
+        return request.data.getlist('upload_ids')
+    upload_ids = request.data.get('upload_ids', [])
+    return upload_ids if isinstance(upload_ids, list) else [upload_ids]
+
+
+def verify_images(sessions):
+    from PIL import Image
+
+    for session in sessions:
+        try:
+            with session.blob.file.open('rb') as source:
+                Image.open(source).verify()
+        except Exception:
+            raise serializers.ValidationError({'upload_ids': f"{session.filename} is not a valid image"})
+
+
+def bulk_attach(model, file_field, files=(), uploads=(), **fields):
+    """
+    Create one `model` row per uploaded file and per completed upload
+    session with a single bulk insert. Session-backed rows point at the
+    shared blob instead of copying it.
+    """
+    instances = [model(**fields, **{file_field: file}) for file in files]
+    instances += [model(**fields, **{file_field: session.blob.file.name}) for session in uploads]
+    return model.objects.bulk_create(instances)
@@ -0,0 +1,17 @@
+from taskqueue.registry import task
+from .images import image_derivatives
+from .models import UploadSession
+from .storage import finalize
+
+
+@task
+def generate_image_derivatives(name):
+    image_derivatives.generate(name)
+
+
+@task
+def finalize_upload(session_id):
+    """Hash a fully received upload and store it as a blob."""
+    session = UploadSession.objects.filter(pk=session_id, status='verifying').first()
+    if session is not None:
+        finalize(session)
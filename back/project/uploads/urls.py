@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.UploadSessionCreateView.as_view(), name='upload-create'),
+    path('<uuid:pk>/', views.UploadSessionDetailView.as_view(), name='upload-detail'),
+]
\ No newline at end of file
@@ -0,0 +1,75 @@
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from .models import UploadSession
+from .serializers import UploadSessionSerializer
+from .storage import OffsetMismatch, start_session, write_chunk
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """
+    Open a resumable upload. Send `filename`, `size` and optionally `sha256`;
+    when you have already uploaded content with that hash the session comes
+    back complete and no bytes need to be sent.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def perform_create(self, serializer):
+        serializer.instance = start_session(
+            owner=self.request.user,
+            filename=serializer.validated_data['filename'],
+            size=serializer.validated_data['size'],
+            sha256=serializer.validated_data.get('sha256', '')
+        )
+
+
+class UploadSessionDetailView(generics.RetrieveAPIView):
+    """
+    GET reports the current offset so an interrupted upload can resume.
+    PATCH appends a chunk: the raw request body, starting at the offset
+    given in the `Upload-Offset` header. After the last chunk the session
+    is `verifying` until it is stored and becomes `complete`; if the bytes
+    did not match the declared sha256 it is back to `uploading` at offset 0.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user).select_related('blob')
+    
+    def patch(self, request, *args, **kwargs):
+        session = self.get_object()
+        
+        if session.status != 'uploading':
+            return Response(self.get_serializer(session).data)
+        
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            return Response(
+                {"error": "Upload-Offset and Content-Length headers are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_chunk = 8 * 1024 * 1024
+        if length > max_chunk:
+            return Response(
+                {"error": f"Chunks are limited to {max_chunk} bytes"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        try:
+            # Read straight from the socket; the body is never buffered whole
+            write_chunk(session, offset, request._request, length)
+        except OffsetMismatch as exc:
+            return Response(
+                {"error": "Chunk offset does not match the upload", "offset": exc.expected},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Upload-Offset': str(exc.expected)}
+            )
+        
+        return Response(
+            self.get_serializer(session).data,
+            headers={'Upload-Offset': str(session.offset)}
+        )
\ No newline at end of file
@@ -0,0 +1,108 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import EarningsRollup
+
+# How many of the most recent periods the dashboard charts
+SERIES_LENGTHS = {'day': 30, 'week': 12, 'month': 12}
+
+
+def period_start(period, day):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def previous_start(period, start):
+    if period == 'month':
+        return (start - timedelta(days=1)).replace(day=1)
+    return start - timedelta(days=7 if period == 'week' else 1)
+
+
+def record_earning(provider_id, amount, when, jobs=1):
+    """
+    Add one job worth `amount` earned at `when` to the provider's day, week
+    and month rollups. Pass a negative amount and jobs=-1 to take a job back
+    out. Each rollup is bumped with an UPDATE and only created when missing,
+    so concurrent completions never lose an increment.
+    """
+    if provider_id is None:
+        return
+    amount = Decimal(amount or 0)
+    day = timezone.localdate(when)
+    with transaction.atomic():
+        for period in SERIES_LENGTHS:
+            key = {'provider_id': provider_id, 'period': period, 'period_start': period_start(period, day)}
+            bump = {'jobs': F('jobs') + jobs, 'earnings': F('earnings') + amount}
+            if EarningsRollup.objects.filter(**key).update(**bump):
+                continue
+            try:
+                with transaction.atomic():
+                    EarningsRollup.objects.create(jobs=jobs, earnings=amount, **key)
+            except IntegrityError:
+                # Someone else created it first
+                EarningsRollup.objects.filter(**key).update(**bump)
+
+
+def dashboard(provider, today=None):
+    """
+    Totals, per-period series, averages and period-over-period comparisons
+    for `provider`, read from the rollups in one query.
+    """
+    today = today or timezone.localdate()
+    starts = {period: period_start(period, today) for period in SERIES_LENGTHS}
+    windows = {}
+    for period, length in SERIES_LENGTHS.items():
+        window = [starts[period]]
+        for _ in range(length - 1):
+            window.append(previous_start(period, window[-1]))
+        windows[period] = window[::-1]
+
+    # Every month row is needed for the all-time totals; days and weeks only
+    # within the charted window
+    rows = EarningsRollup.objects.filter(provider=provider).filter(
+        Q(period='month') |
+        Q(period='week', period_start__gte=windows['week'][0]) |
+        Q(period='day', period_start__gte=windows['day'][0])
+    ).values_list('period', 'period_start', 'jobs', 'earnings')
+
+    found = {period: {} for period in SERIES_LENGTHS}
+    total_jobs, total_earnings = 0, Decimal('0')
+    for period, start, jobs, earnings in rows:
+        found[period][start] = (jobs, earnings)
+        if period == 'month':
+            total_jobs += jobs
+            total_earnings += earnings
+
+    periods, comparisons = {}, {}
+    for period, window in windows.items():
+        series = []
+        for start in window:
+            jobs, earnings = found[period].get(start, (0, Decimal('0')))
+            series.append({'period_start': start, 'jobs': jobs, 'earnings': earnings})
+        earnings = [point['earnings'] for point in series]
+        periods[period] = {
+            'series': series,
+            'average_earnings': round(sum(earnings) / len(earnings), 2),
+        }
+        current, previous = earnings[-1], earnings[-2]
+        comparisons[period] = {
+            'current': current,
+            'previous': previous,
+            'change': current - previous,
+            'change_percent': round((current - previous) / previous * 100, 1) if previous else None,
+        }
+
+    return {
+        'total_earnings': total_earnings,
+        'completed_services': total_jobs,
+        'average_fee': round(total_earnings / total_jobs, 2) if total_jobs else Decimal('0'),
+        'periods': periods,
+        'comparisons': comparisons,
+    }
@@ -0,0 +1,194 @@
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .models import LeaderboardEntry, User, UserRatingSummary
+from .ratings import bayesian_average
+
+PROVIDER_ROLES = ('teacher', 'technician')
+
+# Stands in for what a partially loaded job counts towards, which is unknown
+_UNKNOWN = object()
+
+
+def leaderboard_size():
+    return getattr(settings, 'LEADERBOARD_SIZE', 100)
+
+
+def weights():
+    return getattr(settings, 'LEADERBOARD_WEIGHTS', {'rating': 1.0, 'completed': 1.0, 'earnings': 0.5})
+
+
+def role_board(role):
+    return f'role:{role}'
+
+
+def group_board(kind, group_id):
+    return f'{kind}:{group_id}'
+
+
+def score(rating, completed, earnings):
+    """
+    Blend the Bayesian rating with completed jobs and earnings. The last two
+    are log-scaled so volume helps without drowning out quality.
+    """
+    weight = weights()
+    return (
+        weight['rating'] * rating / 5 +
+        weight['completed'] * math.log10(1 + max(completed, 0)) +
+        weight['earnings'] * math.log10(1 + max(float(earnings), 0))
+    )
+
+
+class Leaderboards:
+    """
+    Ranked providers per role and per subject or category.
+
+    Each provider has one LeaderboardEntry per board they take part in,
+    holding their completed jobs, earnings, rating and the resulting score.
+    Entries are adjusted as jobs are completed (or taken back) and ratings
+    change, and each board is read as a range of the (board, score) index,
+    capped at the top LEADERBOARD_SIZE, so a page costs the same however
+    many jobs and ratings there are.
+    """
+
+    def __init__(self):
+        self.tracked = []
+
+    def track(self, model, provider_field, group_field, earned_status, role):
+        """
+        Count every `model` job in `earned_status` towards its provider's
+        standing on the board for `role` and the board for the job's group.
+        """
+        self.tracked.append((model, provider_field, group_field, earned_status, role))
+
+        def counted(job):
+            if job.get_deferred_fields() & {'status', 'service_fee', f'{provider_field}_id', f'{group_field}_id'}:
+                return _UNKNOWN
+            provider_id = getattr(job, f'{provider_field}_id')
+            if job.status != earned_status or provider_id is None:
+                return None
+            return provider_id, getattr(job, f'{group_field}_id'), job.service_fee
+
+        def on_init(sender, instance, **kwargs):
+            instance._leaderboard_counted = counted(instance) if instance.pk else None
+
+        def on_save(sender, instance, **kwargs):
+            previous, current = instance._leaderboard_counted, counted(instance)
+            if previous is _UNKNOWN or current is _UNKNOWN or previous == current:
+                return
+            if previous is not None:
+                self.add(role, group_field, *previous, sign=-1)
+            if current is not None:
+                self.add(role, group_field, *current)
+            instance._leaderboard_counted = current
+
+        def on_delete(sender, instance, **kwargs):
+            if instance._leaderboard_counted not in (None, _UNKNOWN):
+                self.add(role, group_field, *instance._leaderboard_counted, sign=-1)
+
+        uid = f'leaderboard:{model._meta.label}'
+        post_init.connect(on_init, sender=model, weak=False, dispatch_uid=f'{uid}:init')
+        post_save.connect(on_save, sender=model, weak=False, dispatch_uid=f'{uid}:save')
+        post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=f'{uid}:delete')
+
+    def add(self, role, kind, provider_id, group_id, fee, sign=1):
+        """Add (sign=1) or take back (sign=-1) one completed job worth `fee`."""
+        boards = [role_board(role), group_board(kind, group_id)]
+        fee = Decimal(fee or 0)
+        with transaction.atomic():
+            for board in boards:
+                key = {'board': board, 'provider_id': provider_id}
+                bump = {'completed': F('completed') + sign, 'earnings': F('earnings') + sign * fee}
+                if LeaderboardEntry.objects.filter(**key).update(**bump) or sign < 0:
+                    continue
+                try:
+                    with transaction.atomic():
+                        LeaderboardEntry.objects.create(completed=1, earnings=fee, **key)
+                except IntegrityError:
+                    # Someone else created it first
+                    LeaderboardEntry.objects.filter(**key).update(**bump)
+            if sign < 0:
+                # Drop boards the provider no longer has jobs on, keeping the
+                # role board for rated providers as rebuild() does
+                emptied = LeaderboardEntry.objects.filter(provider_id=provider_id, board__in=boards, completed__lte=0)
+                if UserRatingSummary.objects.filter(pk=provider_id).exists():
+                    emptied = emptied.exclude(board=role_board(role))
+                emptied.delete()
+            self.rescore(provider_id, boards)
+
+    def rating_changed(self, user_id, join=True):
+        """
+        Rescore `user_id` everywhere. With `join`, a provider with no jobs
+        yet joins their role's board; ratings being removed pass False, as
+        they may be going with the user themselves.
+        """
+        with transaction.atomic():
+            if not LeaderboardEntry.objects.filter(provider_id=user_id).exists():
+                if not join:
+                    return
+                role = User.objects.filter(pk=user_id).values_list('role', flat=True).first()
+                if role not in PROVIDER_ROLES:
+                    return
+                LeaderboardEntry.objects.get_or_create(board=role_board(role), provider_id=user_id)
+            self.rescore(user_id)
+
+    def rescore(self, provider_id, boards=None):
+        rating = UserRatingSummary.objects.filter(pk=provider_id).values_list('bayesian_average', flat=True).first()
+        if rating is None:
+            rating = bayesian_average(0, 0)
+        entries = LeaderboardEntry.objects.filter(provider_id=provider_id)
+        if boards is not None:
+            entries = entries.filter(board__in=boards)
+        entries = list(entries)
+        for entry in entries:
+            entry.rating = rating
+            entry.score = score(rating, entry.completed, entry.earnings)
+        LeaderboardEntry.objects.bulk_update(entries, ['rating', 'score'])
+
+    def ranking(self, board):
+        """The top LEADERBOARD_SIZE entries of `board`, best first."""
+        return LeaderboardEntry.objects.filter(board=board).select_related('provider').order_by(
+            '-score', 'provider_id'
+        )[:leaderboard_size()]
+
+    def rebuild(self):
+        """Recompute every board from the jobs and ratings; returns the number of entries."""
+        totals = {}
+        for model, provider_field, group_field, earned_status, role in self.tracked:
+            rows = model.objects.filter(
+                status=earned_status, **{f'{provider_field}__isnull': False}
+            ).values(f'{provider_field}_id', f'{group_field}_id').annotate(
+                jobs=Count('pk'), fees=Sum('service_fee')
+            ).order_by()
+            for row in rows:
+                provider_id = row[f'{provider_field}_id']
+                for board in (role_board(role), group_board(group_field, row[f'{group_field}_id'])):
+                    completed, earnings = totals.get((board, provider_id), (0, Decimal('0')))
+                    totals[(board, provider_id)] = (completed + row['jobs'], earnings + row['fees'])
+
+        # Rated providers rank on their role's board even before their first job
+        for provider_id, role in User.objects.filter(
+            role__in=PROVIDER_ROLES, rating_summary__isnull=False
+        ).values_list('pk', 'role'):
+            totals.setdefault((role_board(role), provider_id), (0, Decimal('0')))
+
+        ratings = dict(UserRatingSummary.objects.values_list('pk', 'bayesian_average'))
+        entries = []
+        for (board, provider_id), (completed, earnings) in totals.items():
+            rating = ratings.get(provider_id, bayesian_average(0, 0))
+            entries.append(LeaderboardEntry(
+                board=board, provider_id=provider_id, completed=completed, earnings=earnings,
+                rating=rating, score=score(rating, completed, earnings)
+            ))
+        with transaction.atomic():
+            LeaderboardEntry.objects.all().delete()
+            LeaderboardEntry.objects.bulk_create(entries, batch_size=500)
+        return len(entries)
+
+
+leaderboards = Leaderboards()
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import Coalesce, Trunc
+
+from academics.models import AcademicQuestion
+from repairs.models import RepairRequest
+from users.earnings import SERIES_LENGTHS
+from users.models import EarningsRollup
+
+# Jobs that count towards a provider's earnings, dated by when they got there.
+# Jobs finished before earned_at was recorded fall back to their last update.
+EARNING_JOBS = (
+    (AcademicQuestion.objects.filter(status='answered', teacher__isnull=False), 'teacher_id'),
+    (RepairRequest.objects.filter(status='completed', technician__isnull=False), 'technician_id'),
+)
+
+
+class Command(BaseCommand):
+    help = "Recompute every provider's daily, weekly and monthly earnings rollups from their jobs"
+
+    def handle(self, *args, **options):
+        rollups = {}
+        for jobs, provider_field in EARNING_JOBS:
+            for period in SERIES_LENGTHS:
+                totals = jobs.annotate(
+                    period_start=Trunc(Coalesce('earned_at', 'updated_at'), period, output_field=DateField())
+                ).values(provider_field, 'period_start').annotate(
+                    count=Count('pk'), total=Sum('service_fee')
+                ).order_by()
+                for row in totals:
+                    key = (row[provider_field], period, row['period_start'])
+                    count, total = rollups.get(key, (0, 0))
+                    rollups[key] = (count + row['count'], total + row['total'])
+
+        with transaction.atomic():
+            EarningsRollup.objects.all().delete()
+            EarningsRollup.objects.bulk_create([
+                EarningsRollup(provider_id=provider_id, period=period, period_start=start, jobs=count, earnings=total)
+                for (provider_id, period, start), (count, total) in rollups.items()
+            ], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(rollups)} earnings rollups"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.leaderboard import leaderboards
+
+
+class Command(BaseCommand):
+    help = "Recompute every provider leaderboard from completed jobs and ratings"
+
+    def handle(self, *args, **options):
+        written = leaderboards.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} leaderboard entries"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from users.models import UserRating, UserRatingSummary
+from users.ratings import bayesian_average
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's rating summary from their ratings"
+
+    def handle(self, *args, **options):
+        totals = UserRating.objects.values('user_id').annotate(
+            count=Count('pk'),
+            total=Sum('rating'),
+            **{f'stars_{stars}': Count('pk', filter=Q(rating=stars)) for stars in range(1, 6)}
+        ).order_by()
+        summaries = [
+            UserRatingSummary(bayesian_average=bayesian_average(row['count'], row['total']), **row)
+            for row in totals
+        ]
+        with transaction.atomic():
+            UserRatingSummary.objects.all().delete()
+            UserRatingSummary.objects.bulk_create(summaries, batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(summaries)} rating summaries"))
@@ -64,6 +64,91 @@ class UserRating(models.Model):
     
     class Meta:
         unique_together = ['user', 'rater']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='user_rating_recent_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.rater} rated {self.user} {self.rating} stars"
\ No newline at end of file
+        return f"{self.rater} rated {self.user} {self.rating} stars"
+
+
+class UserRatingSummary(models.Model):
+    """
+    Running totals of the ratings a user has received, kept in step with
+    UserRating by users.ratings so profiles and rankings read one row.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    stars_1 = models.IntegerField(default=0)
+    stars_2 = models.IntegerField(default=0)
+    stars_3 = models.IntegerField(default=0)
+    stars_4 = models.IntegerField(default=0)
+    stars_5 = models.IntegerField(default=0)
+    bayesian_average = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-bayesian_average', '-count'], name='user_rating_rank_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} averages {self.average:.2f} over {self.count} ratings"
+    
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0
+    
+    @property
+    def histogram(self):
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(1, 6)}
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A provider's standing on one leaderboard: their role overall
+    ('role:teacher') or a single subject or category ('subject:3',
+    'category:7'). Kept current by users.leaderboard.
+    """
+    board = models.CharField(max_length=40)
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    completed = models.IntegerField(default=0)
+    earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    rating = models.FloatField(default=0)
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['board', 'provider']
+        indexes = [
+            models.Index(fields=['board', '-score', 'provider'], name='leaderboard_rank_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider} on {self.board}: {self.score:.3f}"
+
+
+class EarningsRollup(models.Model):
+    """
+    A provider's completed jobs and fees for one day, week (starting Monday)
+    or month. Maintained incrementally by users.earnings as jobs are
+    completed, so the dashboard never has to scan the jobs themselves.
+    """
+    PERIOD_CHOICES = (
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    )
+    
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='earnings_rollups')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    jobs = models.IntegerField(default=0)
+    earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['provider', 'period', 'period_start']
+    
+    def __str__(self):
+        return f"{self.provider} earned {self.earnings} in the {self.period} of {self.period_start}"
@@ -0,0 +1,11 @@
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class UserRatingPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
+
+
+class LeaderboardPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+
+from .models import UserRatingSummary
+
+
+def prior():
+    """The (mean, weight) every average is shrunk towards: `weight` phantom ratings of `mean` stars."""
+    return (
+        getattr(settings, 'RATING_PRIOR_MEAN', 3.0),
+        getattr(settings, 'RATING_PRIOR_WEIGHT', 5),
+    )
+
+
+def bayesian_average(count, total):
+    mean, weight = prior()
+    return (mean * weight + total) / (weight + count)
+
+
+def record_rating(user_id, stars, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) one rating of `stars` for `user_id`.
+    The summary row is changed with a single UPDATE built from F()
+    expressions, so concurrent ratings never overwrite each other, and is
+    created the first time the user is rated.
+    """
+    mean, weight = prior()
+    changes = {
+        'count': F('count') + sign,
+        'total': F('total') + sign * stars,
+        f'stars_{stars}': F(f'stars_{stars}') + sign,
+        # F() reads the row before this UPDATE, so apply the change here too
+        'bayesian_average': ExpressionWrapper(
+            (Value(mean * weight) + F('total') + sign * stars) / (Value(float(weight)) + F('count') + sign),
+            output_field=FloatField()
+        ),
+    }
+    with transaction.atomic():
+        if UserRatingSummary.objects.filter(pk=user_id).update(**changes):
+            return
+        if sign < 0:
+            return
+        try:
+            with transaction.atomic():
+                UserRatingSummary.objects.create(
+                    user_id=user_id, count=1, total=stars, bayesian_average=bayesian_average(1, stars),
+                    **{f'stars_{stars}': 1}
+                )
+        except IntegrityError:
+            # Someone else created it first
+            UserRatingSummary.objects.filter(pk=user_id).update(**changes)
+
+
+def summary_for(user):
+    """The user's summary, or an empty one if they have never been rated."""
+    try:
+        return user.rating_summary
+    except UserRatingSummary.DoesNotExist:
+        return UserRatingSummary(user=user, bayesian_average=bayesian_average(0, 0))
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import UserRating
+from .models import LeaderboardEntry, UserRating, UserRatingSummary
+from .ratings import summary_for
+from uploads.serializers import ImageVariantsField
 
 User = get_user_model()
 
@@ -20,11 +22,29 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
+class UserRatingSummarySerializer(serializers.ModelSerializer):
+    average = serializers.FloatField(read_only=True)
+    histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    
+    class Meta:
+        model = UserRatingSummary
+        fields = ('count', 'average', 'bayesian_average', 'histogram')
+
+
 class UserDetailSerializer(serializers.ModelSerializer):
+    profile_image_variants = ImageVariantsField(source='profile_image')
+    rating_summary = serializers.SerializerMethodField()
+    
     class Meta:
         model = User
-        fields = ('id', 'email', 'first_name', 'last_name', 'role', 'profile_image', 'bio', 'date_joined')
+        fields = (
+            'id', 'email', 'first_name', 'last_name', 'role', 'profile_image',
+            'profile_image_variants', 'bio', 'date_joined', 'rating_summary'
+        )
         read_only_fields = ('id', 'email', 'date_joined')
+    
+    def get_rating_summary(self, obj):
+        return UserRatingSummarySerializer(summary_for(obj)).data
 
 
 class UserRatingSerializer(serializers.ModelSerializer):
@@ -38,12 +58,30 @@ class UserRatingSerializer(serializers.ModelSerializer):
     def get_rater_name(self, obj):
         return obj.rater.name
     
+    def validate_rating(self, value):
+        if not 1 <= value <= 5:
+            raise serializers.ValidationError("Rating must be between 1 and 5 stars")
+        return value
+    
     def validate(self, data):
         # Users cannot rate themselves
-        if self.context['request'].user == data['user']:
+        if self.context['request'].user == data.get('user', getattr(self.instance, 'user', None)):
             raise serializers.ValidationError("You cannot rate yourself")
         return data
     
     def create(self, validated_data):
         validated_data['rater'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    rank = serializers.IntegerField(read_only=True)
+    provider_name = serializers.SerializerMethodField()
+    profile_image = serializers.ImageField(source='provider.profile_image', read_only=True)
+    
+    class Meta:
+        model = LeaderboardEntry
+        fields = ('rank', 'provider', 'provider_name', 'profile_image', 'score', 'rating', 'completed', 'earnings')
+    
+    def get_provider_name(self, obj):
+        return obj.provider.name
@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core.authentication import user_cache
+from uploads.images import image_derivatives
+from .models import User, UserRating
+from .leaderboard import leaderboards
+from .ratings import record_rating
+
+image_derivatives.watch(User, 'profile_image')
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    user_id = instance.pk
+    user_cache.forget(user_id)
+    # Again once committed, in case another process reloaded the old row meanwhile
+    transaction.on_commit(lambda: user_cache.forget(user_id))
+
+
+@receiver(post_init, sender=UserRating)
+def remember_rating(sender, instance, **kwargs):
+    # What the summary currently counts for this rating, if it is saved
+    instance._counted = (instance.user_id, instance.rating) if instance.pk else None
+
+
+@receiver(post_save, sender=UserRating)
+def count_rating(sender, instance, created, **kwargs):
+    counted = (instance.user_id, instance.rating)
+    if not created and instance._counted == counted:
+        return
+    if not created and instance._counted is not None:
+        record_rating(*instance._counted, sign=-1)
+        leaderboards.rating_changed(instance._counted[0], join=False)
+    record_rating(*counted)
+    leaderboards.rating_changed(instance.user_id)
+    instance._counted = counted
+
+
+@receiver(post_delete, sender=UserRating)
+def uncount_rating(sender, instance, **kwargs):
+    if instance._counted is not None:
+        record_rating(*instance._counted, sign=-1)
+        leaderboards.rating_changed(instance._counted[0], join=False)
@@ -10,5 +10,6 @@ urlpatterns = [
     path('ratings/create/', views.UserRatingCreateView.as_view(), name='user-rating-create'),
     path('ratings/<int:pk>/update/', views.UserRatingUpdateView.as_view(), name='user-rating-update'),
     path('ratings/user/<int:user_id>/', views.UserRatingsListView.as_view(), name='user-ratings-list'),
+    path('leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
     path('earnings/', views.EarningsDashboardView.as_view(), name='earnings-dashboard'),
 ]
\ No newline at end of file
@@ -2,8 +2,16 @@ from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
-from .serializers import UserRegistrationSerializer, UserDetailSerializer, UserRatingSerializer
+from .serializers import (
+    UserRegistrationSerializer,
+    UserDetailSerializer,
+    UserRatingSerializer,
+    LeaderboardEntrySerializer
+)
 from .models import UserRating
+from .earnings import dashboard
+from .pagination import LeaderboardPagination, UserRatingPagination
+from .leaderboard import PROVIDER_ROLES, group_board, leaderboards, role_board
 from .permissions import IsUserOrReadOnly, IsRater
 
 User = get_user_model()
@@ -16,13 +24,14 @@ class RegisterView(generics.CreateAPIView):
 
 
 class UserDetailView(generics.RetrieveUpdateAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('rating_summary')
     serializer_class = UserDetailSerializer
     permission_classes = [IsUserOrReadOnly]
     
     def get_object(self):
         if self.kwargs.get('pk') == 'me':
-            return self.request.user
+            # request.user only carries the fields authentication needs
+            return self.get_queryset().get(pk=self.request.user.pk)
         return super().get_object()
 
 
@@ -42,9 +51,47 @@ class UserRatingUpdateView(generics.UpdateAPIView):
 
 class UserRatingsListView(generics.ListAPIView):
     serializer_class = UserRatingSerializer
+    pagination_class = UserRatingPagination
     
     def get_queryset(self):
-        return UserRating.objects.filter(user_id=self.kwargs['user_id'])
+        return UserRating.objects.filter(
+            user_id=self.kwargs['user_id']
+        ).select_related('rater').order_by('-created_at', '-id')
+
+
+class LeaderboardView(generics.ListAPIView):
+    """
+    Top providers for one board: `role` (teacher or technician, the
+    default), or a single `subject_id` or `category_id`.
+    """
+    serializer_class = LeaderboardEntrySerializer
+    pagination_class = LeaderboardPagination
+    
+    def list(self, request, *args, **kwargs):
+        subject_id = request.query_params.get('subject_id')
+        category_id = request.query_params.get('category_id')
+        role = request.query_params.get('role', 'teacher')
+        
+        try:
+            if subject_id:
+                board = group_board('subject', int(subject_id))
+            elif category_id:
+                board = group_board('category', int(category_id))
+            elif role in PROVIDER_ROLES:
+                board = role_board(role)
+            else:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": "Give a role of teacher or technician, or an integer subject_id or category_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        page = self.paginate_queryset(leaderboards.ranking(board))
+        for position, entry in enumerate(page, start=self.paginator.offset + 1):
+            entry.rank = position
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class EarningsDashboardView(APIView):
@@ -57,29 +104,5 @@ class EarningsDashboardView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # For technicians, calculate earnings from repair services
-        if user.role == 'technician':
-            from repairs.models import RepairRequest
-            completed_repairs = RepairRequest.objects.filter(
-                technician=user, 
-                status='completed'
-            )
-            
-            earnings = sum(repair.service_fee for repair in completed_repairs)
-            completed_services = completed_repairs.count()
-        
-        # For teachers, calculate earnings from academic services
-        elif user.role == 'teacher':
-            from academics.models import AcademicQuestion
-            completed_questions = AcademicQuestion.objects.filter(
-                teacher=user, 
-                status='answered'
-            )
-            
-            earnings = sum(question.service_fee for question in completed_questions)
-            completed_services = completed_questions.count()
-        
-        return Response({
-            'total_earnings': earnings,
-            'completed_services': completed_services
-        })
\ No newline at end of file
+        # Totals and series come from the rollups kept up to date by update_status
+        return Response(dashboard(user))